@@ -1,3 +1,5 @@
+import os
+
 import plotly.graph_objs as go
 
 from naadi import system
@@ -6,10 +8,12 @@ from naadi import system
 class GENERAL:
     PATH_PCAP_FILES = './pcaps/'
     PATH_NFDUMP_FILES = './nfdumps/'
+    PATH_FLOW_FILES = './flows/'
     PATH_CUSTOM_CSVS = './datasets/custom/'
 
     DEFAULT_NAME_PCAP_FILES = 'sample_file'
     DEFAULT_NAME_NFDUMP_FILES = 'sample_file'
+    DEFAULT_NAME_FLOW_FILES = 'sample_file.parquet'
 
     ROOT_DATASETS = './datasets/'
     DATASETS = {'NSL-KDD': 'NSL-KDD',
@@ -54,16 +58,64 @@ class IDS2018:
 class SYSTEM:
     KILL_NFCAPD_CMD = ['sudo', 'pkill', 'nfcapd']
     KILL_SOFTFLOWD_CMD = ['sudo', 'pkill', 'softflowd']
+    STOP_TIMEOUT = 10
+
+
+class CACHE:
+    ENABLED = True
+    DIR = './cache/flows/'
+    INDEX_FILE = 'index.json'
+    MAX_BYTES = 2 * 1073741824
+    BUCKET_SECONDS = 3600
+    TIME_WINDOWS_FILE = './cache/time_windows.json'
+
+
+class INDEX:
+    ENABLED = True
+    DIR = './cache/index/'
+    SKIP_PREFIXES = ('nfcapd.current', 'flows.current')
+
+
+class FLOW_METER:
+    IDLE_TIMEOUT = 15
+    ACTIVE_TIMEOUT = 1800
+    CHUNK_PACKETS = 1000000
+    MAX_WORKERS = os.cpu_count() or 1
+    STORE_BUCKET_SECONDS = 3600
+    STORE_INDEX_FILE = 'index.json'
+    PCAP_INDEX_STEP = 100000
+    SHARD_BYTES = 268435456
+    MANIFEST_BLOCK_BYTES = 8388608
+
+
+class FLOW_COLLECTOR:
+    DIR = './flows/collector/'
+    FILE_PREFIX = 'flows.'
+    FLUSH_INTERVAL = 1
+    FLUSH_RECORDS = 262144
+    RECEIVE_BUFFER_SIZE = 16 * 1048576
+
+
+class JOBS:
+    MAX_RUNNING = 2
+    PROGRESS_INTERVAL = 0.5
+    START_METHOD = 'spawn'
+    JOIN_TIMEOUT = 5
 
 
 class DETECTOR:
     ANOMALIES = ['DDoS']
+    MAX_SLICES = 100
 
 
 class GUI:
     REFRESH_MS = 500
+    JOB_TIMER_MS = 1000
     CACHE_TIMEOUT = 120
+    CACHE_MAX_BYTES = 268435456
     MAX_ROWS = 1000000
+    TABLE_PAGE_SIZE = 50
+    MAX_TABLES = 8
 
     COLORMAP = {'background': '#191919',
                 'module': '#3d4144',
@@ -123,7 +175,19 @@ class GUI:
                             'line': {'width': AXIS_WIDTH, 'color': COLORMAP['black']}}}
 
     SCATTER_STYLE = {'mode': 'markers'}
-
+    SCATTER_MAX_POINTS = 20000
+    SCATTER_OUTLIERS = 0.01
+    SCATTERGL_THRESHOLD = 5000
+
+    HISTOGRAM_BINS = 50
+    HISTOGRAM_MAX_CATEGORIES = 100
+    HISTOGRAM_SKEW = 0.5
+    DENSITY_BINS = 100
+    SPLOM_BINS = 40
+    DENSITY_STYLE = {'colorscale': 'Viridis', 'showscale': False, 'hoverinfo': 'x+y+z'}
+    DECISION_REGIONS_PIXELS = 400
+    DECISION_REGIONS_REFINE = 4
+    PREDICT_BATCH = 65536
     DECISION_REGIONS_STYLE = {'autocontour': False, 'opacity': 0.7, 'line': {'color': 'black', 'smoothing': 0}}
 
 
@@ -131,6 +195,9 @@ class NFDUMP:
     NFCAPD_DEFAULT_PORT = 9995
     NFCAPD_DEFAULT_ADDRESS = '127.0.0.1'
     NFCAPD_TIME_INTERVAL = 600
+    NFCAPD_START_TIMEOUT = 10
+    NFCAPD_START_POLL_INTERVAL = 0.05
+    NFCAPD_START_DELAY = 1
 
     TIME_FORMAT = '%Y/%m/%d.%H:%M:%S'
     SUMMARY_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
@@ -138,6 +205,28 @@ class NFDUMP:
     SAMPLE_CMD = ['nfdump', '-A', 'proto', '-n', '1']
     CMD_DELIMITER = '|'
 
+    SINGLE_PASS = True
+    SINGLE_PASS_FIELDS = ['%ts', '%te']
+    FLOW_TIME_COLUMNS = ['FLOW START', 'FLOW END']
+
+    NATIVE_READER = False
+    READ_CHUNK_FLOWS = 1000000
+    NFCAPD_BUFFER_SIZE = 5 * 1048576
+
+    MAX_BATCHES_BUFFERED = 4
+    CUSTOM_DATA_SLICES = 1
+    BATCHES_QUEUE_TIMEOUT = 0.5
+
+    MAX_WORKERS = os.cpu_count() or 1
+    ORDERED_SLICES = True
+    QUERY_TIMEOUT = 300
+    QUERY_RETRIES = 2
+
+    INCREMENTAL_AGGREGATION = True
+
+    FOLLOW_POLL_INTERVAL = 5
+    FOLLOW_LATENESS = 60
+
     TIME_WINDOW_MIN = 1
     TIME_WINDOW_MAX = 60
     TIME_WINDOW_STEP = 1
@@ -165,6 +254,160 @@ class NFDUMP:
                       'SOURCE TOS': '%stos',
                       'DESTINATION TOS': '%dtos'}
 
+    VARIABLES_TYPES = {'FLOW START': 'datetime',
+                       'FLOW END': 'datetime',
+                       'FIRST SEEN': 'datetime',
+                       'LAST SEEN': 'datetime',
+                       'DURATION': 'numeric',
+                       'PROTOCOL': 'category',
+                       'SOURCE ADDRESS': 'category',
+                       'DESTINATION ADDRESS': 'category',
+                       'SOURCE PORT': 'numeric',
+                       'DESTINATION PORT': 'numeric',
+                       'PACKETS': 'numeric',
+                       'BYTES': 'numeric',
+                       'FLOWS': 'numeric',
+                       'TCP FLAGS': 'category',
+                       'SOURCE TOS': 'numeric',
+                       'DESTINATION TOS': 'numeric'}
+
+    PROTOCOLS_DICT = {1: 'ICMP',
+                      2: 'IGMP',
+                      3: 'GGP',
+                      4: 'IPIP',
+                      5: 'ST',
+                      6: 'TCP',
+                      7: 'CBT',
+                      8: 'EGP',
+                      9: 'IGP',
+                      10: 'BBN',
+                      11: 'NVPII',
+                      12: 'PUP',
+                      13: 'ARGUS',
+                      14: 'ENCOM',
+                      15: 'XNET',
+                      16: 'CHAOS',
+                      17: 'UDP',
+                      18: 'MUX',
+                      19: 'DCN',
+                      20: 'HMP',
+                      21: 'PRM',
+                      22: 'XNS',
+                      23: 'Trnk1',
+                      24: 'Trnk2',
+                      25: 'Leaf1',
+                      26: 'Leaf2',
+                      27: 'RDP',
+                      28: 'IRTP',
+                      29: 'ISO-4',
+                      30: 'NETBK',
+                      31: 'MFESP',
+                      32: 'MEINP',
+                      33: 'DCCP',
+                      34: '3PC',
+                      35: 'IDPR',
+                      36: 'XTP',
+                      37: 'DDP',
+                      38: 'IDPR',
+                      39: 'TP++',
+                      40: 'IL',
+                      41: 'IPv6',
+                      42: 'SDRP',
+                      43: 'Rte6',
+                      44: 'Frag6',
+                      45: 'IDRP',
+                      46: 'RSVP',
+                      47: 'GRE',
+                      48: 'MHRP',
+                      49: 'BNA',
+                      50: 'ESP',
+                      51: 'AH',
+                      52: 'INLSP',
+                      53: 'SWIPE',
+                      54: 'NARP',
+                      55: 'MOBIL',
+                      56: 'TLSP',
+                      57: 'SKIP',
+                      58: 'ICMP6',
+                      59: 'NOHE6',
+                      60: 'OPTS6',
+                      61: 'HOST',
+                      62: 'CFTP',
+                      63: 'NET',
+                      64: 'SATNT',
+                      65: 'KLAN',
+                      66: 'RVD',
+                      67: 'IPPC',
+                      68: 'FS',
+                      69: 'SATM',
+                      70: 'VISA',
+                      71: 'IPCV',
+                      72: 'CPNX',
+                      73: 'CPHB',
+                      74: 'WSN',
+                      75: 'PVP',
+                      76: 'BSATM',
+                      77: 'SUNND',
+                      78: 'WBMON',
+                      79: 'WBEXP',
+                      80: 'ISOIP',
+                      81: 'VMTP',
+                      82: 'SVMTP',
+                      83: 'VINES',
+                      84: 'TTP',
+                      85: 'NSIGP',
+                      86: 'DGP',
+                      87: 'TCF',
+                      88: 'EIGRP',
+                      89: 'OSPF',
+                      90: 'S-RPC',
+                      91: 'LARP',
+                      92: 'MTP',
+                      93: 'AX.25',
+                      94: 'IPIP',
+                      95: 'MICP',
+                      96: 'SCCSP',
+                      97: 'ETHIP',
+                      98: 'ENCAP',
+                      100: 'GMTP',
+                      101: 'IFMP',
+                      102: 'PNNI',
+                      103: 'PIM',
+                      104: 'ARIS',
+                      105: 'SCPS',
+                      106: 'QNX',
+                      107: 'A/N',
+                      108: 'IPcmp',
+                      109: 'SNP',
+                      110: 'CpqPP',
+                      111: 'IPXIP',
+                      112: 'VRRP',
+                      113: 'PGM',
+                      114: '0hop',
+                      115: 'L2TP',
+                      116: 'DDX',
+                      117: 'IATP',
+                      118: 'STP',
+                      119: 'SRP',
+                      120: 'UTI',
+                      121: 'SMP',
+                      122: 'SM',
+                      123: 'PTP',
+                      124: 'ISIS4',
+                      125: 'FIRE',
+                      126: 'CRTP',
+                      127: 'CRUDP',
+                      129: 'IPLT',
+                      130: 'SPS',
+                      131: 'PIPE',
+                      132: 'SCTP',
+                      133: 'FC',
+                      135: 'MHEAD',
+                      136: 'UDP-L',
+                      137: 'MPLS'}
+
+    TCP_FLAGS = 'CEUAPRSF'
+
     STATISTICS_DICT = {'MIN': min,
                        'MAX': max}
 
@@ -47,19 +47,19 @@ class Analyzer:
     def _import_dataset(self):
         self.dataset = self.datasets_dict[self.dataset_name](self.options['n_samples'])
         self.data_raw = self.dataset.import_dataset()
-        self.presenter.data_raw = self.data_raw
+        self.presenter.set_data('data_raw', self.data_raw)
         return None
 
     def _preprocess_dataset(self):
         self.preprocessor.dataset = self.dataset
         self.data = self.preprocessor.preprocess(self.preprocessing_steps)
-        self.presenter.data = self.data
+        self.presenter.set_data('data', self.data)
         return None
 
     def _do_ml(self):
         self.processor.import_data(self.data)
         self.data_reduced, self.y_pred, self.ratings, self.scores = self.processor.run()
-        self.presenter.data_reduced = self.data_reduced
+        self.presenter.set_data('data_reduced', self.data_reduced)
         return None
 
     def _define_charts(self):
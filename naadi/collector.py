@@ -1,7 +1,18 @@
 import os
+import shutil
+import time
+from concurrent import futures
+
+import numpy as np
 
 import configuration as cnf
+from naadi import flow_records
 from naadi import system
+from naadi.flow_collector import FlowCollector
+from naadi.flow_meter import FlowMeter, PcapReader
+from naadi import flow_store
+from naadi.pcap_manifest import PcapManifest
+from naadi.process_supervisor import ProcessSupervisor
 
 
 class NetFlowCollector:
@@ -12,8 +23,7 @@ class NetFlowCollector:
 
         self.time_elapsed = None
 
-        self._active_nfcaps = 0
-        self._active_softflowds = 0
+        self.supervisor = ProcessSupervisor()
 
         self.name_pcap_files = None
         self.path_pcap_files = cnf.GENERAL.PATH_PCAP_FILES + cnf.GENERAL.DEFAULT_NAME_PCAP_FILES
@@ -21,20 +31,36 @@ class NetFlowCollector:
         self.pcaps_processed = 0
         self.pcaps_num = None
 
+        self.shards_processed = 0
+        self.shards_num = None
+
+        self.flow_meter = None
+        self.flow_collector = None
+
     def convert_pcap_to_nfdump(self,
                                time_interval=cnf.NFDUMP.NFCAPD_TIME_INTERVAL,
                                output_dir=cnf.GENERAL.PATH_NFDUMP_FILES,
                                output_file_name=cnf.GENERAL.DEFAULT_NAME_NFDUMP_FILES,
                                collector_address=cnf.NFDUMP.NFCAPD_DEFAULT_ADDRESS,
                                collector_port=cnf.NFDUMP.NFCAPD_DEFAULT_PORT):
-        """Converts a pcap file to the nfdump binary.
+        """Converts a pcap file (or all pcap files from a directory) to nfdump binaries.
 
         Steps made:
-        1. Create commands for starting the generator and collector.
-        2. Start collector (nfcapd).
-        3. Generate NetFlow stream from pcap file with softflowd.
-        4. Rename the file that was created the last.
-        5. Kill generator and collector processes.
+        1. Select pcap files that are not recorded in the manifest of the output directory yet.
+        2. For every selected pcap file:
+            a. Start collector (nfcapd) writing to a subdirectory of the output directory of its own and wait until
+               it listens (see _start_collector).
+            b. Generate NetFlow stream from the pcap file with softflowd.
+            c. Stop collector, so that it writes all flows out.
+            d. Record the pcap file with the nfdump binaries of its subdirectory in the manifest.
+        3. Rename the last of the nfdump binaries created.
+        4. Stop generator and collector processes.
+
+        nfcapd names the binaries after the time slot they were written in, so pcap files converted within the same
+        slot would overwrite each other's binaries in a shared directory. The processes are owned by the supervisor
+        of the collector, which keeps the count of running ones.
+
+        An interrupted conversion is resumed by running it again; pcap files converted already are skipped.
 
         :param time_interval: time that data is extracted to a single file
         :type time_interval: int
@@ -48,40 +74,337 @@ class NetFlowCollector:
         :type collector_port: int
         :return: None
         """
-        collector_command = ['nfcapd', '-t', str(time_interval), '-l', output_dir, '-p', str(collector_port), '&']
+        if os.path.isdir(self.path_pcap_files):
+            paths = [os.path.join(self.path_pcap_files, f) for f in sorted(os.listdir(self.path_pcap_files))]
+        else:
+            paths = [self.path_pcap_files]
+        manifest = PcapManifest(output_dir)
+        pending = manifest.get_pending(paths)
+        self.pcaps_num = len(paths)
+        self.pcaps_processed = len(paths) - len(pending)
 
+        outputs = []
         try:
-            system.execute_system_command_and_continue(collector_command)
-            self.info_message = 'NetFlow collector has started successfully.'
-            self.info_message = 'Generating NetFlow from ' + self.path_pcap_files + \
-                                ' file in progress. It may take a few minutes...'
-
-            if os.path.isdir(self.path_pcap_files):
-                self.pcaps_num = len(os.listdir(self.path_pcap_files))
-                for f in os.listdir(self.path_pcap_files):
-                    generator_command = ['softflowd', '-r', self.path_pcap_files + '/' + f, '-n',
-                                         collector_address + ':' + str(collector_port)]
-                    system.execute_system_command_and_wait(generator_command)
-                    self.pcaps_processed = self.pcaps_processed + 1
-                    self.info_message = str(self.pcaps_processed) + ' from ' + str(self.pcaps_num) + \
-                                        ' .pcap files has been processed.'
+            for path in pending:
+                pcap_output_dir = os.path.join(output_dir, os.path.basename(path) + '.nfcapd')
+                shutil.rmtree(pcap_output_dir, ignore_errors=True)
+                os.makedirs(pcap_output_dir)
+                collector_command = ['nfcapd', '-t', str(time_interval), '-l', pcap_output_dir,
+                                     '-p', str(collector_port)]
+                if not self._start_collector(collector_command, collector_port):
+                    self.error_message = 'Collector: nfcapd is not listening on port ' + str(collector_port) + \
+                                         ', ' + path + ' was not converted.'
+                    break
+                self.info_message = 'Generating NetFlow from ' + path + ' file in progress. It may take a few minutes...'
 
-            else:
-                generator_command = ['softflowd', '-r', self.path_pcap_files, '-n',
-                                     collector_address + ':' + str(collector_port)]
-                system.execute_system_command_and_wait(generator_command)
-                self.info_message = 'Generator has reached the end of the .pcap file.'
+                generator_command = ['softflowd', '-r', path, '-n', collector_address + ':' + str(collector_port)]
+                self.supervisor.run('softflowd', generator_command)
+                self.supervisor.stop('nfcapd')
+
+                created = sorted(system.get_directory_files(pcap_output_dir, cnf.INDEX.SKIP_PREFIXES))
+                manifest.mark_done(path, created)
+                outputs = outputs + created
+                self.pcaps_processed = self.pcaps_processed + 1
+                self.info_message = str(self.pcaps_processed) + ' from ' + str(self.pcaps_num) + \
+                                    ' .pcap files has been processed.'
 
             self.time_elapsed = None
-            rename_command = ['mv', system.get_latest_file(output_dir), output_dir + output_file_name]
-            system.execute_system_command_and_wait(rename_command)
-            self.info_message = 'Collector has stopped. Nfdump binary was placed in ' + \
-                                output_dir + output_file_name + '.'
+            if not outputs:
+                self.info_message = 'Collector has stopped. No new .pcap files to process.'
+            else:
+                rename_command = ['mv', outputs[-1], output_dir + output_file_name]
+                system.execute_system_command_and_wait(rename_command)
+                manifest.rename_output(outputs[-1], output_dir + output_file_name)
+                self.info_message = 'Collector has stopped. Nfdump binary was placed in ' + \
+                                    output_dir + output_file_name + '.'
 
         finally:
-            system.execute_system_command_and_wait(['pkill', 'nfcapd'])
-            system.execute_system_command_and_wait(['pkill', 'softflowd'])
+            self.supervisor.stop_all()
+
+        return None
+
+    def start_flow_collector(self,
+                             address=cnf.NFDUMP.NFCAPD_DEFAULT_ADDRESS,
+                             port=cnf.NFDUMP.NFCAPD_DEFAULT_PORT,
+                             output_dir=cnf.FLOW_COLLECTOR.DIR,
+                             time_interval=cnf.NFDUMP.NFCAPD_TIME_INTERVAL):
+        """Starts the built-in flow collector (in place of nfcapd) in a background thread; flows exported to it are
+        written to Parquet files in the output directory, which Data Acquisitor reads as flows source.
+
+        :param address: NetFlow collector IP address
+        :type address: str
+        :param port: NetFlow collector port
+        :type port: int
+        :param output_dir: a directory for flow files
+        :type output_dir: str
+        :param time_interval: time that flows are written to a single file
+        :type time_interval: int
+        :return: True if the flow collector is listening
+        :rtype: bool
+        """
+        if self.flow_collector is not None and self.flow_collector.is_running():
+            return True
+
+        self.flow_collector = FlowCollector(address, port, output_dir, time_interval)
+        if not self.flow_collector.start():
+            self.error_message = self.flow_collector.error_message
+            return False
+        self.info_message = self.flow_collector.info_message
+        return True
+
+    def stop_flow_collector(self):
+        """Stops the built-in flow collector and writes out its current file.
+
+        :rtype: None
+        """
+        if self.flow_collector is not None:
+            self.flow_collector.stop()
+            self.info_message = self.flow_collector.info_message
+        return None
+
+    def _start_collector(self, command, port):
+        """Starts collector (nfcapd) and waits until it listens on the port, so that no flows are exported before it
+        receives them.
+
+        Listening is checked in /proc/net/udp; where it cannot be checked, nfcapd is given NFCAPD_START_DELAY seconds
+        (see the configuration file).
+
+        :param command: nfcapd command
+        :type command: list
+        :param port: NetFlow collector port
+        :type port: int
+        :return: True if nfcapd listens, False if the port is taken by another process, nfcapd has exited or it has
+            not started listening in time
+        :rtype: bool
+        """
+        if system.is_udp_port_bound(port):
+            return False
+
+        process = self.supervisor.start('nfcapd', command)
+        deadline = time.monotonic() + cnf.NFDUMP.NFCAPD_START_TIMEOUT
+        while process.poll() is None and time.monotonic() < deadline:
+            bound = system.is_udp_port_bound(port)
+            if bound is None:
+                time.sleep(cnf.NFDUMP.NFCAPD_START_DELAY)
+                return process.poll() is None
+            if bound:
+                return True
+            time.sleep(cnf.NFDUMP.NFCAPD_START_POLL_INTERVAL)
+        return False
+
+    def convert_pcap_to_flows(self,
+                              output_dir=cnf.GENERAL.PATH_FLOW_FILES,
+                              output_file_name=cnf.GENERAL.DEFAULT_NAME_FLOW_FILES,
+                              idle_timeout=cnf.FLOW_METER.IDLE_TIMEOUT,
+                              active_timeout=cnf.FLOW_METER.ACTIVE_TIMEOUT):
+        """Converts a pcap file (or all pcap files from a directory) to flow records stored in a Parquet file.
+
+        Flows are built in process by the flow meter, so neither nfcapd nor softflowd are started.
+
+        :param output_dir: a directory for flow files
+        :type output_dir: str
+        :param output_file_name: the flow file name
+        :type output_file_name: str
+        :param idle_timeout: a flow expires if no packet of it is seen for that many seconds
+        :type idle_timeout: int
+        :param active_timeout: a flow expires after that many seconds even if packets of it are still seen
+        :type active_timeout: int
+        :return: None
+        """
+        if os.path.isdir(self.path_pcap_files):
+            paths = [os.path.join(self.path_pcap_files, f) for f in sorted(os.listdir(self.path_pcap_files))]
+        else:
+            paths = [self.path_pcap_files]
+        self.pcaps_num = len(paths)
+        self.pcaps_processed = 0
+
+        self.info_message = 'Generating NetFlow from ' + self.path_pcap_files + ' in progress...'
+        os.makedirs(output_dir, exist_ok=True)
+        self.flow_meter = FlowMeter(idle_timeout, active_timeout)
+        flows = self.flow_meter.convert(paths, output_dir + output_file_name)
+        self.pcaps_processed = self.flow_meter.files_processed
+
+        self.info_message = str(flows) + ' flows from ' + str(self.flow_meter.packets_processed) + \
+                            ' packets were placed in ' + output_dir + output_file_name + '.'
+        return None
+
+    def convert_pcap_to_flow_store(self,
+                                   output_dir=cnf.GENERAL.PATH_FLOW_FILES,
+                                   max_workers=cnf.FLOW_METER.MAX_WORKERS):
+        """Converts the selected pcap file (or all pcap files from the selected directory) to a time-indexed flow store,
+        which Data Acquisitor reads in place of nfdump binaries.
+
+        A single file is split into shards processed in parallel (see convert_pcap_to_flow_store_sharded), files of a
+        directory are processed in parallel one by one (see convert_pcaps_to_flow_store).
+
+        :param output_dir: a directory of the flow store
+        :type output_dir: str
+        :param max_workers: a maximum number of pcap files (or shards) processed at once
+        :type max_workers: int
+        :return: None
+        """
+        if os.path.isdir(self.path_pcap_files):
+            return self.convert_pcaps_to_flow_store(output_dir, max_workers)
+        return self.convert_pcap_to_flow_store_sharded(output_dir, max_workers)
+
+    def convert_pcaps_to_flow_store(self,
+                                    output_dir=cnf.GENERAL.PATH_FLOW_FILES,
+                                    max_workers=cnf.FLOW_METER.MAX_WORKERS,
+                                    idle_timeout=cnf.FLOW_METER.IDLE_TIMEOUT,
+                                    active_timeout=cnf.FLOW_METER.ACTIVE_TIMEOUT):
+        """Converts all pcap files from a directory (or a single pcap file) to a time-indexed flow store.
+
+        Up to max_workers pcap files are processed at once, each one by an in-process flow meter of a separate worker
+        process; flows of all files are merged into the store when all of them are processed. A flow that spans two
+        pcap files is stored as two flows.
+
+        Converted pcap files are recorded in the manifest of the store; files recorded already are skipped, so an
+        interrupted conversion is resumed by running it again and only new pcap files are added to the store. A file
+        that has changed since it was converted is skipped with a warning, as its flows merged into the store cannot
+        be told apart from flows of other files; it is converted into a new store.
+
+        :param output_dir: a directory of the flow store
+        :type output_dir: str
+        :param max_workers: a maximum number of pcap files processed at once
+        :type max_workers: int
+        :param idle_timeout: a flow expires if no packet of it is seen for that many seconds
+        :type idle_timeout: int
+        :param active_timeout: a flow expires after that many seconds even if packets of it are still seen
+        :type active_timeout: int
+        :return: None
+        """
+        if os.path.isdir(self.path_pcap_files):
+            paths = [os.path.join(self.path_pcap_files, f) for f in sorted(os.listdir(self.path_pcap_files))]
+        else:
+            paths = [self.path_pcap_files]
+        manifest = PcapManifest(output_dir)
+        changed = [p for p in paths if manifest.is_changed(p)]
+        pending = [p for p in manifest.get_pending(paths) if p not in changed]
+        self.pcaps_num = len(paths) - len(changed)
+        self.pcaps_processed = self.pcaps_num - len(pending)
+        if changed:
+            self.warning_message = 'Collector: ' + ', '.join(changed) + ' changed since converted into ' + \
+                                   output_dir + ' and skipped, convert them into a new flow store.'
+
+        self.info_message = 'Generating NetFlow from ' + self.path_pcap_files + ' with ' + str(max_workers) + \
+                            ' workers in progress...'
+        packets, flows = 0, 0
+        with futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+            tasks = {executor.submit(flow_store.meter_to_store, p, output_dir, cnf.FLOW_METER.STORE_BUCKET_SECONDS,
+                                     idle_timeout, active_timeout): p for p in pending}
+            for task in futures.as_completed(tasks):
+                try:
+                    p, f, outputs = task.result()
+                    manifest.mark_done(tasks[task], outputs)
+                except ValueError as e:
+                    self.warning_message = 'Collector: ' + tasks[task] + ' skipped, ' + str(e)
+                    p, f = 0, 0
+                packets, flows = packets + p, flows + f
+                self.pcaps_processed = self.pcaps_processed + 1
+                self.info_message = str(self.pcaps_processed) + ' from ' + str(self.pcaps_num) + \
+                                    ' .pcap files has been processed.'
+
+        self.info_message = 'Merging flows into ' + output_dir + '...'
+        flow_store.FlowStore(output_dir).merge()
+        self.info_message = str(flows) + ' flows from ' + str(packets) + ' packets were placed in ' + output_dir + '.'
+        return None
+
+    def convert_pcap_to_flow_store_sharded(self,
+                                           output_dir=cnf.GENERAL.PATH_FLOW_FILES,
+                                           max_workers=cnf.FLOW_METER.MAX_WORKERS,
+                                           shard_bytes=cnf.FLOW_METER.SHARD_BYTES,
+                                           idle_timeout=cnf.FLOW_METER.IDLE_TIMEOUT,
+                                           active_timeout=cnf.FLOW_METER.ACTIVE_TIMEOUT):
+        """Converts a single (large) pcap file to a time-indexed flow store, processing shards of it in parallel.
+
+        Steps made:
+        1. Build (or load) the index of packet offsets by time of the pcap file.
+        2. Split the file into shards of about shard_bytes bytes (at least one per worker) at indexed packets.
+        3. Build flows from the shards in worker processes, up to max_workers at once.
+        4. Stitch flows that cross the shard boundaries, shard by shard in time order, as the shards complete.
+        5. Merge all flows into the store.
+
+        The flows are the same as if the file was processed sequentially, provided the packets in the file are
+        ordered by time. The converted file is recorded in the manifest of the store and it is not converted again,
+        not even if it has changed since (its flows merged into the store cannot be told apart from flows of other
+        files, it is converted into a new store); parts left by an interrupted conversion of it are removed before
+        it is converted again.
+
+        :param output_dir: a directory of the flow store
+        :type output_dir: str
+        :param max_workers: a maximum number of shards processed at once
+        :type max_workers: int
+        :param shard_bytes: a size of a shard in bytes
+        :type shard_bytes: int
+        :param idle_timeout: a flow expires if no packet of it is seen for that many seconds
+        :type idle_timeout: int
+        :param active_timeout: a flow expires after that many seconds even if packets of it are still seen
+        :type active_timeout: int
+        :return: None
+        """
+        manifest = PcapManifest(output_dir)
+        if manifest.is_changed(self.path_pcap_files):
+            self.warning_message = 'Collector: ' + self.path_pcap_files + ' changed since converted into ' + \
+                                   output_dir + ' and skipped, convert it into a new flow store.'
+            return None
+        if manifest.is_done(self.path_pcap_files):
+            self.info_message = self.path_pcap_files + ' has been converted already.'
+            return None
+
+        self.info_message = 'Indexing ' + self.path_pcap_files + '...'
+        try:
+            offsets, _ = PcapReader(self.path_pcap_files).index()
+        except ValueError as e:
+            self.error_message = 'Collector: ' + str(e)
+            return None
+
+        shards_num = max(max_workers, -(-int(offsets[-1]) // shard_bytes))
+        bounds = offsets[np.unique(np.searchsorted(offsets, np.arange(shards_num) * offsets[-1] // shards_num))]
+        bounds = np.append(bounds[bounds < offsets[-1]], offsets[-1])
+        self.shards_num = len(bounds) - 1
+        self.shards_processed = 0
+
+        self.info_message = 'Generating NetFlow from ' + self.path_pcap_files + ' in ' + str(self.shards_num) + \
+                            ' shards with ' + str(max_workers) + ' workers in progress...'
+        name = os.path.basename(self.path_pcap_files)
+        store = flow_store.FlowStore(output_dir)
+        store.remove_parts(name)
+        stitcher = FlowMeter(idle_timeout, active_timeout)
+        active = np.empty(0, dtype=flow_records.FLOW_DTYPE)
+        completed = {}
+        stitched = 0
+        packets, flows = 0, 0
+        outputs = set()
+        with futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+            tasks = {executor.submit(flow_store.meter_shard_to_store, self.path_pcap_files, int(bounds[i]),
+                                     int(bounds[i + 1]), output_dir, cnf.FLOW_METER.STORE_BUCKET_SECONDS,
+                                     idle_timeout, active_timeout): i for i in range(self.shards_num)}
+            for task in futures.as_completed(tasks):
+                p, f, o, boundary, last = task.result()
+                packets, flows = packets + p, flows + f
+                outputs.update(o)
+                completed[tasks[task]] = boundary, last
+                self.shards_processed = self.shards_processed + 1
+                self.info_message = str(self.shards_processed) + ' from ' + str(self.shards_num) + \
+                    ' shards of ' + self.path_pcap_files + ' has been processed.'
+
+                while stitched in completed:
+                    boundary, last = completed.pop(stitched)
+                    if last is not None:
+                        expired, active = stitcher.stitch(active, boundary, last)
+                        if len(expired):
+                            outputs.update(store.write_parts(expired, name + '.stitched.' + str(stitched)))
+                    stitched = stitched + 1
+
+        expired, _ = stitcher.stitch(active, active[:0])
+        if len(expired):
+            outputs.update(store.write_parts(expired, name + '.stitched.' + str(stitched)))
+        flows = flows + stitcher.flows_exported
+        manifest.mark_done(self.path_pcap_files, sorted(outputs))
 
+        self.info_message = 'Merging flows into ' + output_dir + '...'
+        store.merge()
+        self.info_message = str(flows) + ' flows from ' + str(packets) + ' packets were placed in ' + output_dir + '.'
         return None
 
 
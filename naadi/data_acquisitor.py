@@ -2,11 +2,28 @@ import io
 import os
 import math
 import csv
+import itertools
+import queue
+import threading
+import subprocess
+from concurrent import futures
+import json
 from datetime import datetime, timedelta
+import ipaddress
+import numpy as np
 import pandas as pd
 
 import configuration as cnf
 from naadi import system
+from naadi import nfcapd_reader
+from naadi import flow_records
+from naadi.flow_cache import FlowCache
+from naadi import flow_cache
+from naadi import flow_store
+from naadi.nfcapd_index import NfcapdIndex
+from naadi.window_aggregator import SlidingWindowAggregator
+from naadi.window_aggregator import AGGREGATORS_FIELDS
+from naadi import anomalies_library
 
 from naadi.features_extractor import FeaturesExtractor
 
@@ -17,14 +34,23 @@ class DataAcquisitor:
         self.warning_message = ''
         self.error_message = ''
 
-        self.nfdump_files = cnf.GENERAL.PATH_NFDUMP_FILES + cnf.GENERAL.DEFAULT_NAME_NFDUMP_FILES
+        self._nfdump_files = cnf.GENERAL.PATH_NFDUMP_FILES + cnf.GENERAL.DEFAULT_NAME_NFDUMP_FILES
         self.csv_path = cnf.GENERAL.PATH_CUSTOM_CSVS
         self.csv_filename = None
 
-        self.full_time_window_start = None
-        self.full_time_window_end = None
+        self._full_time_window_start = None
+        self._full_time_window_end = None
+        self._time_window_discovery = None
+        self._time_window_lock = threading.Lock()
         self.time_window = cnf.NFDUMP.TIME_WINDOW
         self.dt = cnf.NFDUMP.TIME_WINDOW_DELTA
+        self.single_pass = cnf.NFDUMP.SINGLE_PASS
+        self.native_reader = cnf.NFDUMP.NATIVE_READER
+        self.max_workers = cnf.NFDUMP.MAX_WORKERS
+        self.ordered_slices = cnf.NFDUMP.ORDERED_SLICES
+        self.incremental_aggregation = cnf.NFDUMP.INCREMENTAL_AGGREGATION
+        self.flow_cache = FlowCache() if cnf.CACHE.ENABLED and flow_cache.pyarrow else None
+        self.nfdump_index = None
 
         self.variables = cnf.NFDUMP.VARIABLES_DICT
         self.statistics = cnf.NFDUMP.STATISTICS_DICT
@@ -38,29 +64,169 @@ class DataAcquisitor:
         self.time_slices_processed = None
 
         self.features_extractor = FeaturesExtractor()
+        self.detections = pd.DataFrame()
 
-        self._get_time_window()
+    def __getstate__(self):
+        """Leaves out the lock and the thread discovering the time window, so the object can be handed over to a
+        worker process (see JobManager)."""
+        state = self.__dict__.copy()
+        del state['_time_window_lock']
+        del state['_time_window_discovery']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._time_window_lock = threading.Lock()
+        self._time_window_discovery = None
+
+    @property
+    def nfdump_files(self):
+        return self._nfdump_files
+
+    @nfdump_files.setter
+    def nfdump_files(self, value):
+        """Changes nfdump source and starts discovering its time window in the background."""
+        with self._time_window_lock:
+            self._nfdump_files = value
+            self._full_time_window_start = None
+            self._full_time_window_end = None
+            self._time_window_discovery = None
+        self.discover_time_window()
+
+    @property
+    def full_time_window_start(self):
+        self._wait_for_time_window()
+        return self._full_time_window_start
+
+    @full_time_window_start.setter
+    def full_time_window_start(self, value):
+        self._full_time_window_start = value
+
+    @property
+    def full_time_window_end(self):
+        self._wait_for_time_window()
+        return self._full_time_window_end
+
+    @full_time_window_end.setter
+    def full_time_window_end(self, value):
+        self._full_time_window_end = value
+
+    def discover_time_window(self):
+        """Starts discovering the time window of nfdump source in a background thread, unless it was already started.
+
+        :return: The discovering thread
+        :rtype: threading.Thread
+        """
+        with self._time_window_lock:
+            if self._time_window_discovery is None:
+                self._time_window_discovery = threading.Thread(target=self._get_time_window, daemon=True)
+                self._time_window_discovery.start()
+            return self._time_window_discovery
+
+    def _wait_for_time_window(self):
+        """Waits for the time window of nfdump source; discovers it on first use.
+
+        A time window set explicitly is used as it is.
+
+        :rtype: None
+        """
+        if self._time_window_discovery is None and self._full_time_window_start is not None:
+            return None
+        discovery = self.discover_time_window()
+        if discovery is not threading.current_thread():
+            discovery.join()
+        return None
+
+    @staticmethod
+    def _load_time_windows():
+        if os.path.isfile(cnf.CACHE.TIME_WINDOWS_FILE):
+            with open(cnf.CACHE.TIME_WINDOWS_FILE, 'r') as f:
+                return json.load(f)
+        return {}
+
+    @staticmethod
+    def _save_time_windows(time_windows):
+        os.makedirs(os.path.dirname(cnf.CACHE.TIME_WINDOWS_FILE), exist_ok=True)
+        with open(cnf.CACHE.TIME_WINDOWS_FILE + '.tmp', 'w') as f:
+            json.dump(time_windows, f)
+        os.replace(cnf.CACHE.TIME_WINDOWS_FILE + '.tmp', cnf.CACHE.TIME_WINDOWS_FILE)
+        return None
+
+    def _get_nfdump_index(self, update=False):
+        """Gets the catalog of nfcapd files if nfdump_files is a directory.
+
+        The catalog is brought up to date when it is created and when update is on, i.e. once at the start of every
+        query, not for every time slice of it.
+
+        :param update: Whether to bring the catalog up to date
+        :type update: bool
+        :return: The catalog or None if nfdump_files is not a directory of nfdump binaries or the catalog does not
+            cover all its files
+        :rtype: NfcapdIndex
+        """
+        if not cnf.INDEX.ENABLED or not os.path.isdir(self.nfdump_files) or \
+                flow_store.is_flow_source(self.nfdump_files):
+            return None
+        if self.nfdump_index is None or self.nfdump_index.directory != self.nfdump_files:
+            self.nfdump_index = NfcapdIndex(self.nfdump_files)
+            update = True
+        if update:
+            self.nfdump_index.update()
+        return self.nfdump_index if self.nfdump_index.complete else None
 
     def _get_time_window(self, query=cnf.NFDUMP.SAMPLE_CMD):
         """Gets time window of a nfdump binary stored in nfdump_file property of the class instance; is called
-        automatically during instantiation. Time window boundaries are stored in class parameters as datetime objects.
+        on first use of the time window, in a background thread. Time window boundaries are stored in class
+        parameters as datetime objects.
+
+        The time window is cached per nfdump source (until its size or modification time changes), so it is not
+        discovered again after restart. For a directory the time window is taken from the catalog of nfcapd files
+        and for flows stored in Parquet files from the statistics of the files, so flows are not scanned.
 
         :param query: any valid nfdump query without -q parameter
         :rtype: None
         """
+        source = self.nfdump_files
+        if not os.path.isfile(source) and not os.path.isdir(source):
+            return None
 
-        if os.path.isfile(self.nfdump_files):
-            footer = system.execute_system_command_and_wait(query +
-                                                            ['-r', self.nfdump_files]).decode('utf-8').splitlines()[-3]
-        elif os.path.isdir(self.nfdump_files):
-            footer = system.execute_system_command_and_wait(query +
-                                                            ['-R', self.nfdump_files]).decode('utf-8').splitlines()[-3]
+        self.info_message = 'Discovering time window of ' + source + '...'
+        key = os.path.abspath(source)
+        nfdump_index = self._get_nfdump_index(update=True)
+        signature = nfdump_index.get_signature() if nfdump_index is not None else \
+            FlowCache.get_source_signature(source)
+        time_windows = self._load_time_windows()
+        if key in time_windows and time_windows[key]['signature'] == signature:
+            start = datetime.strptime(time_windows[key]['start'], cnf.NFDUMP.SUMMARY_TIME_FORMAT)
+            end = datetime.strptime(time_windows[key]['end'], cnf.NFDUMP.SUMMARY_TIME_FORMAT)
         else:
-            return None
+            if flow_store.is_flow_source(source):
+                time_window = flow_store.get_time_window(source)
+                if time_window is None:
+                    self.error_message = 'Data Acquisitor: ' + source + ' has no flows.'
+                    return None
+                start, end = datetime.fromtimestamp(time_window[0]), datetime.fromtimestamp(time_window[1])
+            elif nfdump_index is not None and nfdump_index.get_time_window() is not None:
+                first, last = nfdump_index.get_time_window()
+                start, end = datetime.fromtimestamp(first), datetime.fromtimestamp(last)
+            else:
+                r = '-r' if os.path.isfile(source) else '-R'
+                footer = system.execute_system_command_and_wait(query + [r, source]).decode('utf-8').splitlines()[-3]
+                time_window = footer.split('Time window: ')[1]
+                start = datetime.strptime(time_window.split(' - ')[0], cnf.NFDUMP.SUMMARY_TIME_FORMAT)
+                end = datetime.strptime(time_window.split(' - ')[1], cnf.NFDUMP.SUMMARY_TIME_FORMAT)
 
-        time_window = footer.split('Time window: ')[1]
-        self.full_time_window_start = datetime.strptime(time_window.split(' - ')[0], cnf.NFDUMP.SUMMARY_TIME_FORMAT)
-        self.full_time_window_end = datetime.strptime(time_window.split(' - ')[1], cnf.NFDUMP.SUMMARY_TIME_FORMAT)
+            time_windows = self._load_time_windows()
+            time_windows[key] = {'signature': signature,
+                                 'start': start.strftime(cnf.NFDUMP.SUMMARY_TIME_FORMAT),
+                                 'end': end.strftime(cnf.NFDUMP.SUMMARY_TIME_FORMAT)}
+            self._save_time_windows(time_windows)
+
+        with self._time_window_lock:
+            if source == self._nfdump_files:
+                self._full_time_window_start = start
+                self._full_time_window_end = end
+        self.info_message = 'Time window of ' + source + ' is ' + str(start) + ' - ' + str(end) + '.'
 
         return None
 
@@ -74,18 +240,14 @@ class DataAcquisitor:
         :return: A valid nfdump query
         :rtype: str
         """
-        if os.path.isfile(self.nfdump_files):
-            r = '-r'
-        elif os.path.isdir(self.nfdump_files):
-            r = '-R'
-        else:
+        if not os.path.isfile(self.nfdump_files) and not os.path.isdir(self.nfdump_files):
             return ''
 
         if not t:
             t = [self.full_time_window_start.strftime(cnf.NFDUMP.TIME_FORMAT) + '-' + \
                  self.full_time_window_end.strftime(cnf.NFDUMP.TIME_FORMAT)]
 
-        self.query = ['nfdump', r, self.nfdump_files, '-q', '-t', t[0]]
+        self.query = ['nfdump'] + self._assemble_source(t[0]) + ['-q', '-t', t[0]]
 
         if variables:
             self.query += ['-o', self._assemble_variables(*variables)]
@@ -98,6 +260,31 @@ class DataAcquisitor:
 
         return self.query
 
+    def _assemble_source(self, t):
+        """Chooses nfdump binaries to be read for the time period.
+
+        For a directory only the files that overlap the time period are read (-R first:last), if they are known from
+        the catalog of nfcapd files and all of them are stored in the same directory.
+
+        :param t: A time period of file to be read in nfdump -t format.
+        :type t: str
+        :return: a part of nfdump query
+        """
+        if os.path.isfile(self.nfdump_files):
+            return ['-r', self.nfdump_files]
+
+        nfdump_index = self._get_nfdump_index()
+        if nfdump_index is None:
+            return ['-R', self.nfdump_files]
+
+        t_start, t_end = [int(datetime.strptime(b, cnf.NFDUMP.TIME_FORMAT).timestamp()) for b in t.split('-')]
+        files = nfdump_index.get_files(t_start, t_end)
+        if len(files) == 1:
+            return ['-r', files[0]]
+        if len(files) > 1 and len(set([os.path.dirname(f) for f in files])) == 1:
+            return ['-R', files[0] + ':' + os.path.basename(files[-1])]
+        return ['-R', self.nfdump_files]
+
     def _assemble_variables(self, *values):
         """Translates selected variables from human readable format to nfdump syntax with dictionary from the class properties.
 
@@ -172,9 +359,173 @@ class DataAcquisitor:
             self.error_message = msg
             raise AttributeError(msg)
 
+    def _get_time_slices(self):
+        """Generates boundaries of consecutive time slices of the full time window.
+
+        :return: A start and an end of a time slice.
+        :rtype: tuple
+        """
+        for i in range(self._compute_data_generator_size()):
+            start = self.full_time_window_start + timedelta(seconds=i * self.dt)
+            yield start, start + timedelta(seconds=self.time_window)
+
+    def _query_data_slice(self, query, t):
+        """Runs nfdump query of a single time slice; a query that times out is killed and retried.
+
+        :param query: A valid nfdump query
+        :type query: list
+        :param t: A time period of the slice (used in messages only)
+        :type t: str
+        :return: nfdump output
+        :rtype: str
+        """
+        for attempt in range(cnf.NFDUMP.QUERY_RETRIES + 1):
+            try:
+                return system.execute_system_command_and_wait(query, cnf.NFDUMP.QUERY_TIMEOUT).decode('utf-8')
+            except subprocess.TimeoutExpired:
+                self.warning_message = 'Data Acquisitor: nfdump query of ' + t + ' timed out (attempt ' + \
+                                       str(attempt + 1) + ').'
+
+        msg = 'Data Acquisitor: nfdump query of ' + t + ' timed out ' + str(cnf.NFDUMP.QUERY_RETRIES + 1) + ' times.'
+        self.error_message = msg
+        raise TimeoutError(msg)
+
+    def _get_data_slices(self, variables, aggregators, unit, **filters):
+        """Queries nfdump binary separately for every time slice; up to max_workers queries run concurrently.
+
+        Slices are yielded in time order, or as soon as they are completed if ordered_slices is off. At most twice
+        max_workers slices are running or waiting to be yielded at once, so a slow slice does not make completed
+        ones pile up in memory.
+
+        For params description see building query method docstring.
+
+        :return: A start of a time slice and nfdump output for that slice.
+        :rtype: tuple
+        """
+        slices = enumerate(self._get_time_slices())
+        executor = futures.ThreadPoolExecutor(max_workers=self.max_workers)
+        running = {}
+        completed = {}
+        position = 0
+        try:
+            while True:
+                free = min(self.max_workers - len(running), 2 * self.max_workers - len(running) - len(completed))
+                for i, (start, end) in itertools.islice(slices, max(free, 0)):
+                    t = start.strftime(cnf.NFDUMP.TIME_FORMAT) + '-' + end.strftime(cnf.NFDUMP.TIME_FORMAT)
+                    query = self.build_nfdump_query(variables, aggregators, unit, *[t], **filters)
+                    running[executor.submit(self._query_data_slice, query, t)] = (i, start)
+                if not running and not completed:
+                    break
+
+                if running:
+                    finished, _ = futures.wait(running, return_when=futures.FIRST_COMPLETED)
+                    for future in finished:
+                        i, start = running.pop(future)
+                        completed[i] = (start, future.result())
+                        self.time_slices_processed = self.time_slices_processed + 1
+
+                if not self.ordered_slices:
+                    for i in sorted(completed):
+                        yield completed.pop(i)
+                while position in completed:
+                    yield completed.pop(position)
+                    position = position + 1
+        finally:
+            for future in running:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def _build_raw_flows_query(self, variables, **filters):
+        """Builds not aggregated nfdump query for the full time window with flow start and end prepended to every flow.
+
+        Numbers are printed plain (-N), so that they are not scaled (e.g. 1.2 M), and IPv6 addresses in full (-6), so
+        that they are not shortened.
+
+        For params description see building query method docstring.
+
+        :return: A valid nfdump query
+        :rtype: list
+        """
+        query = self.build_nfdump_query(variables, None, None, **filters)
+        i = query.index('-o') + 1
+        query[i] = 'fmt:' + cnf.NFDUMP.CMD_DELIMITER.join(cnf.NFDUMP.SINGLE_PASS_FIELDS + [query[i][len('fmt:'):]])
+        return query[:i + 1] + ['-N', '-6'] + query[i + 1:]
+
+    def _get_data_slices_single_pass(self, variables, **filters):
+        """Queries nfdump binary once for the full time window and splits the flows into time slices in memory.
+
+        Flows are assigned to a slice the same way nfdump -t does it (see _select_flows_in_time_slices). Aggregated
+        queries (-A, -O) cannot be split this way, hence they are not supported here.
+
+        For params description see building query method docstring.
+
+        :return: A start of a time slice and nfdump output for that slice.
+        :rtype: tuple
+        """
+        query = self._build_raw_flows_query(variables, **filters)
+        output = system.execute_system_command_and_wait(query).decode('utf-8')
+
+        n = len(cnf.NFDUMP.SINGLE_PASS_FIELDS)
+        fields = pd.Series(output.splitlines(), dtype=object).str.split(cnf.NFDUMP.CMD_DELIMITER, n=n, expand=True)
+        if fields.shape[1] <= n:
+            fields = pd.DataFrame(columns=range(n + 1), dtype=object)
+        fields = fields.dropna()
+
+        first_seen, last_seen = [pd.to_datetime(fields[i].str.strip().str.split('.').str[0],
+                                                format=cnf.NFDUMP.SUMMARY_TIME_FORMAT).values for i in range(2)]
+        flows = (fields[n] + '\n').values
+        for start, selected in self._select_flows_in_time_slices(first_seen, last_seen):
+            self.time_slices_processed = self.time_slices_processed + 1
+            yield start, ''.join(flows[selected])
+
+    def _select_flows_in_time_slices(self, first_seen, last_seen, slices=None):
+        """Assigns flows to time slices the same way nfdump -t does it.
+
+        A flow belongs to the slice if it both starts and ends within the slice boundaries (with one second
+        precision).
+
+        :param first_seen: Flows start times
+        :type first_seen: np.ndarray
+        :param last_seen: Flows end times
+        :type last_seen: np.ndarray
+        :param slices: Boundaries of time slices; slices of the full time window by default
+        :type slices: list
+        :return: A start of a time slice and positions of its flows (in the original order).
+        :rtype: tuple
+        """
+        first_seen = first_seen.astype('datetime64[s]')
+        last_seen = last_seen.astype('datetime64[s]')
+        order = np.argsort(first_seen, kind='stable')
+        first_seen_sorted = first_seen[order]
+        for start, end in slices if slices is not None else self._get_time_slices():
+            t_start, t_end = np.datetime64(start, 's'), np.datetime64(end, 's')
+            candidates = order[np.searchsorted(first_seen_sorted, t_start, side='left'):
+                               np.searchsorted(first_seen_sorted, t_end, side='right')]
+            yield start, np.sort(candidates[last_seen[candidates] <= t_end])
+
+    def _select_data_slices(self, variables, aggregators, unit, **filters):
+        """Chooses the way nfdump binary is queried for time slices.
+
+        If single pass mode is on and the query is not aggregated, nfdump is run only once for the full time window
+        and the flows are split into time slices in memory. Otherwise nfdump is run for every time slice.
+
+        For params description see building query method docstring.
+
+        :return: A generator of time slices starts and nfdump outputs for these slices.
+        :rtype: generator
+        """
+        self.num_of_time_slices = self._compute_data_generator_size()
+        self.time_slices_processed = 0
+        if self.single_pass and variables and not aggregators and not unit:
+            return self._get_data_slices_single_pass(variables, **filters)
+        return self._get_data_slices(variables, aggregators, unit, **filters)
+
     def get_data_stream(self, variables, aggregators, unit, **filters):
         """Creates a generator that streams data in chunks defined by nfdump time window parameters from configuration file.
 
+        Every chunk contains only the flows of its own time slice. Progress is reported in time_slices_processed and
+        num_of_time_slices as the slices are completed.
+
         For params description see building query method docstring.
 
         :param variables:
@@ -184,40 +535,681 @@ class DataAcquisitor:
         :return: A chunk of data from nfdump binary in human readable format.
         :rtype: str
         """
-        self.num_of_time_slices = self._compute_data_generator_size()
-        data = io.StringIO()
-        for i in range(self.num_of_time_slices):
-            start = self.full_time_window_start + timedelta(seconds=i * self.dt)
-            end = start + timedelta(seconds=self.time_window)
-            t = start.strftime(cnf.NFDUMP.TIME_FORMAT) + '-' + end.strftime(cnf.NFDUMP.TIME_FORMAT)
+        if flow_store.is_flow_source(self.nfdump_files):
+            msg = 'Data Acquisitor: nfdump cannot read flows stored in Parquet files, use get_data_batches instead.'
+            self.error_message = msg
+            raise AttributeError(msg)
+
+        self._get_nfdump_index(update=True)
+        for start, data_slice in self._select_data_slices(variables, aggregators, unit, **filters):
+            yield start, data_slice
+
+    @staticmethod
+    def _parse_data_slice(data_slice, variables):
+        """Converts nfdump output of a single time slice into a typed record batch.
+
+        Columns types are taken from the configuration file. Values that nfdump scales (e.g. 1.2 M) are coerced to NaN.
+
+        :param data_slice: nfdump output generated with -o fmt parameter
+        :type data_slice: str
+        :param variables: NetFlow fields included in the output in human readable format.
+        :type variables: list
+        :return: A record batch with one column per variable.
+        :rtype: pd.DataFrame
+        """
+        if not data_slice.strip():
+            batch = pd.DataFrame(columns=variables)
+        else:
+            batch = pd.read_csv(io.StringIO(data_slice), sep=cnf.NFDUMP.CMD_DELIMITER, header=None, names=variables,
+                                dtype=str, skipinitialspace=True)
+
+        for v in variables:
+            if cnf.NFDUMP.VARIABLES_TYPES[v] == 'datetime':
+                batch[v] = pd.to_datetime(batch[v].str.strip(), errors='coerce')
+            elif cnf.NFDUMP.VARIABLES_TYPES[v] == 'numeric':
+                batch[v] = pd.to_numeric(batch[v], errors='coerce')
+            else:
+                batch[v] = batch[v].str.strip().astype('category')
+
+        return batch
+
+    @staticmethod
+    def _timestamps_to_datetimes(timestamps):
+        """Converts UNIX timestamps in milliseconds to local time the way nfdump prints them.
+
+        :param timestamps: UNIX timestamps in milliseconds
+        :type timestamps: np.ndarray
+        :rtype: np.ndarray
+        """
+        seconds, inverse = np.unique(timestamps // 1000, return_inverse=True)
+        local = np.array([np.datetime64(datetime.fromtimestamp(int(s)), 'ms') for s in seconds],
+                         dtype='datetime64[ms]')
+        return local[inverse.ravel()] + (timestamps % 1000).astype('timedelta64[ms]')
+
+    @staticmethod
+    def _addresses_to_strings(hi, lo, ipv6):
+        """Converts integer IP addresses into categorical strings; every distinct address is formatted only once.
+
+        :rtype: pd.Categorical
+        """
+        uniques, inverse = np.unique(np.stack([hi, lo, ipv6.astype(np.uint64)], axis=1), axis=0, return_inverse=True)
+        names = [str(ipaddress.IPv6Address(int(h) << 64 | int(l))) if v else str(ipaddress.IPv4Address(int(l)))
+                 for h, l, v in uniques]
+        return pd.Categorical.from_codes(inverse.ravel(), categories=names)
+
+    def _columns_to_batch(self, columns, variables):
+        """Converts flow records (or column arrays read natively from nfcapd files) into a typed record batch.
+
+        The batch has the same layout as the one parsed from nfdump output (see _parse_data_slice).
+
+        :param columns: Flow records, see flow_records.FLOW_DTYPE
+        :type columns: np.ndarray
+        :param variables: NetFlow fields in human readable format.
+        :type variables: list
+        :rtype: pd.DataFrame
+        """
+        protocols = np.array([cnf.NFDUMP.PROTOCOLS_DICT.get(p, str(p)) for p in range(256)], dtype=object)
+        tcp_flags = np.array([''.join([c if f & (128 >> i) else '.' for i, c in enumerate(cnf.NFDUMP.TCP_FLAGS)])
+                              for f in range(256)], dtype=object)
+        converters = {cnf.NFDUMP.FLOW_TIME_COLUMNS[0]: lambda c: self._timestamps_to_datetimes(c['ts']),
+                      cnf.NFDUMP.FLOW_TIME_COLUMNS[1]: lambda c: self._timestamps_to_datetimes(c['te']),
+                      'FIRST SEEN': lambda c: self._timestamps_to_datetimes(c['ts']),
+                      'LAST SEEN': lambda c: self._timestamps_to_datetimes(c['te']),
+                      'DURATION': lambda c: (c['te'] - c['ts']) / 1000,
+                      'PROTOCOL': lambda c: pd.Categorical(protocols[c['proto']]),
+                      'SOURCE ADDRESS': lambda c: self._addresses_to_strings(c['src_addr_hi'], c['src_addr_lo'],
+                                                                             c['ipv6']),
+                      'DESTINATION ADDRESS': lambda c: self._addresses_to_strings(c['dst_addr_hi'], c['dst_addr_lo'],
+                                                                                  c['ipv6']),
+                      'SOURCE PORT': lambda c: c['src_port'],
+                      'DESTINATION PORT': lambda c: c['dst_port'],
+                      'PACKETS': lambda c: c['packets'],
+                      'BYTES': lambda c: c['bytes'],
+                      'FLOWS': lambda c: np.ones(len(c['ts']), dtype=np.int64),
+                      'TCP FLAGS': lambda c: pd.Categorical(tcp_flags[c['flags']]),
+                      'SOURCE TOS': lambda c: c['tos'],
+                      'DESTINATION TOS': lambda c: np.full(len(c['ts']), np.nan)}
+
+        return pd.DataFrame({v: converters[v](columns) for v in variables}, columns=variables)
+
+    def _is_native_query(self, variables, aggregators, unit, **filters):
+        return self.native_reader and variables and not aggregators and not unit and \
+               not any([v[1] for v in list(filters.values())])
+
+    def _get_raw_flows(self, variables, **filters):
+        """Reads all flows of the full time window as flow records.
 
-            query = self.build_nfdump_query(variables, aggregators, unit, *[t], **filters)
-            data.write(system.execute_system_command_and_wait(query).decode('utf-8'))
-            yield start, data.getvalue()
+        Flows are read natively from nfcapd files if the native reader is on and the query is not filtered, otherwise
+        with a single nfdump query that prints only the fields needed for the requested variables.
 
-        data.close()
+        For params description see building query method docstring.
+
+        :rtype: np.ndarray
+        """
+        if self._is_native_query(variables, None, None, **filters):
+            t_start = int(self.full_time_window_start.timestamp())
+            t_end = int(self.full_time_window_end.timestamp())
+            nfdump_index = self._get_nfdump_index()
+            if nfdump_index is not None:
+                columns = nfcapd_reader.read_nfcapd_file_list(nfdump_index.get_files(t_start, t_end), t_start, t_end)
+            else:
+                columns = nfcapd_reader.read_nfcapd_files(self.nfdump_files, t_start, t_end)
+            return flow_records.from_columns(columns)
+
+        names = self._get_record_variables(variables)
+        query = self._build_raw_flows_query(names, **filters)
+        batch = self._parse_data_slice(system.execute_system_command_and_wait(query).decode('utf-8'),
+                                       cnf.NFDUMP.FLOW_TIME_COLUMNS + names)
+        return flow_records.from_batch(batch)
+
+    @staticmethod
+    def _get_record_variables(variables):
+        """Chooses variables nfdump has to print to fill the flow record fields needed for the requested variables.
+
+        :rtype: list
+        """
+        fields = flow_records.get_fields(variables)
+        return [v for v in flow_records.RECORD_VARIABLES if set(flow_records.VARIABLES_FIELDS[v]) & set(fields)]
+
+    def _get_files_flows(self, files, variables, **filters):
+        """Reads all flows of the nfcapd files as flow records, natively or with nfdump query per file.
 
-    def get_custom_data(self, variables, aggregators):
-        data_stream = self.get_data_stream(variables, aggregators, None)
+        For params description see building query method docstring.
+
+        :param files: Paths to nfcapd files
+        :type files: list
+        :rtype: np.ndarray
+        """
+        if self._is_native_query(variables, None, None, **filters):
+            return flow_records.from_columns(nfcapd_reader.read_nfcapd_file_list(files))
+
+        names = self._get_record_variables(variables)
+        parts = []
+        for f in files:
+            batch = self._parse_data_slice(
+                system.execute_system_command_and_wait(self._build_files_flows_query(f, names, **filters))
+                .decode('utf-8'), cnf.NFDUMP.FLOW_TIME_COLUMNS + names)
+            parts.append(flow_records.from_batch(batch))
+        return np.concatenate(parts) if parts else np.empty(0, dtype=flow_records.FLOW_DTYPE)
 
-        with open(self.csv_path + self.csv_filename + '.csv', 'a') as csv_file:
-            csv_writer = csv.writer(csv_file, dialect='unix')
+    def _build_files_flows_query(self, path, variables, **filters):
+        """Builds not aggregated nfdump query of all flows of a single nfcapd file, printed the same way as with
+        _build_raw_flows_query.
 
+        For params description see building query method docstring.
+
+        :param path: A path to nfcapd file
+        :type path: str
+        :return: A valid nfdump query
+        :rtype: list
+        """
+        fmt = 'fmt:' + cnf.NFDUMP.CMD_DELIMITER.join(cnf.NFDUMP.SINGLE_PASS_FIELDS +
+                                                     [self.variables[v] for v in variables])
+        query = ['nfdump', '-r', path, '-q', '-N', '-6', '-o', fmt]
+        if any([v[1] for v in list(filters.values())]):
+            query += [self._assemble_filters(**filters)]
+        return query
+
+    def _split_flows(self, flows, variables, as_records=False, slices=None):
+        """Splits flow records of the full time window into time slices.
+
+        Flows are assigned to a slice the same way nfdump -t does it (see _select_flows_in_time_slices).
+
+        :param flows: Flow records
+        :type flows: np.ndarray
+        :param variables: NetFlow fields in human readable format.
+        :type variables: list
+        :param as_records: Whether to yield flow records instead of typed record batches
+        :type as_records: bool
+        :param slices: Boundaries of time slices; slices of the full time window by default
+        :type slices: list
+        :return: A start of a time slice and flows from that slice.
+        :rtype: tuple
+        """
+        if slices is None:
+            self.num_of_time_slices = self._compute_data_generator_size()
+            self.time_slices_processed = 0
+        first_seen = self._timestamps_to_datetimes(flows['ts'])
+        last_seen = self._timestamps_to_datetimes(flows['te'])
+        for start, selected in self._select_flows_in_time_slices(first_seen, last_seen, slices):
+            self.time_slices_processed = self.time_slices_processed + 1
+            if as_records:
+                yield start, flows[selected]
+            else:
+                yield start, self._columns_to_batch(flows[selected], variables)
+
+    def _aggregate_flows(self, flows, variables, aggregators, unit, slices=None):
+        """Aggregates flow records of overlapping time slices incrementally (see SlidingWindowAggregator).
+
+        Batches have the same layout as the ones parsed from aggregated nfdump output: one row per aggregator key,
+        sorted by the unit in descending order.
+
+        :param flows: Flow records
+        :type flows: np.ndarray
+        :param slices: Boundaries of consecutive time slices; slices of the full time window by default
+        :type slices: list
+        :return: A start of a time slice and a record batch with aggregated flows from that slice.
+        :rtype: tuple
+        """
+        if slices is None:
+            self.num_of_time_slices = self._compute_data_generator_size()
             self.time_slices_processed = 0
-            for _ in range(1):
-                try:
-                    data_as_2d_list = [flow.split('|') for flow in next(data_stream)[1].split('\n')]
-                    for row in data_as_2d_list[:-1]:
-                        flow_data = [f.lstrip() for f in row]
-                        flow_index = flow_data[0] + ' ' + flow_data[1] + ':' + flow_data[2] + ' -> ' + \
-                                     flow_data[3] + ':' + flow_data[4]
-                        csv_writer.writerow([flow_index] + flow_data[5:])
-                    self.time_slices_processed = self.time_slices_processed + 1
-                except StopIteration:
+            slices = list(self._get_time_slices())
+        if not slices:
+            return
+        aggregator = SlidingWindowAggregator(aggregators, int(slices[0][0].timestamp()), self.time_window, self.dt)
+        keys = None
+        for (start, _), (_, present, totals) in zip(slices, aggregator.aggregate(flows, len(slices))):
+            if keys is None:
+                keys = self._columns_to_batch(aggregator.key_records, list(aggregators))
+
+            batch = keys.iloc[present].reset_index(drop=True)
+            for i, v in enumerate(['PACKETS', 'BYTES', 'FLOWS']):
+                batch[v] = totals[:, i]
+            batch = batch.sort_values(unit or 'PACKETS', ascending=False, kind='stable').reset_index(drop=True)
+
+            self.time_slices_processed = self.time_slices_processed + 1
+            yield start, batch[list(variables)]
+
+    def _get_cache_chunks(self):
+        """Splits nfdump source into chunks cached separately (see FlowCache.update): the nfcapd files overlapping the
+        full time window if the source is cataloged (see NfcapdIndex), otherwise the whole source as a single chunk.
+
+        :return: Signatures of the chunks by their names and names of all chunks of the source (None if not known)
+        :rtype: tuple
+        """
+        nfdump_index = self._get_nfdump_index()
+        if nfdump_index is None:
+            return {os.path.abspath(self.nfdump_files): FlowCache.get_source_signature(self.nfdump_files)}, None
+
+        files = nfdump_index.get_files(int(self.full_time_window_start.timestamp()),
+                                       int(self.full_time_window_end.timestamp()))
+        return {f: [nfdump_index.files[f]['size'], nfdump_index.files[f]['mtime']] for f in files}, \
+            set(nfdump_index.files)
+
+    def _read_chunk(self, chunk, **filters):
+        """Reads all flows of a chunk of nfdump source (see _get_cache_chunks) as flow records, in parts of at most
+        READ_CHUNK_FLOWS flows (see the configuration file), natively or from the output of nfdump as it is printed.
+
+        :param chunk: A path to nfcapd file or the whole nfdump source
+        :type chunk: str
+        :return: Flow records
+        :rtype: np.ndarray
+        """
+        if self._is_native_query(flow_records.RECORD_VARIABLES, None, None, **filters):
+            if os.path.isfile(chunk):
+                files = [chunk]
+            else:
+                files = sorted([os.path.join(root, n) for root, _, names in os.walk(chunk) for n in names])
+            for f in files:
+                if not nfcapd_reader.is_nfcapd_file(f):
+                    continue
+                for columns in nfcapd_reader.NfcapdReader(f).read_chunks():
+                    yield flow_records.from_columns(columns)
+            return None
+
+        names = flow_records.RECORD_VARIABLES
+        if chunk == os.path.abspath(self.nfdump_files):
+            query = self._build_raw_flows_query(names, **filters)
+        else:
+            query = self._build_files_flows_query(chunk, names, **filters)
+        for output in system.execute_system_command_and_read_lines(query, cnf.NFDUMP.READ_CHUNK_FLOWS):
+            yield flow_records.from_batch(self._parse_data_slice(output.decode('utf-8'),
+                                                                 cnf.NFDUMP.FLOW_TIME_COLUMNS + names))
+        return None
+
+    def _update_flow_cache(self, **filters):
+        """Caches flows of the full time window that are not cached yet (see FlowCache.update).
+
+        :rtype: None
+        """
+        chunks, known = self._get_cache_chunks()
+        self.flow_cache.update(self.nfdump_files, filters, chunks, lambda c: self._read_chunk(c, **filters), known)
+        return None
+
+    def _load_flows(self, variables, **filters):
+        """Reads flow records of the full time window, from the flow cache if it is on.
+
+        :rtype: np.ndarray
+        """
+        if self.flow_cache is not None:
+            self._update_flow_cache(**filters)
+            return next(self.flow_cache.read_slices(self.nfdump_files,
+                                                    filters,
+                                                    [(self.full_time_window_start, self.full_time_window_end)],
+                                                    flow_records.get_fields(variables)))[2]
+        return self._get_raw_flows(variables, **filters)
+
+    def _split_cached_flows(self, variables, as_records=False, **filters):
+        """Splits flows of the full time window into time slices reading them from the flow cache slice by slice, so
+        that only the time buckets overlapping the current slice are held in memory.
+
+        Flows are assigned to a slice the same way nfdump -t does it (see _select_flows_in_time_slices).
+
+        For params description see _split_flows docstring.
+
+        :return: A start of a time slice and flows from that slice.
+        :rtype: tuple
+        """
+        self.num_of_time_slices = self._compute_data_generator_size()
+        self.time_slices_processed = 0
+        self._update_flow_cache(**filters)
+        for start, end, flows in self.flow_cache.read_slices(self.nfdump_files, filters, self._get_time_slices(),
+                                                            flow_records.get_fields(variables)):
+            for batch in self._split_flows(flows, variables, as_records, [(start, end)]):
+                yield batch
+
+    def _split_stored_flows(self, variables, as_records=False):
+        """Splits flows stored in Parquet files (see flow_store.is_flow_source) into time slices reading them slice by
+        slice, so that only the parts of the files overlapping the current slice are held in memory.
+
+        For params description see _split_flows docstring.
+
+        :return: A start of a time slice and flows from that slice.
+        :rtype: tuple
+        """
+        self.num_of_time_slices = self._compute_data_generator_size()
+        self.time_slices_processed = 0
+        for start, end, flows in flow_store.read_slices(self.nfdump_files, self._get_time_slices(),
+                                                        flow_records.get_fields(variables)):
+            for batch in self._split_flows(flows, variables, as_records, [(start, end)]):
+                yield batch
+
+    def _select_stored_data_batches(self, variables, aggregators, unit, as_records=False, **filters):
+        """Chooses the source of record batches of flows stored in Parquet files, e.g. by the flow meter or the flow
+        collector (see flow_store.is_flow_source).
+
+        Not aggregated queries are split into time slices as they are read (see _split_stored_flows) and aggregated
+        queries are computed incrementally (see SlidingWindowAggregator). Other aggregated queries and nfdump filters
+        are not supported, as nfdump cannot read these files.
+
+        For params description see building query method docstring.
+
+        :return: A generator of time slices starts and record batches (or flow records) for these slices.
+        :rtype: generator
+        """
+        aggregated = bool(aggregators or unit)
+        if any([v[1] for v in list(filters.values())]):
+            msg = 'Data Acquisitor: Filters are not supported for flows stored in Parquet files.'
+        elif aggregated and (as_records or not SlidingWindowAggregator.is_supported(variables, aggregators, unit)):
+            msg = 'Data Acquisitor: Flows stored in Parquet files support aggregation by aggregators and volumes only.'
+        else:
+            msg = None
+        if msg:
+            self.error_message = msg
+            raise AttributeError(msg)
+
+        if not aggregated:
+            return self._split_stored_flows(variables, as_records)
+        flows = next(flow_store.read_slices(self.nfdump_files,
+                                            [(self.full_time_window_start, self.full_time_window_end)],
+                                            flow_records.get_fields(list(aggregators) + ['PACKETS', 'BYTES'])))[2]
+        return self._aggregate_flows(flows, variables, aggregators, unit)
+
+    def _select_data_batches(self, variables, aggregators, unit, as_records=False, **filters):
+        """Chooses the source of record batches.
+
+        Not aggregated queries are read once for the full time window as flow records and split into time slices in
+        memory; if the flow cache is on, the flows are read from the cache slice by slice. Aggregated queries are
+        computed incrementally from the same flow records if incremental aggregation is on and the query allows it,
+        otherwise they are parsed from nfdump output of every time slice; they cannot be returned as flow records.
+
+        Flows stored in Parquet files are read without nfdump (see _select_stored_data_batches).
+
+        For params description see building query method docstring.
+
+        :return: A generator of time slices starts and record batches (or flow records) for these slices.
+        :rtype: generator
+        """
+        if flow_store.is_flow_source(self.nfdump_files):
+            return self._select_stored_data_batches(variables, aggregators, unit, as_records, **filters)
+        self._get_nfdump_index(update=True)
+        if variables and not aggregators and not unit:
+            if self.flow_cache is not None:
+                return self._split_cached_flows(variables, as_records, **filters)
+            if self.native_reader or self.single_pass or as_records:
+                return self._split_flows(self._get_raw_flows(variables, **filters), variables, as_records)
+
+        if not as_records and self.incremental_aggregation and \
+                SlidingWindowAggregator.is_supported(variables, aggregators, unit):
+            flows = self._load_flows(list(aggregators) + ['PACKETS', 'BYTES'], **filters)
+            return self._aggregate_flows(flows, variables, aggregators, unit)
+
+        if as_records:
+            msg = 'Data Acquisitor: Aggregated data cannot be read as flow records.'
+            self.error_message = msg
+            raise AttributeError(msg)
+
+        return ((start, self._parse_data_slice(data_slice, variables))
+                for start, data_slice in self._select_data_slices(variables, aggregators, unit, **filters))
+
+    @staticmethod
+    def _put_batch(batches, stop, batch):
+        """Puts a batch into the bounded buffer; waits for free space unless the consumer has stopped.
+
+        :return: True if the batch was put into the buffer, False if the consumer has stopped.
+        :rtype: bool
+        """
+        while not stop.is_set():
+            try:
+                batches.put(batch, timeout=cnf.NFDUMP.BATCHES_QUEUE_TIMEOUT)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce_data_batches(self, batches, stop, variables, aggregators, unit, as_records, **filters):
+        """Fills the bounded buffer with record batches; runs in a separate thread.
+
+        The end of the stream is marked with None. An exception raised while producing is passed to the consumer.
+
+        :rtype: None
+        """
+        try:
+            for batch in self._select_data_batches(variables, aggregators, unit, as_records, **filters):
+                if not self._put_batch(batches, stop, batch):
+                    return None
+        except Exception as e:
+            self.error_message = 'Data Acquisitor: ' + str(e)
+            self._put_batch(batches, stop, e)
+            return None
+
+        self._put_batch(batches, stop, None)
+        return None
+
+    def get_data_batches(self, variables, aggregators, unit, max_batches=cnf.NFDUMP.MAX_BATCHES_BUFFERED,
+                         as_records=False, **filters):
+        """Creates a generator that streams typed record batches, one per time slice.
+
+        Batches are produced in a background thread, at most max_batches of them are buffered at once, so memory
+        usage does not depend on the length of the capture. Not aggregated flows can be streamed as compact flow
+        records (see flow_records.FLOW_DTYPE) instead of record batches.
+
+        For params description see building query method docstring.
+
+        :param max_batches: Maximum number of batches buffered at once.
+        :type max_batches: int
+        :param as_records: Whether to stream flow records instead of typed record batches
+        :type as_records: bool
+        :return: A start of a time slice and a record batch (or flow records) with flows from that slice.
+        :rtype: tuple
+        """
+        batches = queue.Queue(maxsize=max_batches)
+        stop = threading.Event()
+        self.time_slices_processed = 0
+        producer = threading.Thread(target=self._produce_data_batches,
+                                    args=(batches, stop, variables, aggregators, unit, as_records),
+                                    kwargs=filters,
+                                    daemon=True)
+        producer.start()
+
+        try:
+            while True:
+                batch = batches.get()
+                if batch is None:
                     break
+                if isinstance(batch, Exception):
+                    raise batch
+                yield batch
+        finally:
+            stop.set()
+
+    @staticmethod
+    def _build_flow_index(batch, variables):
+        """Builds flows index like 'TCP 10.0.0.1:1234 -> 10.0.0.2:80' from the first five variables at once.
+
+        :param batch: Typed record batch
+        :type batch: pd.DataFrame
+        :param variables: Protocol, source address, source port, destination address and destination port variables
+        :type variables: list
+        :rtype: pd.Series
+        """
+        parts = []
+        for v in variables[:5]:
+            if cnf.NFDUMP.VARIABLES_TYPES[v] == 'numeric':
+                parts.append(batch[v].fillna(0).astype(np.int64).astype(str))
+            else:
+                parts.append(batch[v].astype(str))
+        return parts[0] + ' ' + parts[1] + ':' + parts[2] + ' -> ' + parts[3] + ':' + parts[4]
+
+    def follow(self, variables, aggregators, unit, stop=None, from_beginning=False, as_records=False, **filters):
+        """Follows nfcapd files rotated into nfdump_files directory and streams time slices as soon as they are
+        complete.
+
+        Only the files that appear in the directory are read (all files if from_beginning is on). Time slices are
+        aligned to dt and a slice is complete when flows ending at least FOLLOW_LATENESS seconds after its end have
+        been read; flows that arrive later than that are dropped. Aggregated queries are supported for aggregators
+        and volumes only (see SlidingWindowAggregator).
+
+        For params description see building query and get_data_batches methods docstrings.
+
+        :param stop: An event that stops following; if not given, following never stops
+        :type stop: threading.Event
+        :param from_beginning: Whether to read the files already present in the directory
+        :type from_beginning: bool
+        :return: A start of a time slice and a record batch (or flow records) with flows from that slice.
+        :rtype: tuple
+        """
+        aggregated = bool(aggregators or unit)
+        if not os.path.isdir(self.nfdump_files) or flow_store.is_flow_source(self.nfdump_files):
+            msg = 'Data Acquisitor: Follow mode requires a directory with nfcapd files.'
+        elif aggregated and (as_records or not SlidingWindowAggregator.is_supported(variables, aggregators, unit)):
+            msg = 'Data Acquisitor: Follow mode supports aggregation by aggregators and volumes only.'
+        else:
+            msg = None
+        if msg:
+            self.error_message = msg
+            raise AttributeError(msg)
+
+        stop = stop or threading.Event()
+        nfdump_index = NfcapdIndex(self.nfdump_files)
+        nfdump_index.update()
+        seen = set() if from_beginning else set(nfdump_index.files)
+        fields_variables = list(aggregators) + ['PACKETS', 'BYTES'] if aggregated else variables
+
+        flows = np.empty(0, dtype=flow_records.FLOW_DTYPE)
+        next_start = None
+        watermark = None
+        self.num_of_time_slices = None
+        self.time_slices_processed = 0
+        self.info_message = 'Following ' + self.nfdump_files + '...'
+        while not stop.is_set():
+            nfdump_index.update()
+            new = sorted([p for p, e in nfdump_index.files.items() if p not in seen and 'skipped' not in e],
+                         key=lambda p: (nfdump_index.files[p]['first'], p))
+            seen.update(new)
+            if new:
+                flows = np.concatenate([flows, self._get_files_flows(new, fields_variables, **filters)])
+            if len(flows):
+                if next_start is None:
+                    next_start = int(flows['ts'].min()) // 1000 // self.dt * self.dt
+                watermark = max(watermark or 0, int(flows['te'].max()) // 1000)
+
+            slices = []
+            while next_start is not None and next_start + self.time_window <= watermark - cnf.NFDUMP.FOLLOW_LATENESS:
+                start = datetime.fromtimestamp(next_start)
+                slices.append((start, start + timedelta(seconds=self.time_window)))
+                next_start = next_start + self.dt
+            if not slices:
+                stop.wait(cnf.NFDUMP.FOLLOW_POLL_INTERVAL)
+                continue
+
+            if aggregated:
+                batches = self._aggregate_flows(flows, variables, aggregators, unit, slices)
+            else:
+                batches = self._split_flows(flows, variables, as_records, slices)
+            for batch in batches:
+                yield batch
+            flows = flows[flows['ts'] // 1000 >= next_start]
+
+        self.info_message = 'Following ' + self.nfdump_files + ' stopped.'
+        return None
+
+    @staticmethod
+    def _aggregate_volumes(records, aggregators, unit):
+        """Sums a volume of flow records per aggregator key, the way nfdump -A aggregates flows.
+
+        :param records: Flow records
+        :type records: np.ndarray
+        :param aggregators: NetFlow records aggregators in human readable format
+        :type aggregators: list
+        :param unit: PACKETS, BYTES or FLOWS
+        :type unit: str
+        :return: The volume of every key
+        :rtype: np.ndarray
+        """
+        if not len(records):
+            return np.empty(0)
+        fields = []
+        for a in aggregators:
+            fields += [f for f in AGGREGATORS_FIELDS[a] if f not in fields]
+        _, ids = np.unique(np.stack([records[f].astype(np.uint64) for f in fields], axis=1), axis=0,
+                           return_inverse=True)
+        weights = {'PACKETS': records['packets'], 'BYTES': records['bytes'], 'FLOWS': None}[unit]
+        return np.bincount(ids.ravel(), weights=weights)
+
+    def follow_features(self, stop=None, from_beginning=False, anomaly=None, **filters):
+        """Follows nfcapd files (see follow) and extracts features of every complete time slice.
+
+        Without an anomaly features of every flow of the slice are extracted. With an anomaly definition (see
+        anomalies_library) a single row of features of the slice is computed instead: for every query of the
+        definition the volumes of its unit are aggregated by its aggregators and its features (e.g. ENTROPY) are
+        extracted from them. Flows are read once for all queries, hence the queries must share their filters.
+
+        :param anomaly: An anomaly definition, e.g. anomalies_library.DDoS()
+        :type anomaly: object
+        :return: A start of a time slice and features of its flows.
+        :rtype: tuple
+        """
+        if anomaly is not None:
+            if any([f != anomaly.filters[0] for f in anomaly.filters]):
+                msg = 'Data Acquisitor: Follow mode requires all queries of an anomaly to share their filters.'
+                self.error_message = msg
+                raise AttributeError(msg)
+            filters = dict(anomaly.filters[0], **filters)
+
+        for start, records in self.follow(flow_records.RECORD_VARIABLES, None, None, stop, from_beginning,
+                                          as_records=True, **filters):
+            if anomaly is None:
+                yield start, self.features_extractor.extract_features(flow_records.to_frame(records))
+                continue
+
+            row = {}
+            for aggregators, unit, features, column in zip(anomaly.aggregators, anomaly.unit, anomaly.features,
+                                                           anomaly.columns):
+                values = self._aggregate_volumes(records, aggregators, unit)
+                for f, v in zip(features, self.features_extractor.extract_aggregated_features(features, values)):
+                    row[column + ' ' + f] = v
+            yield start, pd.DataFrame([row], index=pd.DatetimeIndex([start], name='TIME SLICE'))
+
+    def detect(self, anomaly_name, stop=None, from_beginning=False, max_slices=cnf.DETECTOR.MAX_SLICES):
+        """Follows nfcapd files and computes features of an anomaly for every complete time slice (see
+        follow_features); it is meant to be run as a job until the job is cancelled.
 
+        Features of the latest max_slices time slices are kept in detections.
+
+        :param anomaly_name: A name of the anomaly, see DETECTOR.ANOMALIES in the configuration file
+        :type anomaly_name: str
+        :param stop: An event that stops following; if not given, following never stops
+        :type stop: threading.Event
+        :param from_beginning: Whether to read the files already present in the directory
+        :type from_beginning: bool
+        :rtype: None
+        """
+        anomaly = getattr(anomalies_library, anomaly_name)()
+        self.detections = pd.DataFrame()
+        for start, features in self.follow_features(stop, from_beginning, anomaly):
+            self.detections = pd.concat([self.detections, features]).iloc[-max_slices:]
+            self.info_message = anomaly_name + ' features of the time slice starting at ' + str(start) + \
+                ' have been computed.'
         return None
 
+    def get_custom_data(self, variables, aggregators, export_csv=False):
+        """Gets flows as a typed DataFrame indexed with flows identifiers; exporting to CSV is optional.
+
+        :param variables: NetFlow fields; the first five build the flows index (see _build_flow_index)
+        :type variables: list
+        :param aggregators: NetFlow records aggregators
+        :type aggregators: list
+        :param export_csv: Whether to append the flows to the CSV file named after csv_filename
+        :type export_csv: bool
+        :return: Flows with all variables but the first five as columns
+        :rtype: pd.DataFrame
+        """
+        batches = []
+        self.time_slices_processed = 0
+        for _, batch in itertools.islice(self.get_data_batches(variables, aggregators, None),
+                                         cnf.NFDUMP.CUSTOM_DATA_SLICES):
+            batch.index = self._build_flow_index(batch, variables)
+            batches.append(batch[variables[5:]])
+        data = pd.concat(batches) if batches else pd.DataFrame(columns=variables[5:])
+        data.index.name = 'INDEX'
+
+        if export_csv:
+            data.to_csv(self.csv_path + self.csv_filename + '.csv', mode='a', header=False, quoting=csv.QUOTE_ALL)
+
+        return data
+
     def get_custom_data_aggregate(self):
         pass
 
@@ -227,20 +1219,31 @@ class DataAcquisitor:
     def get_features_advanced(self):
         pass
 
+    def get_flow_records(self, **filters):
+        """Gets flows of the first time slices (see CUSTOM_DATA_SLICES in the configuration file) as flow records.
+
+        :param filters: nfdump filters in human readable format.
+        :type filters: dict
+        :rtype: np.ndarray
+        """
+        self.time_slices_processed = 0
+        records = [r for _, r in itertools.islice(self.get_data_batches(flow_records.RECORD_VARIABLES, None, None,
+                                                                        as_records=True, **filters),
+                                                  cnf.NFDUMP.CUSTOM_DATA_SLICES)]
+        return np.concatenate(records) if records else np.empty(0, dtype=flow_records.FLOW_DTYPE)
+
     def get_all(self):
+        """Appends flows of the first time slices to the CSV file named after csv_filename (see get_custom_data).
+
+        It is run as a job, so the flows are not returned to be sent back to the GUI process.
+
+        :rtype: None
+        """
         variables = ['PROTOCOL', 'SOURCE ADDRESS', 'SOURCE PORT', 'DESTINATION ADDRESS',
                      'DESTINATION PORT', 'FIRST SEEN', 'DURATION', 'TCP FLAGS', 'PACKETS',
                      'BYTES']
-        self.get_custom_data(variables, None)
-        raw_data_plain = pd.read_csv(self.csv_path + self.csv_filename + '.csv', header=None)
-        raw_data_plain.columns = ['INDEX'] + variables[5:]
-        raw_data_plain.set_index('INDEX', inplace=True)
-        raw_data_plain['DURATION'] = pd.to_numeric(raw_data_plain['DURATION'], errors='coerce')
-        raw_data_plain['PACKETS'] = pd.to_numeric(raw_data_plain['PACKETS'], errors='coerce')
-        raw_data_plain['BYTES'] = pd.to_numeric(raw_data_plain['BYTES'], errors='coerce')
-        raw_data_plain.dropna(inplace=True)
-        data = self.features_extractor.extract_features(raw_data_plain)
-        print('')
+        self.get_custom_data(variables, None, export_csv=True)
+        return None
 
     def write_raw_data(self, filename):
         if self.query is not None:
@@ -2,6 +2,8 @@ import pandas as pd
 import numpy as np
 from scipy import stats
 
+from naadi import flow_records
+
 
 class FeaturesExtractor:
     def __init__(self):
@@ -9,26 +11,40 @@ class FeaturesExtractor:
         self.features_extracted = None
 
     def extract_features(self, raw_data):
+        """Extracts features of every flow.
+
+        :param raw_data: Flow records unpacked into columns, see flow_records.to_frame
+        :type raw_data: pd.DataFrame
+        :rtype: pd.DataFrame
+        """
         features = dict()
         self.features_extracted = 0
-        features['packet_size_mean'] = raw_data['BYTES'] / raw_data['PACKETS']
-        self.features_extracted = self.features_extracted + 1
-        features['packet_rate'] = raw_data['PACKETS'] / raw_data['DURATION']
-        self.features_extracted = self.features_extracted + 1
-        features['bytes_rate'] = raw_data['BYTES'] / raw_data['DURATION']
-        self.features_extracted = self.features_extracted + 1
-        features['SYN'] = raw_data['TCP FLAGS'].str.contains('S').astype(int)
+        duration = (raw_data['te'] - raw_data['ts']) / 1000
+        features['packet_size_mean'] = raw_data['bytes'] / raw_data['packets']
         self.features_extracted = self.features_extracted + 1
-        features['ACK'] = raw_data['TCP FLAGS'].str.contains('A').astype(int)
+        features['packet_rate'] = raw_data['packets'] / duration
         self.features_extracted = self.features_extracted + 1
-        features['RST'] = raw_data['TCP FLAGS'].str.contains('R').astype(int)
-        self.features_extracted = self.features_extracted + 1
-        features['PSH'] = raw_data['TCP FLAGS'].str.contains('P').astype(int)
-        self.features_extracted = self.features_extracted + 1
-        features['FIN'] = raw_data['TCP FLAGS'].str.contains('F').astype(int)
+        features['bytes_rate'] = raw_data['bytes'] / duration
         self.features_extracted = self.features_extracted + 1
+        for name, bit in (('SYN', flow_records.TCP_SYN), ('ACK', flow_records.TCP_ACK), ('RST', flow_records.TCP_RST),
+                          ('PSH', flow_records.TCP_PSH), ('FIN', flow_records.TCP_FIN)):
+            features[name] = ((raw_data['flags'].values & bit) > 0).astype(int)
+            self.features_extracted = self.features_extracted + 1
+
+        return pd.DataFrame(features, index=raw_data.index)
+
+    def extract_aggregated_features(self, features, values):
+        """Extracts features of a single time slice from aggregated volumes (e.g. packets per destination).
 
-        return pd.DataFrame.from_dict(features)
+        :param features: Names of the features, e.g. ENTROPY
+        :type features: list
+        :param values: Aggregated volumes of the time slice
+        :type values: np.ndarray
+        :return: Values of the features in the order of their names
+        :rtype: list
+        """
+        extractors = {'ENTROPY': self.compute_entropy}
+        return [extractors[f](values) for f in features]
 
     @staticmethod
     def compute_entropy(series):
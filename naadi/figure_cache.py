@@ -0,0 +1,85 @@
+import pickle
+import time
+from collections import OrderedDict
+
+import configuration as cnf
+
+
+class FigureCache:
+    """In-memory cache of figures built by Presenter.
+
+    Entries expire timeout seconds after they were built and the least recently used entries are evicted when the
+    cache grows over its memory budget; the size of an entry is the size of the pickled figure.
+    """
+
+    def __init__(self, timeout=cnf.GUI.CACHE_TIMEOUT, max_bytes=cnf.GUI.CACHE_MAX_BYTES):
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+
+        self.entries = OrderedDict()
+        self.bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+
+    def __getstate__(self):
+        """Keeps only the settings, so figures are not copied to worker processes (see JobManager)."""
+        return {'timeout': self.timeout, 'max_bytes': self.max_bytes}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def _remove(self, key):
+        _, size, _ = self.entries.pop(key)
+        self.bytes = self.bytes - size
+        return None
+
+    def get(self, key):
+        """Gets a figure from the cache.
+
+        :param key: A hashable key of the figure
+        :return: The figure or None if it is not cached or it has expired
+        """
+        entry = self.entries.get(key)
+        if entry is not None and time.monotonic() - entry[2] > self.timeout:
+            self._remove(key)
+            entry = None
+        if entry is None:
+            self.misses = self.misses + 1
+            return None
+
+        self.hits = self.hits + 1
+        self.entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, figure):
+        """Stores a figure and evicts the least recently used ones over the memory budget; a figure larger than the
+        budget is not stored.
+
+        :param key: A hashable key of the figure
+        :rtype: None
+        """
+        if key in self.entries:
+            self._remove(key)
+        size = len(pickle.dumps(figure, protocol=pickle.HIGHEST_PROTOCOL))
+        if size > self.max_bytes:
+            return None
+
+        self.entries[key] = (figure, size, time.monotonic())
+        self.bytes = self.bytes + size
+        while self.bytes > self.max_bytes:
+            self._remove(next(iter(self.entries)))
+        return None
+
+    def clear(self):
+        self.entries.clear()
+        self.bytes = 0
+        return None
+
+
+def main():
+    return FigureCache()
+
+
+if __name__ == '__main__':
+    main()
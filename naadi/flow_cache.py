@@ -0,0 +1,261 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+import configuration as cnf
+from naadi import flow_records
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+class FlowCache:
+    """On-disk columnar (Parquet) cache of decoded flow records.
+
+    An entry is keyed by the nfdump source path and the query (filters). The source is cached in chunks, e.g. one
+    chunk per nfcapd file: flows of a chunk are split into time buckets of flow start times as they are read and every
+    bucket of the chunk is written to a separate Parquet file, so neither the whole source nor a whole chunk is held
+    in memory. A query of a time range loads only the chunks overlapping it and reads only the buckets overlapping
+    it. A chunk is loaded again when its signature (e.g. size and modification time of the file) changes and entries
+    are evicted in the least recently used order when the cache grows over its disk budget.
+    """
+
+    def __init__(self, directory=cnf.CACHE.DIR, max_bytes=cnf.CACHE.MAX_BYTES, bucket=cnf.CACHE.BUCKET_SECONDS):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.bucket = bucket
+
+        self.index_path = os.path.join(self.directory, cnf.CACHE.INDEX_FILE)
+        self.index = {}
+
+        self.hits = 0
+        self.misses = 0
+
+        self._load_index()
+
+    def _load_index(self):
+        if os.path.isfile(self.index_path):
+            with open(self.index_path, 'r') as f:
+                self.index = json.load(f)
+        return None
+
+    def _save_index(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.index_path + '.tmp', 'w') as f:
+            json.dump(self.index, f)
+        os.replace(self.index_path + '.tmp', self.index_path)
+        return None
+
+    @staticmethod
+    def get_source_signature(source):
+        """Describes the state of nfdump source; a change of the signature invalidates cached entries.
+
+        The whole directory tree is walked, hence it is used only if the source is not cataloged (see NfcapdIndex).
+
+        :param source: A path to nfdump binary or a directory with nfdump binaries
+        :type source: str
+        :return: Number of files, their total size and the latest modification time
+        :rtype: list
+        """
+        if os.path.isfile(source):
+            files = [source]
+        else:
+            files = [os.path.join(root, n) for root, _, names in os.walk(source) for n in names]
+        stats = [os.stat(f) for f in files]
+        return [len(stats), sum([s.st_size for s in stats]), max([s.st_mtime for s in stats], default=0)]
+
+    @staticmethod
+    def _get_key(source, query):
+        return hashlib.sha1(json.dumps([os.path.abspath(source), query, flow_records.FLOW_DTYPE.names])
+                            .encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _get_chunk_file(chunk):
+        return hashlib.sha1(chunk.encode('utf-8')).hexdigest() + '.parquet'
+
+    def _get_bucket_path(self, key, bucket, chunk):
+        return os.path.join(self.directory, key, str(bucket), self._get_chunk_file(chunk))
+
+    def _remove(self, key):
+        shutil.rmtree(os.path.join(self.directory, key), ignore_errors=True)
+        self.index.pop(key, None)
+        return None
+
+    def _remove_chunk(self, key, chunk):
+        entry = self.index[key]
+        for bucket in entry['chunks'].pop(chunk)['buckets']:
+            try:
+                os.remove(self._get_bucket_path(key, bucket, chunk))
+            except FileNotFoundError:
+                pass
+        entry['bytes'] = sum([sum(c['buckets'].values()) for c in entry['chunks'].values()])
+        return None
+
+    def _evict(self, keep):
+        """Removes the least recently used entries until the cache fits into its disk budget.
+
+        :param keep: A key of the entry that must not be evicted
+        :type keep: str
+        :rtype: None
+        """
+        for key in sorted(self.index, key=lambda k: self.index[k]['accessed']):
+            if sum([e['bytes'] for e in self.index.values()]) <= self.max_bytes:
+                break
+            if key != keep:
+                self._remove(key)
+        return None
+
+    def _store_chunk(self, key, chunk, parts):
+        """Splits parts of a chunk into time buckets by flow start and appends every part of a bucket to the Parquet
+        file of the bucket and the chunk.
+
+        :param parts: Flow records of the chunk in parts of bounded size, in any order
+        :type parts: iterable
+        :return: Sizes of the written files by bucket
+        :rtype: dict
+        """
+        schema = pyarrow.schema([(n, pyarrow.from_numpy_dtype(flow_records.FLOW_DTYPE[n]))
+                                 for n in flow_records.FLOW_DTYPE.names])
+        writers = {}
+        try:
+            for flows in parts:
+                buckets = flows['ts'] // 1000 // self.bucket * self.bucket
+                for bucket in np.unique(buckets):
+                    bucket = int(bucket)
+                    if bucket not in writers:
+                        path = self._get_bucket_path(key, bucket, chunk)
+                        os.makedirs(os.path.dirname(path), exist_ok=True)
+                        writers[bucket] = pyarrow.parquet.ParquetWriter(path, schema)
+                    writers[bucket].write_table(pyarrow.Table.from_pandas(
+                        flow_records.to_frame(flows[buckets == bucket]), schema=schema, preserve_index=False))
+        finally:
+            for writer in writers.values():
+                writer.close()
+        return {str(b): os.path.getsize(self._get_bucket_path(key, b, chunk)) for b in writers}
+
+    def update(self, source, query, chunks, loader, known=None):
+        """Caches flows of the chunks of the source that are not cached yet or have changed since they were cached.
+
+        :param source: A path to nfdump binary or a directory with nfdump binaries
+        :type source: str
+        :param query: Anything that identifies the query together with the source, e.g. filters
+        :param chunks: Signatures of the chunks needed by their names
+        :type chunks: dict
+        :param loader: A function of a chunk name that returns flow records of the chunk in parts of bounded size
+        :type loader: function
+        :param known: Names of all chunks of the source; cached chunks not among them are removed
+        :type known: set
+        :rtype: None
+        """
+        key = self._get_key(source, query)
+        entry = self.index.get(key)
+        if entry is None or 'chunks' not in entry:
+            self._remove(key)
+            entry = {'source': os.path.abspath(source),
+                     'query': query,
+                     'chunks': {},
+                     'bytes': 0,
+                     'accessed': time.time()}
+            self.index[key] = entry
+
+        stale = [c for c in entry['chunks'] if (known is not None and c not in known) or
+                 (c in chunks and entry['chunks'][c]['signature'] != chunks[c])]
+        for chunk in stale:
+            self._remove_chunk(key, chunk)
+
+        missing = [c for c in chunks if c not in entry['chunks']]
+        if missing:
+            self.misses = self.misses + 1
+        else:
+            self.hits = self.hits + 1
+        for chunk in missing:
+            entry['chunks'][chunk] = {'signature': chunks[chunk], 'buckets': self._store_chunk(key, chunk,
+                                                                                               loader(chunk))}
+            entry['bytes'] = entry['bytes'] + sum(entry['chunks'][chunk]['buckets'].values())
+
+        entry['accessed'] = time.time()
+        if missing or stale:
+            self._evict(key)
+        self._save_index()
+        return None
+
+    def _read_bucket(self, key, bucket, columns):
+        """Reads flows of a time bucket of all cached chunks, sorted by flow start.
+
+        :rtype: np.ndarray
+        """
+        frames = [pd.read_parquet(self._get_bucket_path(key, bucket, c), columns=columns)
+                  for c, e in sorted(self.index[key]['chunks'].items()) if str(bucket) in e['buckets']]
+        if not frames:
+            return np.empty(0, dtype=flow_records.FLOW_DTYPE)
+        flows = flow_records.from_columns(pd.concat(frames, ignore_index=True))
+        return flows[np.argsort(flows['ts'], kind='stable')]
+
+    def read_slices(self, source, query, slices, columns):
+        """Reads cached flows that start within consecutive time ranges (see update).
+
+        Only the buckets overlapping the current range are held in memory and only the requested fields (plus flow
+        start and end) are read from disk; the other fields of the returned flow records are zeroed.
+
+        :param source: A path to nfdump binary or a directory with nfdump binaries
+        :type source: str
+        :param query: Anything that identifies the query together with the source, e.g. filters
+        :param slices: Starts and ends of the time ranges in ascending order
+        :type slices: iterable
+        :param columns: Flow record fields to be read
+        :type columns: list
+        :return: A start and an end of a time range and flow records sorted by flow start
+        :rtype: tuple
+        """
+        key = self._get_key(source, query)
+        columns = ['ts', 'te'] + [c for c in columns if c not in ('ts', 'te')]
+        loaded = {}
+        for start, end in slices:
+            t_start = int(start.timestamp())
+            t_end = int(end.timestamp())
+            buckets = list(range(t_start // self.bucket * self.bucket, t_end + 1, self.bucket))
+            for bucket in [b for b in loaded if b not in buckets]:
+                del loaded[bucket]
+            for bucket in [b for b in buckets if b not in loaded]:
+                loaded[bucket] = self._read_bucket(key, bucket, columns)
+
+            flows = np.concatenate([loaded[b] for b in buckets])
+            first_seen = flows['ts'] // 1000
+            yield start, end, flows[(first_seen >= t_start) & (first_seen <= t_end)]
+
+    def load(self, source, query, t_start, t_end, columns, chunks, loader, known=None):
+        """Loads flows that start within the time range from the cache; caches the chunks needed first (see update).
+
+        For params description see update and read_slices methods docstrings.
+
+        :param t_start: A start of the time range
+        :type t_start: datetime
+        :param t_end: An end of the time range
+        :type t_end: datetime
+        :return: Flow records sorted by flow start
+        :rtype: np.ndarray
+        """
+        self.update(source, query, chunks, loader, known)
+        return next(self.read_slices(source, query, [(t_start, t_end)], columns))[2]
+
+    def clear(self):
+        for key in list(self.index):
+            self._remove(key)
+        self._save_index()
+        return None
+
+
+def main():
+    return FlowCache()
+
+
+if __name__ == '__main__':
+    main()
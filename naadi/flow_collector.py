@@ -0,0 +1,627 @@
+import asyncio
+import os
+import socket
+import struct
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+import configuration as cnf
+from naadi import flow_records
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+NETFLOW_V5 = 5
+NETFLOW_V9 = 9
+IPFIX = 10
+
+V5_HEADER = struct.Struct('>HHIII')
+V9_HEADER = struct.Struct('>HHIIII')
+IPFIX_HEADER = struct.Struct('>HHIII')
+SET_HEADER = struct.Struct('>HH')
+V5_HEADER_SIZE = 24
+V5_MAX_RECORDS = 30
+
+V9_TEMPLATE_SET = 0
+V9_OPTIONS_TEMPLATE_SET = 1
+IPFIX_TEMPLATE_SET = 2
+IPFIX_OPTIONS_TEMPLATE_SET = 3
+MIN_DATA_SET = 256
+VARIABLE_LENGTH = 65535
+ENTERPRISE_BIT = 0x8000
+
+# Information elements (NetFlow v9 field types, IPFIX element IDs) flow records are built from
+IN_BYTES = 1
+IN_PKTS = 2
+PROTOCOL = 4
+SRC_TOS = 5
+TCP_FLAGS = 6
+L4_SRC_PORT = 7
+IPV4_SRC_ADDR = 8
+L4_DST_PORT = 11
+IPV4_DST_ADDR = 12
+LAST_SWITCHED = 21
+FIRST_SWITCHED = 22
+IPV6_SRC_ADDR = 27
+IPV6_DST_ADDR = 28
+ICMP_TYPE = 32
+OCTET_TOTAL_COUNT = 85
+PACKET_TOTAL_COUNT = 86
+FLOW_START_SECONDS = 150
+FLOW_END_SECONDS = 151
+FLOW_START_MILLISECONDS = 152
+FLOW_END_MILLISECONDS = 153
+
+# NetFlow v5 record layout expressed as a template (nexthop, interfaces, AS numbers and masks are not used)
+V5_FIELDS = ((IPV4_SRC_ADDR, 4), (IPV4_DST_ADDR, 4), (15, 4), (10, 2), (14, 2), (IN_PKTS, 4), (IN_BYTES, 4),
+             (FIRST_SWITCHED, 4), (LAST_SWITCHED, 4), (L4_SRC_PORT, 2), (L4_DST_PORT, 2), (0, 1), (TCP_FLAGS, 1),
+             (PROTOCOL, 1), (SRC_TOS, 1), (16, 2), (17, 2), (9, 1), (13, 1), (0, 2))
+IPFIX_V4_FIELDS = ((FLOW_START_MILLISECONDS, 8), (FLOW_END_MILLISECONDS, 8), (IPV4_SRC_ADDR, 4), (IPV4_DST_ADDR, 4),
+                   (L4_SRC_PORT, 2), (L4_DST_PORT, 2), (PROTOCOL, 1), (SRC_TOS, 1), (TCP_FLAGS, 1),
+                   (PACKET_TOTAL_COUNT, 8), (OCTET_TOTAL_COUNT, 8))
+IPFIX_V6_FIELDS = ((FLOW_START_MILLISECONDS, 8), (FLOW_END_MILLISECONDS, 8), (IPV6_SRC_ADDR, 16), (IPV6_DST_ADDR, 16),
+                   (L4_SRC_PORT, 2), (L4_DST_PORT, 2), (PROTOCOL, 1), (SRC_TOS, 1), (TCP_FLAGS, 1),
+                   (PACKET_TOTAL_COUNT, 8), (OCTET_TOTAL_COUNT, 8))
+
+RECORD_FIELDS = {'bytes': (IN_BYTES, OCTET_TOTAL_COUNT),
+                 'packets': (IN_PKTS, PACKET_TOTAL_COUNT),
+                 'proto': (PROTOCOL,),
+                 'tos': (SRC_TOS,),
+                 'flags': (TCP_FLAGS,),
+                 'src_port': (L4_SRC_PORT,),
+                 'dst_port': (L4_DST_PORT, ICMP_TYPE)}
+TIME_FIELDS = {'ts': (FLOW_START_MILLISECONDS, FLOW_START_SECONDS, FIRST_SWITCHED),
+               'te': (FLOW_END_MILLISECONDS, FLOW_END_SECONDS, LAST_SWITCHED)}
+ADDRESS_FIELDS = {'src': (IPV4_SRC_ADDR, IPV6_SRC_ADDR),
+                  'dst': (IPV4_DST_ADDR, IPV6_DST_ADDR)}
+
+
+class Template:
+    """Layout of data records of a NetFlow v9 or IPFIX template (or of NetFlow v5 records).
+
+    The layout is translated into a NumPy structured dtype once, so data records of the template are decoded a whole
+    batch at a time. Templates with variable length fields are not supported.
+    """
+
+    def __init__(self, fields):
+        """
+        :param fields: Field types (information elements) and lengths in the order of the template
+        :type fields: tuple
+        """
+        self.fields = fields
+        self.length = sum([l for _, l in fields])
+        self.dtype = None
+
+        if not self.length or any([l == VARIABLE_LENGTH for _, l in fields]):
+            return
+
+        names, formats, offsets = [], [], []
+        offset = 0
+        for t, l in fields:
+            name = 'f' + str(t)
+            if t and name not in names and name + '_hi' not in names:
+                if t in (IPV6_SRC_ADDR, IPV6_DST_ADDR) and l == 16:
+                    names, formats, offsets = names + [name + '_hi', name + '_lo'], formats + ['>u8', '>u8'], \
+                        offsets + [offset, offset + 8]
+                elif l in (1, 2, 4, 8):
+                    names, formats, offsets = names + [name], formats + ['>u' + str(l)], offsets + [offset]
+            offset = offset + l
+        self.dtype = np.dtype({'names': names, 'formats': formats, 'offsets': offsets, 'itemsize': self.length})
+
+    def _get(self, values, types):
+        for t in types:
+            if 'f' + str(t) in self.dtype.names:
+                return t, values['f' + str(t)]
+        return None, None
+
+    def to_records(self, data, export_times, uptimes):
+        """Decodes data records of the template into flow records.
+
+        :param data: Data records of the template
+        :type data: bytes
+        :param export_times: Export time (ms) of the packet every record came in
+        :type export_times: np.ndarray
+        :param uptimes: System uptime (ms) of the exporter when the packet was sent, -1 if not known (IPFIX)
+        :type uptimes: np.ndarray
+        :rtype: np.ndarray
+        """
+        values = np.frombuffer(data, dtype=self.dtype)
+        records = np.zeros(len(values), dtype=flow_records.FLOW_DTYPE)
+
+        for field, types in RECORD_FIELDS.items():
+            _, v = self._get(values, types)
+            if v is not None:
+                records[field] = v
+        for prefix, (ipv4, ipv6) in ADDRESS_FIELDS.items():
+            if 'f' + str(ipv6) + '_hi' in self.dtype.names:
+                records[prefix + '_addr_hi'] = values['f' + str(ipv6) + '_hi']
+                records[prefix + '_addr_lo'] = values['f' + str(ipv6) + '_lo']
+                records['ipv6'] = True
+            elif 'f' + str(ipv4) in self.dtype.names:
+                records[prefix + '_addr_lo'] = values['f' + str(ipv4)]
+
+        for field, types in TIME_FIELDS.items():
+            t, v = self._get(values, types)
+            if t in (FLOW_START_MILLISECONDS, FLOW_END_MILLISECONDS):
+                records[field] = v
+            elif t in (FLOW_START_SECONDS, FLOW_END_SECONDS):
+                records[field] = v.astype(np.int64) * 1000
+            elif t is not None:
+                records[field] = np.where(uptimes >= 0,
+                                          export_times - ((uptimes - v.astype(np.int64)) & 0xFFFFFFFF), export_times)
+            else:
+                records[field] = export_times
+        return records
+
+    def to_data(self, records):
+        """Encodes flow records as data records of the template (the inverse of to_records for the fields used).
+
+        :rtype: np.ndarray
+        """
+        values = np.zeros(len(records), dtype=self.dtype)
+        for field, types in RECORD_FIELDS.items():
+            t, _ = self._get(values, types)
+            if t is not None:
+                values['f' + str(t)] = records[field]
+        for prefix, (ipv4, ipv6) in ADDRESS_FIELDS.items():
+            if 'f' + str(ipv6) + '_hi' in self.dtype.names:
+                values['f' + str(ipv6) + '_hi'] = records[prefix + '_addr_hi']
+                values['f' + str(ipv6) + '_lo'] = records[prefix + '_addr_lo']
+            elif 'f' + str(ipv4) in self.dtype.names:
+                values['f' + str(ipv4)] = records[prefix + '_addr_lo']
+        for field, types in TIME_FIELDS.items():
+            t, _ = self._get(values, types)
+            if t is not None:
+                values['f' + str(t)] = records[field]
+        return values
+
+
+V5_TEMPLATE = Template(V5_FIELDS)
+
+
+class _CollectorProtocol(asyncio.DatagramProtocol):
+    def __init__(self, collector):
+        self.collector = collector
+
+    def datagram_received(self, data, addr):
+        self.collector.receive(data, addr)
+
+
+class FlowCollector:
+    """Built-in NetFlow v5, v9 and IPFIX collector (in place of nfcapd) listening on a UDP socket with asyncio.
+
+    A received packet is only split into sets: data records are kept as bytes per template and decoded in batches
+    (see Template), when enough records are pending or every flush interval. Decoded flows are written as row groups
+    to a Parquet file of flow records; the file is rotated every time interval, the same way nfcapd rotates its
+    files.
+    """
+
+    def __init__(self,
+                 address=cnf.NFDUMP.NFCAPD_DEFAULT_ADDRESS,
+                 port=cnf.NFDUMP.NFCAPD_DEFAULT_PORT,
+                 output_dir=cnf.FLOW_COLLECTOR.DIR,
+                 time_interval=cnf.NFDUMP.NFCAPD_TIME_INTERVAL):
+        if pyarrow is None:
+            raise ImportError('Flow collector: pyarrow is required to write Parquet files.')
+
+        self.address = address
+        self.port = port
+        self.output_dir = output_dir
+        self.time_interval = time_interval
+
+        self.info_message = 'Flow collector is in idle state...'
+        self.error_message = ''
+
+        self.packets_received = 0
+        self.packets_dropped = 0
+        self.sets_dropped = 0
+        self.option_sets_received = 0
+        self.flows_received = 0
+        self.flows_written = 0
+        self.files_written = 0
+        self.socket_drops = None
+
+        self.templates = {}
+        self.options_templates = set()
+        self._pending = {}
+        self._pending_flows = 0
+        self._decoded = []
+
+        self._schema = pyarrow.schema([(n, pyarrow.from_numpy_dtype(flow_records.FLOW_DTYPE[n]))
+                                       for n in flow_records.FLOW_DTYPE.names])
+        self._writer = None
+        self._interval = None
+        self._current_path = os.path.join(output_dir, cnf.FLOW_COLLECTOR.FILE_PREFIX + 'current.parquet')
+
+        self._socket_inode = None
+        self._thread = None
+        self._ready = threading.Event()
+        self._stop = threading.Event()
+
+    def __getstate__(self):
+        """Keeps only the settings, the messages and the counters, so the owner can be handed over to a worker process
+        (see JobManager)."""
+        return {k: v for k, v in self.__dict__.items()
+                if not k.startswith('_') and k not in ('templates', 'options_templates')}
+
+    def __setstate__(self, state):
+        self.__init__(state['address'], state['port'], state['output_dir'], state['time_interval'])
+        self.__dict__.update(state)
+
+    def _add_data(self, key, template, data, export_time, uptime):
+        count = len(data) // template.length
+        if not count:
+            return None
+        pending = self._pending.setdefault(key, (template, [], [], [], []))
+        pending[1].append(data[:count * template.length])
+        pending[2].append(count)
+        pending[3].append(export_time)
+        pending[4].append(uptime)
+        self._pending_flows = self._pending_flows + count
+        self.flows_received = self.flows_received + count
+        return None
+
+    def _decode(self, key):
+        template, data, counts, export_times, uptimes = self._pending.pop(key)
+        self._decoded.append(template.to_records(b''.join(data),
+                                                 np.repeat(np.array(export_times, dtype=np.int64), counts),
+                                                 np.repeat(np.array(uptimes, dtype=np.int64), counts)))
+        return None
+
+    def _set_template(self, key, fields):
+        self.options_templates.discard(key)
+        template = self.templates.get(key)
+        if template is not None and template.fields == fields:
+            return None
+        if key in self._pending:
+            self._decode(key)
+        if fields is None:
+            self.templates.pop(key, None)
+        else:
+            self.templates[key] = Template(fields)
+        return None
+
+    def _read_templates(self, body, exporter, ipfix):
+        position = 0
+        while position + 4 <= len(body):
+            template_id, count = SET_HEADER.unpack_from(body, position)
+            position = position + 4
+            if template_id < MIN_DATA_SET:
+                break
+            if ipfix and not count:
+                self._set_template(exporter + (template_id,), None)
+                continue
+
+            fields = []
+            for _ in range(count):
+                t, l = SET_HEADER.unpack_from(body, position)
+                position = position + 4
+                if ipfix and t & ENTERPRISE_BIT:
+                    t = 0
+                    position = position + 4
+                fields.append((t, l))
+            if position > len(body):
+                break
+            self._set_template(exporter + (template_id,), tuple(fields))
+        return None
+
+    def _read_options_templates(self, body, exporter, ipfix):
+        """Records the ids of options templates, so that data sets of them (exporter statistics, sampling settings) are
+        told from data sets of unknown templates; the options data are not decoded."""
+        position = 0
+        while position + 4 <= len(body):
+            template_id, count = SET_HEADER.unpack_from(body, position)
+            position = position + 4
+            if template_id < MIN_DATA_SET:
+                break
+            if ipfix and not count:
+                self.options_templates.discard(exporter + (template_id,))
+                continue
+
+            if ipfix:
+                position = position + 2
+                for _ in range(count):
+                    t, _ = SET_HEADER.unpack_from(body, position)
+                    position = position + (8 if t & ENTERPRISE_BIT else 4)
+            else:
+                position = position + 2 + count + struct.unpack_from('>H', body, position)[0]
+            if position > len(body):
+                break
+            self._set_template(exporter + (template_id,), None)
+            self.options_templates.add(exporter + (template_id,))
+        return None
+
+    def _read_sets(self, data, position, exporter, export_time, uptime, ipfix):
+        template_set, options_template_set = (IPFIX_TEMPLATE_SET, IPFIX_OPTIONS_TEMPLATE_SET) if ipfix else \
+            (V9_TEMPLATE_SET, V9_OPTIONS_TEMPLATE_SET)
+        while position + 4 <= len(data):
+            set_id, length = SET_HEADER.unpack_from(data, position)
+            if length < 4:
+                self.packets_dropped = self.packets_dropped + 1
+                break
+            body = data[position + 4:position + length]
+            position = position + length
+
+            if set_id == template_set:
+                self._read_templates(body, exporter, ipfix)
+            elif set_id == options_template_set:
+                self._read_options_templates(body, exporter, ipfix)
+            elif set_id >= MIN_DATA_SET:
+                template = self.templates.get(exporter + (set_id,))
+                if exporter + (set_id,) in self.options_templates:
+                    self.option_sets_received = self.option_sets_received + 1
+                elif template is None or template.dtype is None:
+                    self.sets_dropped = self.sets_dropped + 1
+                else:
+                    self._add_data(exporter + (set_id,), template, body, export_time, uptime)
+            else:
+                self.sets_dropped = self.sets_dropped + 1
+        return None
+
+    def receive(self, data, address):
+        """Processes a NetFlow / IPFIX packet.
+
+        :param data: The packet payload
+        :type data: bytes
+        :param address: The exporter address
+        :type address: tuple
+        :rtype: None
+        """
+        self.packets_received = self.packets_received + 1
+        try:
+            version = SET_HEADER.unpack_from(data, 0)[0]
+            if version == NETFLOW_V5:
+                _, count, uptime, secs, nsecs = V5_HEADER.unpack_from(data, 0)
+                self._add_data((address[0], NETFLOW_V5), V5_TEMPLATE,
+                               data[V5_HEADER_SIZE:V5_HEADER_SIZE + count * V5_TEMPLATE.length],
+                               secs * 1000 + nsecs // 1000000, uptime)
+            elif version == NETFLOW_V9:
+                _, _, uptime, secs, _, source_id = V9_HEADER.unpack_from(data, 0)
+                self._read_sets(data, V9_HEADER.size, (address[0], NETFLOW_V9, source_id), secs * 1000, uptime,
+                                False)
+            elif version == IPFIX:
+                _, length, export_time, _, domain_id = IPFIX_HEADER.unpack_from(data, 0)
+                self._read_sets(data[:length], IPFIX_HEADER.size, (address[0], IPFIX, domain_id), export_time * 1000,
+                                -1, True)
+            else:
+                self.packets_dropped = self.packets_dropped + 1
+        except struct.error:
+            self.packets_dropped = self.packets_dropped + 1
+
+        if self._pending_flows >= cnf.FLOW_COLLECTOR.FLUSH_RECORDS:
+            self.flush()
+        return None
+
+    def _rotate(self):
+        self._writer.close()
+        self._writer = None
+        name = cnf.FLOW_COLLECTOR.FILE_PREFIX + datetime.fromtimestamp(self._interval).strftime('%Y%m%d%H%M')
+        path, i = os.path.join(self.output_dir, name + '.parquet'), 0
+        while os.path.exists(path):
+            i = i + 1
+            path = os.path.join(self.output_dir, name + '-' + str(i) + '.parquet')
+        os.replace(self._current_path, path)
+        self.files_written = self.files_written + 1
+        self.info_message = 'Flow collector: ' + path + ' has been written.'
+        return None
+
+    def flush(self, now=None):
+        """Rotates the current file if its time interval has passed, decodes all pending records and writes them to
+        the current file (of the current time interval).
+
+        :param now: The current time as a UNIX timestamp
+        :type now: float
+        :rtype: None
+        """
+        now = time.time() if now is None else now
+        interval = int(now) // self.time_interval * self.time_interval
+
+        if self._writer is not None and self._interval != interval:
+            self._rotate()
+
+        for key in list(self._pending):
+            self._decode(key)
+        self._pending_flows = 0
+        records = np.concatenate(self._decoded) if self._decoded else np.empty(0, dtype=flow_records.FLOW_DTYPE)
+        self._decoded = []
+
+        if len(records):
+            if self._writer is None:
+                os.makedirs(self.output_dir, exist_ok=True)
+                self._writer = pyarrow.parquet.ParquetWriter(self._current_path, self._schema)
+                self._interval = interval
+            self._writer.write_table(pyarrow.Table.from_pandas(flow_records.to_frame(records), schema=self._schema,
+                                                               preserve_index=False))
+            self.flows_written = self.flows_written + len(records)
+        return None
+
+    def close(self):
+        """Writes out all pending records and closes the current file.
+
+        :rtype: None
+        """
+        self.flush()
+        if self._writer is not None:
+            self._rotate()
+        return None
+
+    def _read_socket_drops(self):
+        """Reads the number of packets dropped by the kernel because the socket receive buffer was full (Linux only).
+
+        :rtype: int
+        """
+        for table in ('/proc/net/udp', '/proc/net/udp6'):
+            try:
+                with open(table, 'r') as f:
+                    for line in f.readlines()[1:]:
+                        columns = line.split()
+                        if len(columns) > 12 and columns[9] == str(self._socket_inode):
+                            return int(columns[12])
+            except OSError:
+                return None
+        return None
+
+    def get_stats(self):
+        """Gets the collector counters.
+
+        :rtype: dict
+        """
+        return {'packets received': self.packets_received,
+                'packets dropped': self.packets_dropped,
+                'packets dropped by socket': self.socket_drops,
+                'sets dropped': self.sets_dropped,
+                'option sets received': self.option_sets_received,
+                'flows received': self.flows_received,
+                'flows written': self.flows_written,
+                'files written': self.files_written}
+
+    async def serve(self):
+        """Receives packets until the collector is stopped.
+
+        :rtype: None
+        """
+        family, kind, proto, _, address = socket.getaddrinfo(self.address, self.port, type=socket.SOCK_DGRAM)[0]
+        sock = socket.socket(family, kind, proto)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, cnf.FLOW_COLLECTOR.RECEIVE_BUFFER_SIZE)
+        sock.bind(address)
+        self._socket_inode = os.fstat(sock.fileno()).st_ino
+
+        transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(lambda: _CollectorProtocol(self),
+                                                                                 sock=sock)
+        self.info_message = 'Flow collector is listening on ' + self.address + ':' + str(self.port) + '.'
+        self._ready.set()
+        try:
+            while not self._stop.is_set():
+                await asyncio.sleep(cnf.FLOW_COLLECTOR.FLUSH_INTERVAL)
+                self.flush()
+                self.socket_drops = self._read_socket_drops()
+        finally:
+            self.socket_drops = self._read_socket_drops()
+            transport.close()
+            self.close()
+        return None
+
+    def _run(self):
+        try:
+            asyncio.run(self.serve())
+        except OSError as e:
+            self.error_message = 'Flow collector: ' + str(e)
+        finally:
+            self._ready.set()
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Starts the collector in a background thread.
+
+        :return: True if the collector is listening
+        :rtype: bool
+        """
+        self._stop.clear()
+        self._ready.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        return self._thread.is_alive() and not self.error_message
+
+    def stop(self):
+        """Stops the collector and writes out the current file.
+
+        :rtype: None
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.info_message = 'Flow collector has stopped.'
+        return None
+
+
+def encode_v5(records, max_records=V5_MAX_RECORDS):
+    """Encodes IPv4 flow records as NetFlow v5 packets, e.g. to replay flows to a collector.
+
+    :param records: Flow records; IPv6 flows are skipped
+    :type records: np.ndarray
+    :return: Packets payloads
+    :rtype: list
+    """
+    records = records[~records['ipv6']]
+    packets = []
+    for i in range(0, len(records), max_records):
+        chunk = records[i:i + max_records]
+        export_time = int(chunk['te'].max())
+        uptime = export_time & 0xFFFFFFFF
+        values = V5_TEMPLATE.to_data(chunk)
+        values['f' + str(FIRST_SWITCHED)] = (uptime - (export_time - chunk['ts'])) & 0xFFFFFFFF
+        values['f' + str(LAST_SWITCHED)] = (uptime - (export_time - chunk['te'])) & 0xFFFFFFFF
+        packets.append(V5_HEADER.pack(NETFLOW_V5, len(chunk), uptime, export_time // 1000,
+                                      export_time % 1000 * 1000000) + bytes(8) + values.tobytes())
+    return packets
+
+
+def encode_ipfix(records, domain_id=0, max_size=1400):
+    """Encodes flow records as IPFIX packets, every one with its template set, e.g. to replay flows to a collector.
+
+    :param records: Flow records
+    :type records: np.ndarray
+    :param domain_id: Observation domain ID
+    :type domain_id: int
+    :param max_size: Maximum size of a packet in bytes
+    :type max_size: int
+    :return: Packets payloads
+    :rtype: list
+    """
+    packets = []
+    for template_id, ipv6, fields in ((MIN_DATA_SET, False, IPFIX_V4_FIELDS), (MIN_DATA_SET + 1, True, IPFIX_V6_FIELDS)):
+        selected = records[records['ipv6'] == ipv6]
+        template = Template(fields)
+        template_set = struct.pack('>HHHH', IPFIX_TEMPLATE_SET, 8 + 4 * len(fields), template_id, len(fields)) + \
+            b''.join([SET_HEADER.pack(t, l) for t, l in fields])
+        per_packet = (max_size - IPFIX_HEADER.size - len(template_set) - 4) // template.length
+        for i in range(0, len(selected), per_packet):
+            data = template.to_data(selected[i:i + per_packet]).tobytes()
+            payload = template_set + SET_HEADER.pack(template_id, 4 + len(data)) + data
+            packets.append(IPFIX_HEADER.pack(IPFIX, IPFIX_HEADER.size + len(payload), int(time.time()), len(packets),
+                                             domain_id) + payload)
+    return packets
+
+
+def export_flows(records, address=cnf.NFDUMP.NFCAPD_DEFAULT_ADDRESS, port=cnf.NFDUMP.NFCAPD_DEFAULT_PORT,
+                 version=IPFIX, rate=None):
+    """Sends flow records to a collector over UDP.
+
+    :param records: Flow records
+    :type records: np.ndarray
+    :param version: NETFLOW_V5 or IPFIX
+    :type version: int
+    :param rate: Maximum number of packets sent per second
+    :type rate: int
+    :return: Number of packets sent
+    :rtype: int
+    """
+    packets = encode_v5(records) if version == NETFLOW_V5 else encode_ipfix(records)
+    family, kind, proto, _, address = socket.getaddrinfo(address, port, type=socket.SOCK_DGRAM)[0]
+    reference_time = time.monotonic()
+    with socket.socket(family, kind, proto) as sock:
+        for i, p in enumerate(packets):
+            if rate and i % 100 == 0:
+                time.sleep(max(reference_time + i / rate - time.monotonic(), 0))
+            sock.sendto(p, address)
+    return len(packets)
+
+
+def main():
+    collector = FlowCollector()
+    asyncio.run(collector.serve())
+
+
+if __name__ == '__main__':
+    main()
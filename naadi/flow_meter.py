@@ -0,0 +1,428 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+
+import numpy as np
+
+import configuration as cnf
+from naadi import flow_records
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+PCAP_HEADER_SIZE = 24
+MAGIC_USEC = 0xA1B2C3D4
+MAGIC_NSEC = 0xA1B23C4D
+
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_LINUX_SLL = 113
+LINKTYPES_RAW = (12, 14, 101)
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_IPV6 = 0x86DD
+ETHERTYPES_VLAN = (0x8100, 0x88A8)
+
+PROTOCOLS_WITH_PORTS = (6, 17, 132)
+PROTOCOLS_ICMP = (1, 58)
+
+KEY_FIELDS = ['proto', 'src_addr_hi', 'src_addr_lo', 'dst_addr_hi', 'dst_addr_lo', 'src_port', 'dst_port', 'ipv6']
+
+
+class PcapReader:
+    """Reads IP packets from pcap files (classic format, micro- or nanosecond timestamps) without external tools.
+
+    The file is memory-mapped; only packet record headers are walked one by one, the packet fields are read for a
+    whole chunk of packets at once. Ethernet (with VLAN tags), Linux cooked, BSD loopback and raw IP link types are
+    supported; packets other than IPv4 and IPv6 are skipped.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+        self.endianness = None
+        self.nanoseconds = None
+        self.linktype = None
+
+    def _read_header(self, buffer):
+        for endianness in '<>':
+            magic = struct.unpack_from(endianness + 'I', buffer, 0)[0]
+            if magic in (MAGIC_USEC, MAGIC_NSEC):
+                break
+        else:
+            raise ValueError('Pcap reader: ' + self.path + ' is not a pcap file.')
+        self.endianness = endianness
+        self.nanoseconds = magic == MAGIC_NSEC
+        self.linktype = struct.unpack_from(endianness + 'I', buffer, 20)[0] & 0xFFFF
+        return PCAP_HEADER_SIZE
+
+    @staticmethod
+    def _gather(buffer, positions, dtype):
+        dtype = np.dtype(dtype)
+        return buffer[positions[:, None] + np.arange(dtype.itemsize)].view(dtype).ravel()
+
+    def _decode(self, buffer, offsets, seconds, fractions, lengths):
+        """Decodes a chunk of packets into one packet flow records.
+
+        :param buffer: The whole file content as an array of bytes
+        :type buffer: np.ndarray
+        :param offsets: Positions of packets data in the buffer
+        :type offsets: np.ndarray
+        :param seconds: Packets timestamps (seconds)
+        :type seconds: np.ndarray
+        :param fractions: Packets timestamps (micro- or nanoseconds)
+        :type fractions: np.ndarray
+        :param lengths: Captured lengths of packets
+        :type lengths: np.ndarray
+        :return: Flow records of IP packets
+        :rtype: np.ndarray
+        """
+        ends = offsets + lengths
+
+        def field(relative, dtype):
+            positions = offsets + relative
+            valid = positions + np.dtype(dtype).itemsize <= ends
+            return np.where(valid, self._gather(buffer, np.where(valid, positions, 0), dtype), 0)
+
+        if self.linktype == LINKTYPE_ETHERNET:
+            ethertype = field(12, '>u2')
+            vlan = np.isin(ethertype, ETHERTYPES_VLAN)
+            ethertype = np.where(vlan, field(16, '>u2'), ethertype)
+            l3 = np.where(vlan, 18, 14)
+            ip = np.isin(ethertype, (ETHERTYPE_IPV4, ETHERTYPE_IPV6))
+        elif self.linktype == LINKTYPE_LINUX_SLL:
+            l3 = np.full(len(offsets), 16)
+            ip = np.isin(field(14, '>u2'), (ETHERTYPE_IPV4, ETHERTYPE_IPV6))
+        elif self.linktype == LINKTYPE_NULL:
+            l3 = np.full(len(offsets), 4)
+            ip = np.ones(len(offsets), dtype=bool)
+        elif self.linktype in LINKTYPES_RAW:
+            l3 = np.zeros(len(offsets), dtype=np.int64)
+            ip = np.ones(len(offsets), dtype=bool)
+        else:
+            raise ValueError('Pcap reader: unsupported link type ' + str(self.linktype) + '.')
+
+        version = field(l3, 'u1') >> 4
+        ipv4 = ip & (version == 4)
+        ipv6 = ip & (version == 6)
+        selected = np.flatnonzero(ipv4 | ipv6)
+        offsets, ends, l3, ipv4, ipv6 = offsets[selected], ends[selected], l3[selected], ipv4[selected], ipv6[selected]
+        seconds, fractions = seconds[selected], fractions[selected]
+
+        records = np.zeros(len(selected), dtype=flow_records.FLOW_DTYPE)
+        records['ts'] = seconds.astype(np.int64) * 1000 + fractions // (1000000 if self.nanoseconds else 1000)
+        records['te'] = records['ts']
+        records['packets'] = 1
+        records['ipv6'] = ipv6
+
+        first_byte = field(l3, 'u1')
+        fragment = np.where(ipv4, field(l3 + 6, '>u2') & 0x1FFF, 0)
+        proto = np.where(ipv4, field(l3 + 9, 'u1'), field(l3 + 6, 'u1'))
+        l4 = np.where(ipv4, l3 + (first_byte & 0x0F) * 4, l3 + 40)
+        records['proto'] = proto
+        records['tos'] = np.where(ipv4, field(l3 + 1, 'u1'), (field(l3, '>u2') >> 4) & 0xFF)
+        records['bytes'] = np.where(ipv4, field(l3 + 2, '>u2'), field(l3 + 4, '>u2').astype(np.int64) + 40)
+        records['src_addr_lo'] = np.where(ipv4, field(l3 + 12, '>u4').astype(np.uint64), field(l3 + 16, '>u8'))
+        records['dst_addr_lo'] = np.where(ipv4, field(l3 + 16, '>u4').astype(np.uint64), field(l3 + 32, '>u8'))
+        records['src_addr_hi'] = np.where(ipv6, field(l3 + 8, '>u8'), 0)
+        records['dst_addr_hi'] = np.where(ipv6, field(l3 + 24, '>u8'), 0)
+
+        ports = np.isin(proto, PROTOCOLS_WITH_PORTS) & (fragment == 0)
+        records['src_port'] = np.where(ports, field(l4, '>u2'), 0)
+        records['dst_port'] = np.where(ports, field(l4 + 2, '>u2'), 0)
+        icmp = np.isin(proto, PROTOCOLS_ICMP) & (fragment == 0)
+        records['dst_port'] = np.where(icmp, field(l4, '>u2'), records['dst_port'])
+        records['flags'] = np.where((proto == 6) & (fragment == 0), field(l4 + 13, 'u1'), 0)
+
+        return records
+
+    def index(self, step=cnf.FLOW_METER.PCAP_INDEX_STEP, index_dir=cnf.INDEX.DIR):
+        """Builds a sparse index of packet offsets by time: the offset and the timestamp of every step-th packet.
+
+        Only packet record headers are read. The index is stored in the index directory and it is built again only
+        when the file changes.
+
+        :param step: Number of packets between two consecutive index entries
+        :type step: int
+        :param index_dir: A directory of indices
+        :type index_dir: str
+        :return: Offsets of packet records (with the offset of the end of the file appended) and their timestamps in
+            milliseconds
+        :rtype: tuple
+        """
+        index_path = os.path.join(index_dir,
+                                  hashlib.sha1(os.path.abspath(self.path).encode('utf-8')).hexdigest() + '.pcap.json')
+        stat = os.stat(self.path)
+        if os.path.isfile(index_path):
+            with open(index_path, 'r') as f:
+                index = json.load(f)
+            if index['size'] == stat.st_size and index['mtime'] == stat.st_mtime and index['step'] == step:
+                return np.array(index['offsets'], dtype=np.int64), np.array(index['times'], dtype=np.int64)
+
+        offsets, times = [], []
+        with open(self.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            size = len(buffer)
+            position = self._read_header(buffer)
+            unpack_header = struct.Struct(self.endianness + 'III').unpack_from
+            unpack_from = struct.Struct(self.endianness + 'I').unpack_from
+            while position + 16 <= size:
+                seconds, fraction, length = unpack_header(buffer, position)
+                offsets.append(position)
+                times.append(seconds * 1000 + fraction // (1000000 if self.nanoseconds else 1000))
+                position = position + 16 + length
+                for _ in range(step - 1):
+                    if position + 16 > size:
+                        break
+                    position = position + 16 + unpack_from(buffer, position + 8)[0]
+        offsets.append(min(position, size))
+
+        os.makedirs(index_dir, exist_ok=True)
+        with open(index_path + '.tmp', 'w') as f:
+            json.dump({'size': stat.st_size, 'mtime': stat.st_mtime, 'step': step, 'offsets': offsets, 'times': times},
+                      f)
+        os.replace(index_path + '.tmp', index_path)
+        return np.array(offsets, dtype=np.int64), np.array(times, dtype=np.int64)
+
+    def read(self, chunk_packets=cnf.FLOW_METER.CHUNK_PACKETS, start=None, end=None):
+        """Reads IP packets of the file in chunks.
+
+        :param chunk_packets: Maximum number of packets in a chunk
+        :type chunk_packets: int
+        :param start: An offset of the first packet record to be read (e.g. taken from the index)
+        :type start: int
+        :param end: An offset where reading stops; packet records that start before it are read
+        :type end: int
+        :return: A chunk of packets as one packet flow records and a number of bytes of the file read so far
+        :rtype: tuple
+        """
+        with open(self.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            size = len(buffer)
+            position = self._read_header(buffer)
+            if start is not None:
+                position = max(start, position)
+            limit = size if end is None else min(end, size)
+            unpack_from = struct.Struct(self.endianness + 'I').unpack_from
+            array = np.frombuffer(buffer, dtype=np.uint8)
+            try:
+                while position + 16 <= size and position < limit:
+                    offsets = []
+                    append = offsets.append
+                    for _ in range(chunk_packets):
+                        if position + 16 > size or position >= limit:
+                            break
+                        append(position + 16)
+                        position = position + 16 + unpack_from(buffer, position + 8)[0]
+
+                    offsets = np.array(offsets, dtype=np.int64)
+                    headers = array[(offsets - 16)[:, None] + np.arange(16)]
+                    headers = headers.view(self.endianness + 'u4').astype(np.int64)
+                    complete = offsets + headers[:, 2] <= size
+                    offsets, headers = offsets[complete], headers[complete]
+                    if len(offsets):
+                        yield self._decode(array, offsets, headers[:, 0], headers[:, 1], headers[:, 2]), \
+                            min(position, size)
+            finally:
+                del array
+
+
+class FlowMeter:
+    """Builds flows from packets of pcap files in process (in place of softflowd exporting to nfcapd over UDP).
+
+    Packets are processed in chunks. Within a chunk packets are grouped by flow key (protocol, addresses, ports) and
+    time, instead of being looked up packet by packet in a table of active flows: a new flow starts when the key
+    changes, when the gap since the previous packet of the key exceeds the idle timeout or when the flow has lasted
+    longer than the active timeout. Flows that may still continue are carried over to the next chunk.
+
+    A single file may also be split into shards processed independently (see meter_shard); flows crossing the shard
+    boundaries are then stitched together, so the flows are the same as if the file was processed at once.
+    """
+
+    def __init__(self, idle_timeout=cnf.FLOW_METER.IDLE_TIMEOUT, active_timeout=cnf.FLOW_METER.ACTIVE_TIMEOUT):
+        self.idle_timeout = idle_timeout
+        self.active_timeout = active_timeout
+
+        self.packets_processed = 0
+        self.bytes_processed = 0
+        self.flows_exported = 0
+        self.files_processed = 0
+
+    def _segment(self, items):
+        """Sorts items by flow key and time and finds segments of them: a segment ends when the key changes or when the
+        gap since the previous item of the key exceeds the idle timeout.
+
+        :return: Sorted items, indices of the first item of every key and of every segment
+        :rtype: tuple
+        """
+        items = items[np.lexsort([items['ts']] + [items[f] for f in reversed(KEY_FIELDS)])]
+        new_key = np.zeros(len(items), dtype=bool)
+        new_key[0] = True
+        for f in KEY_FIELDS:
+            new_key[1:] |= items[f][1:] != items[f][:-1]
+        new_segment = new_key.copy()
+        new_segment[1:] |= items['ts'][1:] - items['te'][:-1] > self.idle_timeout * 1000
+        return items, np.flatnonzero(new_key), np.flatnonzero(new_segment)
+
+    def _assemble(self, items, now=None):
+        """Groups packets (and flows carried over from the previous chunk) into flows.
+
+        :param items: One packet flow records and carried over flows
+        :type items: np.ndarray
+        :param now: Time of the last packet read; if not given, all flows are expired
+        :type now: int
+        :return: Expired flows and flows that may still continue
+        :rtype: tuple
+        """
+        if not len(items):
+            return items, items
+
+        items, _, starts = self._segment(items)
+        ends = np.append(starts[1:], len(items))
+        long = np.flatnonzero(items['ts'][ends - 1] - items['ts'][starts] > self.active_timeout * 1000)
+        splits = []
+        for a, b in zip(starts[long], ends[long]):
+            ts = items['ts'][a:b]
+            i = 0
+            while True:
+                i = int(np.searchsorted(ts, ts[i] + self.active_timeout * 1000, side='right'))
+                if i >= len(ts):
+                    break
+                splits.append(a + i)
+        if splits:
+            starts = np.union1d(starts, splits)
+
+        flows = items[starts]
+        flows['te'] = np.maximum.reduceat(items['te'], starts)
+        flows['packets'] = np.add.reduceat(items['packets'], starts)
+        flows['bytes'] = np.add.reduceat(items['bytes'], starts)
+        flows['flags'] = np.bitwise_or.reduceat(items['flags'], starts)
+
+        if now is None:
+            return flows, flows[:0]
+        active = flows['te'] > now - self.idle_timeout * 1000
+        return flows[~active], flows[active]
+
+    def meter(self, path):
+        """Builds flows from packets of a pcap file.
+
+        :param path: A path to a pcap file
+        :type path: str
+        :return: Chunks of expired flows as flow records
+        :rtype: np.ndarray
+        """
+        active = np.empty(0, dtype=flow_records.FLOW_DTYPE)
+        for packets, position in PcapReader(path).read():
+            self.packets_processed = self.packets_processed + len(packets)
+            self.bytes_processed = position
+            expired, active = self._assemble(np.concatenate([active, packets]),
+                                             int(packets['ts'].max()) if len(packets) else None)
+            self.flows_exported = self.flows_exported + len(expired)
+            yield expired
+
+        expired, _ = self._assemble(active)
+        self.flows_exported = self.flows_exported + len(expired)
+        yield expired
+
+    def meter_shard(self, path, start, end):
+        """Builds flows from packets of a shard of a pcap file (a range of its bytes, see PcapReader.index).
+
+        Only segments of packets (see _segment) that cannot be affected by packets outside the shard are built into
+        flows: the first segment of a key is returned as packets if it starts within the idle timeout from the first
+        packet of the shard, as it may continue a flow of the previous shard, and so is the last segment of a key
+        that ends within the idle timeout from the last packet of the shard. Packets of the boundary segments of
+        consecutive shards are stitched into flows with stitch.
+
+        :param path: A path to a pcap file
+        :type path: str
+        :param start: An offset of the first packet record of the shard
+        :type start: int
+        :param end: An offset of the end of the shard
+        :type end: int
+        :return: Flows, packets of the boundary segments as one packet flow records and the time of the last packet
+        :rtype: tuple
+        """
+        packets = [p for p, _ in PcapReader(path).read(start=start, end=end)]
+        packets = np.concatenate(packets) if packets else np.empty(0, dtype=flow_records.FLOW_DTYPE)
+        self.packets_processed = self.packets_processed + len(packets)
+        self.bytes_processed = self.bytes_processed + end - start
+        if not len(packets):
+            return packets, packets, None
+
+        first, last = int(packets['ts'].min()), int(packets['ts'].max())
+        items, key_starts, starts = self._segment(packets)
+        ends = np.append(starts[1:], len(items))
+        head = np.isin(starts, key_starts) & (items['ts'][starts] <= first + self.idle_timeout * 1000)
+        tail = np.isin(ends, np.append(key_starts[1:], len(items))) & \
+            (np.maximum.reduceat(items['te'], starts) >= last - self.idle_timeout * 1000)
+        boundary = np.repeat(head | tail, ends - starts)
+
+        flows, _ = self._assemble(items[~boundary])
+        self.flows_exported = self.flows_exported + len(flows)
+        return flows, items[boundary], last
+
+    def stitch(self, active, packets, now=None):
+        """Builds flows from packets of the boundary segments of a shard and flows still active at the end of the
+        previous shard; shards must be stitched in order.
+
+        :param active: Flows still active at the end of the previous shard
+        :type active: np.ndarray
+        :param packets: Packets of the boundary segments of the shard
+        :type packets: np.ndarray
+        :param now: Time of the last packet of the shard; if not given (the last shard), all flows are expired
+        :type now: int
+        :return: Expired flows and flows that may still continue in the next shard
+        :rtype: tuple
+        """
+        expired, active = self._assemble(np.concatenate([active, packets]), now)
+        self.flows_exported = self.flows_exported + len(expired)
+        return expired, active
+
+    def convert(self, paths, output_path):
+        """Builds flows from packets of pcap files and writes them to a Parquet file, chunk by chunk.
+
+        :param paths: Paths to pcap files
+        :type paths: list
+        :param output_path: A path to the Parquet file
+        :type output_path: str
+        :return: Number of flows written
+        :rtype: int
+        """
+        if pyarrow is None:
+            raise ImportError('Flow meter: pyarrow is required to write Parquet files.')
+
+        flows_exported = self.flows_exported
+        schema = pyarrow.schema([(n, pyarrow.from_numpy_dtype(flow_records.FLOW_DTYPE[n]))
+                                 for n in flow_records.FLOW_DTYPE.names])
+        with pyarrow.parquet.ParquetWriter(output_path, schema) as writer:
+            for path in paths:
+                for flows in self.meter(path):
+                    if len(flows):
+                        writer.write_table(pyarrow.Table.from_pandas(flow_records.to_frame(flows), schema=schema,
+                                                                     preserve_index=False))
+                self.files_processed = self.files_processed + 1
+        return self.flows_exported - flows_exported
+
+
+def read_flows(path):
+    """Reads flows written by FlowMeter.convert.
+
+    :param path: A path to the Parquet file
+    :type path: str
+    :rtype: np.ndarray
+    """
+    if pyarrow is None:
+        raise ImportError('Flow meter: pyarrow is required to read Parquet files.')
+    return flow_records.from_columns(pyarrow.parquet.read_table(path).to_pandas())
+
+
+def main():
+    return FlowMeter()
+
+
+if __name__ == '__main__':
+    main()
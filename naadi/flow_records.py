@@ -0,0 +1,205 @@
+import ipaddress
+
+import numpy as np
+import pandas as pd
+
+import configuration as cnf
+
+
+FLOW_DTYPE = np.dtype([('ts', '<i8'),
+                       ('te', '<i8'),
+                       ('src_addr_hi', '<u8'),
+                       ('src_addr_lo', '<u8'),
+                       ('dst_addr_hi', '<u8'),
+                       ('dst_addr_lo', '<u8'),
+                       ('packets', '<u8'),
+                       ('bytes', '<u8'),
+                       ('src_port', '<u2'),
+                       ('dst_port', '<u2'),
+                       ('proto', 'u1'),
+                       ('flags', 'u1'),
+                       ('tos', 'u1'),
+                       ('ipv6', '?')])
+
+TCP_FIN = 0x01
+TCP_SYN = 0x02
+TCP_RST = 0x04
+TCP_PSH = 0x08
+TCP_ACK = 0x10
+TCP_URG = 0x20
+TCP_ECE = 0x40
+TCP_CWR = 0x80
+TCP_FLAGS_BITS = {'F': TCP_FIN, 'S': TCP_SYN, 'R': TCP_RST, 'P': TCP_PSH,
+                  'A': TCP_ACK, 'U': TCP_URG, 'E': TCP_ECE, 'C': TCP_CWR}
+
+VARIABLES_FIELDS = {'FLOW START': ['ts'],
+                    'FLOW END': ['te'],
+                    'FIRST SEEN': ['ts'],
+                    'LAST SEEN': ['te'],
+                    'DURATION': ['ts', 'te'],
+                    'PROTOCOL': ['proto'],
+                    'SOURCE ADDRESS': ['src_addr_hi', 'src_addr_lo', 'ipv6'],
+                    'DESTINATION ADDRESS': ['dst_addr_hi', 'dst_addr_lo', 'ipv6'],
+                    'SOURCE PORT': ['src_port'],
+                    'DESTINATION PORT': ['dst_port'],
+                    'PACKETS': ['packets'],
+                    'BYTES': ['bytes'],
+                    'FLOWS': [],
+                    'TCP FLAGS': ['flags'],
+                    'SOURCE TOS': ['tos'],
+                    'DESTINATION TOS': []}
+
+# nfdump variables that carry all fields of a flow record
+RECORD_VARIABLES = ['PROTOCOL', 'SOURCE ADDRESS', 'DESTINATION ADDRESS', 'SOURCE PORT', 'DESTINATION PORT',
+                    'PACKETS', 'BYTES', 'TCP FLAGS', 'SOURCE TOS']
+
+
+def get_fields(variables):
+    """Translates variables in human readable format into flow record fields needed to compute them.
+
+    :param variables: NetFlow fields in human readable format.
+    :type variables: list
+    :return: Flow record fields, always with flow start and end
+    :rtype: list
+    """
+    fields = ['ts', 'te']
+    for v in variables:
+        fields += [f for f in VARIABLES_FIELDS[v] if f not in fields]
+    return fields
+
+
+def from_columns(columns):
+    """Packs column arrays into flow records; missing fields are zeroed.
+
+    :param columns: Column arrays (or DataFrame columns) named after flow record fields
+    :type columns: dict or pd.DataFrame
+    :rtype: np.ndarray
+    """
+    n = len(columns['ts'])
+    records = np.zeros(n, dtype=FLOW_DTYPE)
+    for name in FLOW_DTYPE.names:
+        if name in columns:
+            records[name] = np.asarray(columns[name])
+    return records
+
+
+def to_frame(records):
+    """Unpacks flow records into a DataFrame with one numeric column per field.
+
+    :param records: Flow records
+    :type records: np.ndarray
+    :rtype: pd.DataFrame
+    """
+    return pd.DataFrame({name: records[name] for name in FLOW_DTYPE.names}, columns=list(FLOW_DTYPE.names))
+
+
+def parse_timestamps(values):
+    """Converts local times (as nfdump prints them) to UNIX timestamps in milliseconds.
+
+    :param values: Local times
+    :type values: np.ndarray
+    :rtype: np.ndarray
+    """
+    values = values.astype('datetime64[ms]')
+    seconds = values.astype('datetime64[s]')
+    uniques, inverse = np.unique(seconds, return_inverse=True)
+    epoch = np.array([int(u.astype(object).timestamp()) for u in uniques], dtype=np.int64)
+    return epoch[inverse.ravel()] * 1000 + (values - seconds.astype('datetime64[ms]')).astype(np.int64)
+
+
+def parse_protocols(values):
+    """Converts protocol names or numbers printed by nfdump into protocol numbers.
+
+    Names are looked up in the protocol table of the configuration file; nfdump prints protocols without a name as
+    numbers. Names nfdump gives to two protocols (IPIP, IDPR) are taken for the lower protocol number.
+
+    :rtype: np.ndarray
+    :raises ValueError: If a value is neither a known protocol name nor a protocol number
+    """
+    numbers = {}
+    for k, v in sorted(cnf.NFDUMP.PROTOCOLS_DICT.items(), reverse=True):
+        numbers[v.upper()] = k
+    uniques, inverse = np.unique(np.asarray(values, dtype=str), return_inverse=True)
+    uniques = [u.strip().upper() for u in uniques]
+    unknown = [u for u in uniques if u not in numbers and not (u.isdigit() and int(u) < 256)]
+    if unknown:
+        raise ValueError('Flow records: unknown protocols ' + ', '.join(unknown[:10]) + '.')
+    parsed = np.array([numbers[u] if u in numbers else int(u) for u in uniques], dtype=np.uint8)
+    return parsed[inverse.ravel()]
+
+
+def parse_addresses(values):
+    """Converts IPv4 and IPv6 addresses into integers; every distinct address is parsed only once.
+
+    IPv6 addresses must be printed in full (nfdump -6), nfdump shortens them otherwise.
+
+    :return: High and low 64 bits of the addresses (IPv4 addresses are stored in low bits) and IPv6 mask
+    :rtype: tuple
+    :raises ValueError: If a value is not an IP address
+    """
+    uniques, inverse = np.unique(np.asarray(values, dtype=str), return_inverse=True)
+    hi = np.zeros(len(uniques), dtype=np.uint64)
+    lo = np.zeros(len(uniques), dtype=np.uint64)
+    ipv6 = np.zeros(len(uniques), dtype=bool)
+    unknown = []
+    for i, u in enumerate(uniques):
+        try:
+            address = ipaddress.ip_address(u.strip())
+        except ValueError:
+            unknown.append(u.strip())
+            continue
+        hi[i], lo[i] = int(address) >> 64, int(address) & 0xFFFFFFFFFFFFFFFF
+        ipv6[i] = address.version == 6
+    if unknown:
+        raise ValueError('Flow records: invalid addresses ' + ', '.join(unknown[:10]) + '.')
+    inverse = inverse.ravel()
+    return hi[inverse], lo[inverse], ipv6[inverse]
+
+
+def parse_tcp_flags(values):
+    """Converts TCP flags strings printed by nfdump (e.g. '.AP.SF') into bitmasks.
+
+    :rtype: np.ndarray
+    """
+    uniques, inverse = np.unique(np.asarray(values, dtype=str), return_inverse=True)
+    parsed = np.array([sum([TCP_FLAGS_BITS.get(c, 0) for c in set(u.strip())]) for u in uniques], dtype=np.uint8)
+    return parsed[inverse.ravel()]
+
+
+def from_batch(batch):
+    """Converts a record batch parsed from nfdump output into flow records.
+
+    The batch must contain flow start and end columns; other variables that are missing are zeroed, rows with no
+    valid flow start or end are dropped.
+
+    :param batch: Typed record batch with variables in human readable format as columns
+    :type batch: pd.DataFrame
+    :rtype: np.ndarray
+    """
+    start, end = cnf.NFDUMP.FLOW_TIME_COLUMNS
+    batch = batch.dropna(subset=[start, end])
+    columns = {'ts': parse_timestamps(batch[start].values),
+               'te': parse_timestamps(batch[end].values)}
+
+    if 'PROTOCOL' in batch:
+        columns['proto'] = parse_protocols(batch['PROTOCOL'])
+    if 'SOURCE ADDRESS' in batch:
+        columns['src_addr_hi'], columns['src_addr_lo'], columns['ipv6'] = parse_addresses(batch['SOURCE ADDRESS'])
+    if 'DESTINATION ADDRESS' in batch:
+        columns['dst_addr_hi'], columns['dst_addr_lo'], _ = parse_addresses(batch['DESTINATION ADDRESS'])
+    if 'TCP FLAGS' in batch:
+        columns['flags'] = parse_tcp_flags(batch['TCP FLAGS'])
+    for v, f in (('SOURCE PORT', 'src_port'), ('DESTINATION PORT', 'dst_port'), ('PACKETS', 'packets'),
+                 ('BYTES', 'bytes'), ('SOURCE TOS', 'tos')):
+        if v in batch:
+            columns[f] = batch[v].fillna(0).values
+
+    return from_columns(columns)
+
+
+def main():
+    pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,341 @@
+import json
+import os
+import re
+import shutil
+
+import numpy as np
+import pandas as pd
+
+import configuration as cnf
+from naadi import flow_records
+from naadi.flow_meter import FlowMeter
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+PARQUET_EXTENSION = '.parquet'
+
+
+class FlowStore:
+    """Time-indexed store of flow records in a directory.
+
+    Flows are kept in Parquet files, one per time bucket of flow start times, sorted by flow start. A JSON index keeps
+    the time span and the number of flows of every bucket. Flows are added in two steps, so that many writers
+    (processes) can add flows at once: every writer stores its flows as parts of the buckets and the parts are merged
+    into the buckets afterwards.
+    """
+
+    def __init__(self, directory, bucket=cnf.FLOW_METER.STORE_BUCKET_SECONDS):
+        if pyarrow is None:
+            raise ImportError('Flow store: pyarrow is required to store flows in Parquet files.')
+
+        self.directory = directory
+        self.bucket = bucket
+        self.index_path = os.path.join(directory, cnf.FLOW_METER.STORE_INDEX_FILE)
+        self.parts_dir = os.path.join(directory, 'parts')
+
+        self.buckets = {}
+        if os.path.isfile(self.index_path):
+            with open(self.index_path, 'r') as f:
+                self.buckets = json.load(f)
+
+    def _save_index(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.index_path + '.tmp', 'w') as f:
+            json.dump(self.buckets, f)
+        os.replace(self.index_path + '.tmp', self.index_path)
+        return None
+
+    def _get_bucket_path(self, bucket):
+        return os.path.join(self.directory, str(bucket) + PARQUET_EXTENSION)
+
+    def write_parts(self, flows, name):
+        """Splits flows into time buckets and stores them as parts of the buckets; they are not indexed until merged.
+
+        :param flows: Flow records
+        :type flows: np.ndarray
+        :param name: A name of the parts unique among all writers, e.g. a name of the source file
+        :type name: str
+        :return: Paths of the bucket files the parts will be merged into
+        :rtype: list
+        """
+        buckets = flows['ts'] // 1000 // self.bucket * self.bucket
+        for bucket in np.unique(buckets):
+            directory = os.path.join(self.parts_dir, str(bucket))
+            os.makedirs(directory, exist_ok=True)
+            flow_records.to_frame(flows[buckets == bucket]).to_parquet(
+                os.path.join(directory, name + PARQUET_EXTENSION), index=False)
+        return [self._get_bucket_path(b) for b in np.unique(buckets)]
+
+    def remove_parts(self, source):
+        """Removes stored parts of a source file that have not been merged yet, e.g. parts left by an interrupted
+        writer.
+
+        Only the parts named the way the writers of the source name them (<source>.<n> and <source>.stitched.<n>, see
+        meter_to_store and NetFlowCollector.convert_pcap_to_flow_store_sharded) are removed, not parts of other
+        sources that share the prefix, e.g. of a.pcap.1 for a.pcap.
+
+        :param source: A name of the source file
+        :type source: str
+        :return: Number of parts removed
+        :rtype: int
+        """
+        if not os.path.isdir(self.parts_dir):
+            return 0
+
+        pattern = re.compile(re.escape(source) + r'\.(stitched\.)?\d+' + re.escape(PARQUET_EXTENSION))
+        removed = 0
+        for bucket in os.listdir(self.parts_dir):
+            directory = os.path.join(self.parts_dir, bucket)
+            for name in os.listdir(directory):
+                if pattern.fullmatch(name):
+                    os.remove(os.path.join(directory, name))
+                    removed = removed + 1
+        return removed
+
+    def merge(self):
+        """Merges stored parts into their buckets (with flows already in the buckets) and indexes the buckets.
+
+        Only one bucket is held in memory at once.
+
+        :return: Number of buckets changed
+        :rtype: int
+        """
+        if not os.path.isdir(self.parts_dir):
+            return 0
+
+        buckets = sorted(os.listdir(self.parts_dir), key=int)
+        for bucket in buckets:
+            directory = os.path.join(self.parts_dir, bucket)
+            paths = [os.path.join(directory, p) for p in sorted(os.listdir(directory))]
+            if bucket in self.buckets:
+                paths.append(self._get_bucket_path(bucket))
+            flows = np.concatenate([flow_records.from_columns(pd.read_parquet(p)) for p in paths])
+            flows = np.sort(flows, order='ts', kind='stable')
+
+            path = self._get_bucket_path(bucket)
+            flow_records.to_frame(flows).to_parquet(path + '.tmp', index=False)
+            os.replace(path + '.tmp', path)
+            self.buckets[bucket] = {'first': int(flows['ts'].min()) // 1000,
+                                    'last': int(flows['te'].max()) // 1000,
+                                    'flows': len(flows)}
+            self._save_index()
+            shutil.rmtree(directory)
+
+        shutil.rmtree(self.parts_dir, ignore_errors=True)
+        return len(buckets)
+
+    def get_time_window(self):
+        """Gets the time span of all stored flows.
+
+        :return: The first and the last second of the time span as UNIX timestamps or None if there are no flows
+        :rtype: tuple
+        """
+        if not self.buckets:
+            return None
+        return min([b['first'] for b in self.buckets.values()]), max([b['last'] for b in self.buckets.values()])
+
+    def read(self, t_start=None, t_end=None, columns=None):
+        """Reads flows that start within the time range; only the buckets that overlap the range are read.
+
+        :param t_start: A start of the time range as a UNIX timestamp
+        :type t_start: int
+        :param t_end: An end of the time range as a UNIX timestamp
+        :type t_end: int
+        :param columns: Flow record fields to be read; the other fields are zeroed
+        :type columns: list
+        :return: Flow records sorted by flow start
+        :rtype: np.ndarray
+        """
+        if columns is not None:
+            columns = ['ts', 'te'] + [c for c in columns if c not in ('ts', 'te')]
+        if t_start is None or t_end is None:
+            time_window = self.get_time_window() or (0, 0)
+            t_start = time_window[0] if t_start is None else t_start
+            t_end = time_window[1] if t_end is None else t_end
+
+        parts = [flow_records.from_columns(pd.read_parquet(self._get_bucket_path(b), columns=columns))
+                 for b in sorted(self.buckets, key=int) if int(t_start) // self.bucket * self.bucket <= int(b) <= t_end]
+        if not parts:
+            return np.empty(0, dtype=flow_records.FLOW_DTYPE)
+
+        flows = np.concatenate(parts)
+        first_seen = flows['ts'] // 1000
+        return flows[(first_seen >= t_start) & (first_seen <= t_end)]
+
+
+def is_flow_source(path):
+    """Checks whether the path holds flow records in Parquet files rather than nfdump binaries: a flow store, a Parquet
+    file (see FlowMeter.convert) or a directory of Parquet files (see FlowCollector).
+
+    :param path: A path to a file or a directory
+    :type path: str
+    :rtype: bool
+    """
+    if os.path.isfile(path):
+        return path.endswith(PARQUET_EXTENSION)
+    if os.path.isdir(path):
+        return any([n == cnf.FLOW_METER.STORE_INDEX_FILE or n.endswith(PARQUET_EXTENSION) for n in os.listdir(path)])
+    return False
+
+
+def get_flow_files(path):
+    """Gets Parquet files of flow records of a flow source (see is_flow_source); of a flow store only the merged
+    buckets, of a directory not the files still being written (see SKIP_PREFIXES in the configuration file).
+
+    :param path: A path to a flow source
+    :type path: str
+    :rtype: list
+    """
+    if os.path.isfile(path):
+        return [path]
+    if os.path.isfile(os.path.join(path, cnf.FLOW_METER.STORE_INDEX_FILE)):
+        store = FlowStore(path)
+        return [store._get_bucket_path(b) for b in sorted(store.buckets, key=int)]
+    return sorted([os.path.join(path, n) for n in os.listdir(path)
+                   if n.endswith(PARQUET_EXTENSION) and not n.startswith(cnf.INDEX.SKIP_PREFIXES)])
+
+
+def _get_row_group_span(path, metadata, i):
+    """Gets the first flow start and the last flow end of a row group from its statistics, reading them only if the
+    file has no statistics.
+
+    :return: The first and the last second or None if the row group is empty
+    :rtype: tuple
+    """
+    group = metadata.row_group(i)
+    if not group.num_rows:
+        return None
+    first = group.column(metadata.schema.names.index('ts')).statistics
+    last = group.column(metadata.schema.names.index('te')).statistics
+    if first is not None and last is not None and first.has_min_max and last.has_min_max:
+        return int(first.min) // 1000, int(last.max) // 1000
+    flows = pyarrow.parquet.ParquetFile(path).read_row_group(i, columns=['ts', 'te'])
+    return int(flows['ts'].to_numpy().min()) // 1000, int(flows['te'].to_numpy().max()) // 1000
+
+
+def get_flow_parts(path):
+    """Splits flows of a flow source (see is_flow_source) into parts read at once: row groups of its Parquet files.
+
+    :param path: A path to a flow source
+    :type path: str
+    :return: The first flow start and the last flow end (as UNIX timestamps), a path and a row group of every part
+    :rtype: list
+    """
+    if pyarrow is None:
+        raise ImportError('Flow store: pyarrow is required to read flows from Parquet files.')
+
+    parts = []
+    for f in get_flow_files(path):
+        metadata = pyarrow.parquet.read_metadata(f)
+        for i in range(metadata.num_row_groups):
+            span = _get_row_group_span(f, metadata, i)
+            if span is not None:
+                parts.append(span + (f, i))
+    return parts
+
+
+def get_time_window(path):
+    """Gets the time span of all flows of a flow source (see is_flow_source).
+
+    :return: The first and the last second of the time span as UNIX timestamps or None if there are no flows
+    :rtype: tuple
+    """
+    parts = get_flow_parts(path)
+    if not parts:
+        return None
+    return min([p[0] for p in parts]), max([p[1] for p in parts])
+
+
+def read_slices(path, slices, columns=None):
+    """Reads flows of a flow source (see is_flow_source) slice by slice; only the parts (see get_flow_parts) that
+    overlap the current slice are held in memory, each one is read once for consecutive slices.
+
+    :param path: A path to a flow source
+    :type path: str
+    :param slices: Boundaries of time slices as datetime objects, ordered by their starts
+    :type slices: iterable
+    :param columns: Flow record fields to be read; the other fields are zeroed
+    :type columns: list
+    :return: A start and an end of a time slice and flow records that start within it
+    :rtype: tuple
+    """
+    if columns is not None:
+        columns = ['ts', 'te'] + [c for c in columns if c not in ('ts', 'te')]
+    parts = get_flow_parts(path)
+    files = {}
+    loaded = {}
+    for start, end in slices:
+        t_start, t_end = int(start.timestamp()), int(end.timestamp())
+        overlapping = [p for p in parts if p[0] <= t_end and p[1] >= t_start]
+        for p in overlapping:
+            if p not in loaded:
+                if p[2] not in files:
+                    files[p[2]] = pyarrow.parquet.ParquetFile(p[2])
+                loaded[p] = flow_records.from_columns(files[p[2]].read_row_group(p[3], columns=columns).to_pandas())
+        loaded = {p: loaded[p] for p in overlapping}
+
+        flows = np.concatenate(list(loaded.values())) if loaded else np.empty(0, dtype=flow_records.FLOW_DTYPE)
+        first_seen = flows['ts'] // 1000
+        yield start, end, flows[(first_seen >= t_start) & (first_seen <= t_end)]
+
+
+def meter_to_store(path, directory, bucket=cnf.FLOW_METER.STORE_BUCKET_SECONDS,
+                   idle_timeout=cnf.FLOW_METER.IDLE_TIMEOUT, active_timeout=cnf.FLOW_METER.ACTIVE_TIMEOUT):
+    """Builds flows from packets of a pcap file and stores them as parts of the flow store buckets.
+
+    It is meant to be run in a worker process; the parts have to be merged afterwards (see FlowStore.merge).
+
+    :param path: A path to a pcap file
+    :type path: str
+    :param directory: A directory of the flow store
+    :type directory: str
+    :return: Numbers of packets processed and flows stored and paths of the bucket files the flows are stored in
+    :rtype: tuple
+    """
+    store = FlowStore(directory, bucket)
+    store.remove_parts(os.path.basename(path))
+    flow_meter = FlowMeter(idle_timeout, active_timeout)
+    outputs = set()
+    for i, flows in enumerate(flow_meter.meter(path)):
+        if len(flows):
+            outputs.update(store.write_parts(flows, os.path.basename(path) + '.' + str(i)))
+    return flow_meter.packets_processed, flow_meter.flows_exported, sorted(outputs)
+
+
+def meter_shard_to_store(path, start, end, directory, bucket=cnf.FLOW_METER.STORE_BUCKET_SECONDS,
+                         idle_timeout=cnf.FLOW_METER.IDLE_TIMEOUT, active_timeout=cnf.FLOW_METER.ACTIVE_TIMEOUT):
+    """Builds flows from packets of a shard of a pcap file and stores them as parts of the flow store buckets.
+
+    It is meant to be run in a worker process; packets of the boundary segments are returned to be stitched (see
+    FlowMeter.meter_shard) and the parts have to be merged afterwards (see FlowStore.merge).
+
+    :param path: A path to a pcap file
+    :type path: str
+    :param start: An offset of the first packet record of the shard
+    :type start: int
+    :param end: An offset of the end of the shard
+    :type end: int
+    :param directory: A directory of the flow store
+    :type directory: str
+    :return: Numbers of packets processed and flows stored, paths of the bucket files the flows are stored in,
+        packets of the boundary segments and the time of the last packet of the shard
+    :rtype: tuple
+    """
+    flow_meter = FlowMeter(idle_timeout, active_timeout)
+    flows, boundary, last = flow_meter.meter_shard(path, start, end)
+    outputs = []
+    if len(flows):
+        outputs = FlowStore(directory, bucket).write_parts(flows, os.path.basename(path) + '.' + str(start))
+    return flow_meter.packets_processed, flow_meter.flows_exported, outputs, boundary, last
+
+
+def main():
+    pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,336 @@
+import atexit
+import copy
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+import traceback
+from uuid import uuid4
+
+import configuration as cnf
+
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+PROGRESS = 'progress'
+
+
+def get_state(obj):
+    """Gets attributes of an object the way pickle does (honouring __getstate__).
+
+    :rtype: dict
+    """
+    state = obj.__getstate__() if hasattr(obj, '__getstate__') else vars(obj)
+    return state if isinstance(state, dict) else {}
+
+
+def synchronize(target, state, visited=None):
+    """Copies attributes into an object; attributes that are naadi objects of the same class are synchronized
+    recursively, so other references to them (e.g. the Presenter referenced by GUI modules) stay valid.
+
+    :param target: An object to be updated
+    :type target: object
+    :param state: Attributes as returned by get_state
+    :type state: dict
+    :rtype: None
+    """
+    visited = set() if visited is None else visited
+    visited.add(id(target))
+    for k, v in state.items():
+        current = getattr(target, k, None)
+        if current is not None and type(current) is type(v) and type(v).__module__.startswith('naadi.') and \
+                hasattr(v, '__dict__'):
+            if id(current) not in visited:
+                synchronize(current, get_state(v), visited)
+        else:
+            setattr(target, k, v)
+    return None
+
+
+def _run_job(job_id, obj, method, args, kwargs, progress, messages, interval):
+    """Runs a method of an object in a worker process and reports its progress and result to the parent.
+
+    The worker becomes a leader of a new process group, so that cancelling the job kills also the processes it has
+    started (nfcapd, softflowd, nfdump).
+    """
+    os.setpgrp()
+    stop = threading.Event()
+
+    def report():
+        while not stop.wait(interval):
+            messages.put((job_id, PROGRESS, {a: getattr(obj, a, None) for a in progress}))
+
+    reporter = threading.Thread(target=report, daemon=True)
+    reporter.start()
+    try:
+        result = getattr(obj, method)(*args, **kwargs)
+        stop.set()
+        reporter.join()
+        messages.put((job_id, DONE, (get_state(obj), result)))
+    except Exception:
+        stop.set()
+        reporter.join()
+        messages.put((job_id, FAILED, traceback.format_exc()))
+
+
+class Job:
+    def __init__(self, name, obj, method, args, kwargs, progress):
+        self.id = uuid4().hex
+        self.name = name
+        self.obj = obj
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+        self.progress = {a: None for a in progress}
+        self.initial = {a: copy.deepcopy(getattr(obj, a, None)) for a in progress}
+
+        self.status = PENDING
+        self.result = None
+        self.error = ''
+        self.process = None
+        self.submitted = time.monotonic()
+        self.started = None
+        self.finished = None
+
+    def is_active(self):
+        return self.status in (PENDING, RUNNING)
+
+    def get_time_elapsed(self):
+        """Gets time the job has been running for (or had run for) as minutes and seconds.
+
+        :rtype: list
+        """
+        if self.started is None:
+            return [0, 0]
+        t = (self.finished or time.monotonic()) - self.started
+        return [int(t // 60), int(t % 60)]
+
+    def get_message(self):
+        te = self.get_time_elapsed()
+        time_elapsed = str(te[0]) + ' minutes and ' + str(te[1]) + ' seconds'
+        if self.status == PENDING:
+            return self.name + ' is waiting for a free worker...'
+        if self.status == RUNNING:
+            return self.name + ' is running for ' + time_elapsed + '.'
+        if self.status == DONE:
+            return self.name + ' has finished in ' + time_elapsed + '.'
+        if self.status == FAILED:
+            return self.name + ' has failed after ' + time_elapsed + ': ' + \
+                (self.error.strip().splitlines() or [''])[-1]
+        return self.name + ' has been cancelled after ' + time_elapsed + '.'
+
+
+class JobManager:
+    """Runs long actions of the GUI (pcap conversion, queries, analysis) as background jobs in worker processes.
+
+    A job is a method of a module object (Collector, Data Acquisitor, Analyzer); the object is handed over to a
+    worker process and submitting returns a job id at once. While the job runs, the worker reports the progress
+    attributes of its copy of the object (e.g. info_message) every PROGRESS_INTERVAL and the manager copies them into
+    the original object, so the existing GUI callbacks refreshed every dt show them. When the job finishes, the whole
+    state of the object is copied back (see synchronize). At most max_running jobs run at once, the others wait in
+    the submission order; a job can be cancelled, whether it waits or runs.
+    """
+
+    def __init__(self, max_running=cnf.JOBS.MAX_RUNNING, interval=cnf.JOBS.PROGRESS_INTERVAL,
+                 start_method=cnf.JOBS.START_METHOD):
+        self.max_running = max_running
+        self.interval = interval
+
+        self.context = multiprocessing.get_context(start_method)
+        self.messages = None
+        self.jobs = {}
+        self.lock = threading.RLock()
+        self._collector = None
+
+        atexit.register(self.shutdown)
+
+    def _start(self, job):
+        job.process = self.context.Process(target=_run_job,
+                                           args=(job.id, job.obj, job.method, job.args, job.kwargs,
+                                                 list(job.progress), self.messages, self.interval))
+        job.status = RUNNING
+        job.started = time.monotonic()
+        job.process.start()
+        return None
+
+    def _schedule(self):
+        with self.lock:
+            running = len([j for j in self.jobs.values() if j.status == RUNNING])
+            for job in [j for j in self.jobs.values() if j.status == PENDING][:max(self.max_running - running, 0)]:
+                self._start(job)
+        return None
+
+    @staticmethod
+    def _finish(job, status):
+        """Marks a job as finished; it is called with the lock held, the worker is reaped after the lock is released
+        (see _reap).
+
+        A job that has failed or has been cancelled does not copy its state back, so the progress attributes it has
+        reported are reset to their values from the submission, not to show a half-finished state as if the job was
+        still running, and the error message of the object tells why the job has ended.
+        """
+        job.status = status
+        job.finished = time.monotonic()
+        if status in (FAILED, CANCELLED):
+            synchronize(job.obj, copy.deepcopy(job.initial))
+            if hasattr(job.obj, 'error_message'):
+                job.obj.error_message = job.get_message()
+        return None
+
+    @staticmethod
+    def _signal(process, sig):
+        """Signals the process group of a worker or the worker alone if it has not become a group leader yet."""
+        try:
+            os.killpg(process.pid, sig)
+        except ProcessLookupError:
+            try:
+                os.kill(process.pid, sig)
+            except ProcessLookupError:
+                pass
+        return None
+
+    def _reap(self, job):
+        """Waits for the worker of a finished job and kills it with its processes if it does not exit in time.
+
+        It is called without the lock, so status polling and other jobs are not blocked meanwhile.
+        """
+        if job.process is not None:
+            job.process.join(cnf.JOBS.JOIN_TIMEOUT)
+            if job.process.is_alive():
+                self._signal(job.process, signal.SIGKILL)
+                job.process.join()
+        return None
+
+    def _handle(self, job_id, kind, payload):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.status != RUNNING:
+                return None
+            if kind == PROGRESS:
+                job.progress.update(payload)
+                synchronize(job.obj, payload)
+                return None
+            if kind == DONE:
+                synchronize(job.obj, payload[0])
+                job.result = payload[1]
+                self._finish(job, DONE)
+            else:
+                job.error = payload
+                self._finish(job, FAILED)
+        self._reap(job)
+        return None
+
+    def _collect(self):
+        """Receives messages from worker processes and starts waiting jobs when workers become free."""
+        while True:
+            try:
+                self._handle(*self.messages.get(timeout=self.interval))
+            except queue.Empty:
+                pass
+            if not self.messages.empty():
+                continue
+
+            with self.lock:
+                exited = [j for j in self.jobs.values()
+                          if j.status == RUNNING and not j.process.is_alive() and self.messages.empty()]
+                for job in exited:
+                    job.error = 'The worker process has exited with code ' + str(job.process.exitcode) + '.'
+                    self._finish(job, FAILED)
+                self._schedule()
+                finished = not any([j.is_active() for j in self.jobs.values()])
+                if finished:
+                    self._collector = None
+            for job in exited:
+                self._reap(job)
+            if finished:
+                return None
+
+    def submit(self, name, obj, method, *args, progress=(), **kwargs):
+        """Submits a job; a job with the same name that is still waiting or running is not submitted again.
+
+        :param name: A name of the job shown in the GUI
+        :type name: str
+        :param obj: A module object
+        :type obj: object
+        :param method: A name of the method of the object to be run
+        :type method: str
+        :param progress: Names of the object attributes reported while the job runs
+        :type progress: tuple
+        :return: The job id
+        :rtype: str
+        """
+        with self.lock:
+            for job in self.jobs.values():
+                if job.name == name and job.is_active():
+                    return job.id
+
+            if self.messages is None:
+                self.messages = self.context.Queue()
+            job = Job(name, obj, method, args, kwargs, progress)
+            self.jobs[job.id] = job
+            self._schedule()
+            if self._collector is None:
+                self._collector = threading.Thread(target=self._collect, daemon=True)
+                self._collector.start()
+        return job.id
+
+    def cancel(self, job_id):
+        """Cancels a waiting job or kills a running one together with the processes it has started.
+
+        :return: True if the job has been cancelled
+        :rtype: bool
+        """
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or not job.is_active():
+                return False
+            if job.status == RUNNING:
+                self._signal(job.process, signal.SIGTERM)
+            self._finish(job, CANCELLED)
+            self._schedule()
+        self._reap(job)
+        return True
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def get_latest(self, name):
+        """Gets the job with the name submitted last.
+
+        :rtype: Job
+        """
+        jobs = [j for j in self.jobs.values() if j.name == name]
+        return jobs[-1] if jobs else None
+
+    def get_message(self, name, idle_message=''):
+        job = self.get_latest(name)
+        return job.get_message() if job is not None else idle_message
+
+    def get_status(self, name):
+        """Gets the id and the status of the job with the name submitted last; unlike its message, it does not change
+        while the job runs.
+
+        :return: The job id and status or None if no such job has been submitted
+        :rtype: list
+        """
+        job = self.get_latest(name)
+        return [job.id, job.status] if job is not None else None
+
+    def shutdown(self):
+        """Cancels all jobs; called at exit, so that no worker process outlives the application."""
+        for job_id in list(self.jobs):
+            self.cancel(job_id)
+        return None
+
+
+def main():
+    return JobManager()
+
+
+if __name__ == '__main__':
+    main()
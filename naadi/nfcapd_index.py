@@ -0,0 +1,129 @@
+import hashlib
+import json
+import os
+
+import configuration as cnf
+from naadi import nfcapd_reader
+
+
+SKIPPED_OTHER = 'not an nfcapd file'
+SKIPPED_UNREADABLE = 'unreadable'
+
+
+class NfcapdIndex:
+    """Persistent catalog of rotated nfcapd files stored in a directory tree.
+
+    For every file the catalog keeps its time span, number of flows, size and modification time, and the reason it
+    was skipped if it is not a readable nfcapd file. Only the file headers are read to build it and the files that
+    have not changed since the last update are not read again.
+    """
+
+    def __init__(self, directory, index_dir=cnf.INDEX.DIR):
+        self.directory = directory
+        self.index_path = os.path.join(index_dir,
+                                       hashlib.sha1(os.path.abspath(directory).encode('utf-8')).hexdigest() + '.json')
+
+        self.files = {}
+        self.complete = True
+
+        if os.path.isfile(self.index_path):
+            with open(self.index_path, 'r') as f:
+                self.files = json.load(f)
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        with open(self.index_path + '.tmp', 'w') as f:
+            json.dump(self.files, f)
+        os.replace(self.index_path + '.tmp', self.index_path)
+        return None
+
+    def update(self):
+        """Adds new and changed files to the catalog and removes deleted ones.
+
+        Files that are being written by nfcapd are skipped. Files that are not nfcapd files and nfcapd files that
+        cannot be indexed (e.g. an unsupported layout version) are recorded as skipped, so they are not opened again
+        until they change; if any nfcapd file cannot be indexed the catalog is marked as incomplete.
+
+        :return: True if the catalog has changed
+        :rtype: bool
+        """
+        paths = set()
+        changed = False
+        self.complete = True
+        for root, _, names in os.walk(self.directory):
+            for n in names:
+                if n.startswith(cnf.INDEX.SKIP_PREFIXES):
+                    continue
+                path = os.path.join(root, n)
+                stat = os.stat(path)
+                paths.add(path)
+                entry = self.files.get(path)
+                if entry is not None and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+                    if entry.get('skipped') == SKIPPED_UNREADABLE:
+                        self.complete = False
+                    continue
+
+                entry = {'first': None, 'last': None, 'flows': 0, 'size': stat.st_size, 'mtime': stat.st_mtime}
+                try:
+                    if nfcapd_reader.is_nfcapd_file(path):
+                        header = nfcapd_reader.NfcapdReader(path).read_stat()
+                        entry.update({'first': header['first_seen'] // 1000,
+                                      'last': header['last_seen'] // 1000,
+                                      'flows': header['flows']})
+                    else:
+                        entry['skipped'] = SKIPPED_OTHER
+                except ValueError:
+                    entry['skipped'] = SKIPPED_UNREADABLE
+                    self.complete = False
+
+                self.files[path] = entry
+                changed = True
+
+        for path in set(self.files) - paths:
+            del self.files[path]
+            changed = True
+
+        if changed:
+            self._save()
+        return changed
+
+    def get_signature(self):
+        """Describes the state of the cataloged files the same way as FlowCache.get_source_signature, without walking
+        the directory tree again.
+
+        :return: Number of files, their total size and the latest modification time
+        :rtype: list
+        """
+        entries = list(self.files.values())
+        return [len(entries), sum([e['size'] for e in entries]), max([e['mtime'] for e in entries], default=0)]
+
+    def get_time_window(self):
+        """Gets the time span of all indexed files that contain any flows.
+
+        :return: The first and the last second of the time span as UNIX timestamps or None if there are no flows
+        :rtype: tuple
+        """
+        entries = [e for e in self.files.values() if e['flows']]
+        if not entries:
+            return None
+        return min([e['first'] for e in entries]), max([e['last'] for e in entries])
+
+    def get_files(self, t_start, t_end):
+        """Gets the files that contain any flows overlapping the time range.
+
+        :param t_start: A start of the time range as a UNIX timestamp
+        :type t_start: int
+        :param t_end: An end of the time range as a UNIX timestamp
+        :type t_end: int
+        :return: Sorted paths of the files
+        :rtype: list
+        """
+        return sorted([p for p, e in self.files.items() if e['flows'] and e['first'] <= t_end and e['last'] >= t_start])
+
+
+def main():
+    pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,323 @@
+import bz2
+import mmap
+import os
+import struct
+
+import numpy as np
+
+import configuration as cnf
+
+try:
+    import lzo
+except ImportError:
+    lzo = None
+
+try:
+    import lz4.block
+except ImportError:
+    lz4 = None
+
+
+FILE_HEADER = struct.Struct('<HHII128s')
+STAT_RECORD = struct.Struct('<15QIIHHI')
+BLOCK_HEADER = struct.Struct('<IIHH')
+RECORD_HEADER = struct.Struct('<HH')
+
+MAGIC = 0xA50C
+LAYOUT_VERSION_1 = 1
+DATA_BLOCK_TYPE_2 = 2
+COMMON_RECORD_TYPE = 10
+
+FLAG_LZO_COMPRESSED = 0x1
+FLAG_BZ2_COMPRESSED = 0x8
+FLAG_LZ4_COMPRESSED = 0x10
+
+FLAG_IPV6_ADDR = 0x1
+FLAG_PKG_64 = 0x2
+FLAG_BYTES_64 = 0x4
+
+COMMON_RECORD_FIELDS = {'flags': (4, '<u2'),
+                        'msec_first': (8, '<u2'),
+                        'msec_last': (10, '<u2'),
+                        'first': (12, '<u4'),
+                        'last': (16, '<u4'),
+                        'tcp_flags': (21, 'u1'),
+                        'proto': (22, 'u1'),
+                        'tos': (23, 'u1'),
+                        'src_port': (24, '<u2'),
+                        'dst_port': (26, '<u2')}
+COMMON_RECORD_DATA_OFFSET = 32
+
+COLUMNS_DTYPES = {'ts': np.int64,
+                  'te': np.int64,
+                  'proto': np.uint8,
+                  'ipv6': np.bool_,
+                  'src_addr_hi': np.uint64,
+                  'src_addr_lo': np.uint64,
+                  'dst_addr_hi': np.uint64,
+                  'dst_addr_lo': np.uint64,
+                  'src_port': np.uint16,
+                  'dst_port': np.uint16,
+                  'packets': np.uint64,
+                  'bytes': np.uint64,
+                  'flags': np.uint8,
+                  'tos': np.uint8}
+
+
+class NfcapdReader:
+    """Reads nfcapd binary files (nfdump 1.6 layout) without the nfdump CLI.
+
+    The file is memory-mapped and the flow records of every data block are decoded into NumPy column arrays.
+    Uncompressed and BZ2 compressed files are supported out of the box; LZO and LZ4 compressed files require the
+    python-lzo and lz4 packages respectively.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+        self.flags = None
+        self.num_blocks = None
+        self.ident = None
+        self.stat = None
+
+    def _read_header(self, buffer):
+        """Reads the file header and the statistics record.
+
+        :param buffer: The whole file content
+        :type buffer: mmap.mmap
+        :return: An offset of the first data block
+        :rtype: int
+        """
+        magic, version, self.flags, self.num_blocks, ident = FILE_HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise ValueError('Nfcapd reader: ' + self.path + ' is not an nfcapd file.')
+        if version != LAYOUT_VERSION_1:
+            raise ValueError('Nfcapd reader: ' + self.path + ' has an unsupported file layout version ' + str(version) +
+                             '.')
+        self.ident = ident.split(b'\x00')[0].decode('utf-8', errors='replace')
+
+        stat = STAT_RECORD.unpack_from(buffer, FILE_HEADER.size)
+        self.stat = {'flows': stat[0],
+                     'bytes': stat[1],
+                     'packets': stat[2],
+                     'first_seen': stat[15] * 1000 + stat[17],
+                     'last_seen': stat[16] * 1000 + stat[18]}
+
+        return FILE_HEADER.size + STAT_RECORD.size
+
+    def _decompress(self, payload):
+        """Decompresses a data block according to the file header flags.
+
+        :param payload: Data block without its header
+        :type payload: bytes
+        :return: Uncompressed data block
+        :rtype: bytes
+        """
+        if self.flags & FLAG_LZO_COMPRESSED:
+            if lzo is None:
+                raise ImportError('Nfcapd reader: python-lzo is required to read LZO compressed files.')
+            return lzo.decompress(bytes(payload), False, cnf.NFDUMP.NFCAPD_BUFFER_SIZE)
+        if self.flags & FLAG_BZ2_COMPRESSED:
+            return bz2.decompress(payload)
+        if self.flags & FLAG_LZ4_COMPRESSED:
+            if lz4 is None:
+                raise ImportError('Nfcapd reader: lz4 is required to read LZ4 compressed files.')
+            return lz4.block.decompress(bytes(payload), uncompressed_size=cnf.NFDUMP.NFCAPD_BUFFER_SIZE)
+        return payload
+
+    @staticmethod
+    def _gather(buffer, offsets, dtype):
+        """Reads a fixed size value at every offset of the buffer at once.
+
+        :param buffer: Data block as an array of bytes
+        :type buffer: np.ndarray
+        :param offsets: Positions of the values in the buffer
+        :type offsets: np.ndarray
+        :param dtype: NumPy type of the values
+        :type dtype: str
+        :rtype: np.ndarray
+        """
+        dtype = np.dtype(dtype)
+        return buffer[offsets[:, None] + np.arange(dtype.itemsize)].view(dtype).ravel()
+
+    def _decode_block(self, block):
+        """Decodes all common records of a single uncompressed data block into column arrays.
+
+        Walking through the records is the only sequential step; the fields themselves are read for all records at
+        once.
+
+        :param block: Uncompressed data block without its header
+        :type block: bytes or memoryview
+        :return: Column arrays
+        :rtype: dict
+        """
+        offsets = []
+        position = 0
+        while position + RECORD_HEADER.size <= len(block):
+            record_type, record_size = RECORD_HEADER.unpack_from(block, position)
+            if record_size == 0:
+                break
+            if record_type == COMMON_RECORD_TYPE:
+                offsets.append(position)
+            position = position + record_size
+
+        buffer = np.frombuffer(block, dtype=np.uint8)
+        offsets = np.array(offsets, dtype=np.int64)
+        fields = {k: self._gather(buffer, offsets + o, t) for k, (o, t) in COMMON_RECORD_FIELDS.items()}
+
+        ipv6 = (fields['flags'] & FLAG_IPV6_ADDR) > 0
+        columns = {'ts': fields['first'].astype(np.int64) * 1000 + fields['msec_first'],
+                   'te': fields['last'].astype(np.int64) * 1000 + fields['msec_last'],
+                   'proto': fields['proto'],
+                   'ipv6': ipv6,
+                   'src_addr_hi': np.zeros(len(offsets), dtype=np.uint64),
+                   'src_addr_lo': np.zeros(len(offsets), dtype=np.uint64),
+                   'dst_addr_hi': np.zeros(len(offsets), dtype=np.uint64),
+                   'dst_addr_lo': np.zeros(len(offsets), dtype=np.uint64),
+                   'src_port': fields['src_port'],
+                   'dst_port': fields['dst_port'],
+                   'packets': np.zeros(len(offsets), dtype=np.uint64),
+                   'bytes': np.zeros(len(offsets), dtype=np.uint64),
+                   'flags': fields['tcp_flags'],
+                   'tos': fields['tos']}
+
+        data = offsets + COMMON_RECORD_DATA_OFFSET
+        columns['src_addr_lo'][~ipv6] = self._gather(buffer, data[~ipv6], '<u4')
+        columns['dst_addr_lo'][~ipv6] = self._gather(buffer, data[~ipv6] + 4, '<u4')
+        columns['src_addr_hi'][ipv6] = self._gather(buffer, data[ipv6], '<u8')
+        columns['src_addr_lo'][ipv6] = self._gather(buffer, data[ipv6] + 8, '<u8')
+        columns['dst_addr_hi'][ipv6] = self._gather(buffer, data[ipv6] + 16, '<u8')
+        columns['dst_addr_lo'][ipv6] = self._gather(buffer, data[ipv6] + 24, '<u8')
+
+        counters = data + np.where(ipv6, 32, 8)
+        for name, flag in (('packets', FLAG_PKG_64), ('bytes', FLAG_BYTES_64)):
+            wide = (fields['flags'] & flag) > 0
+            columns[name][wide] = self._gather(buffer, counters[wide], '<u8')
+            columns[name][~wide] = self._gather(buffer, counters[~wide], '<u4')
+            counters = counters + np.where(wide, 8, 4)
+
+        return columns
+
+    def read_stat(self):
+        """Reads only the file header and the statistics record, i.e. time span and volumes of the file.
+
+        :return: Number of flows, bytes and packets and first and last seen timestamps in milliseconds
+        :rtype: dict
+        """
+        with open(self.path, 'rb') as f:
+            self._read_header(f.read(FILE_HEADER.size + STAT_RECORD.size))
+        return self.stat
+
+    def read_chunks(self, t_start=None, t_end=None, chunk_flows=cnf.NFDUMP.READ_CHUNK_FLOWS):
+        """Reads flow records of the file in chunks of whole data blocks, so that memory usage does not depend on the
+        size of the file.
+
+        If a time window is given, only the flows that both start and end within the window are returned (the way
+        nfdump -t selects them, with one second precision).
+
+        :param t_start: A start of the time window as a UNIX timestamp in seconds
+        :type t_start: int
+        :param t_end: An end of the time window as a UNIX timestamp in seconds
+        :type t_end: int
+        :param chunk_flows: Minimum number of flow records in a chunk (but the last one); the whole file is read as a
+            single chunk if None
+        :type chunk_flows: int
+        :return: Column arrays: ts and te (milliseconds), proto, ipv6, src/dst_addr_hi/lo, src/dst_port, packets,
+            bytes, flags, tos
+        :rtype: dict
+        """
+        def join(blocks):
+            columns = {k: np.concatenate([b[k] for b in blocks]) if blocks else np.empty(0, dtype=t)
+                       for k, t in COLUMNS_DTYPES.items()}
+            if t_start is not None and t_end is not None:
+                selected = (columns['ts'] // 1000 >= t_start) & (columns['te'] // 1000 <= t_end)
+                columns = {k: v[selected] for k, v in columns.items()}
+            return columns
+
+        blocks = []
+        with open(self.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            position = self._read_header(buffer)
+            for _ in range(self.num_blocks):
+                num_records, size, block_id, _ = BLOCK_HEADER.unpack_from(buffer, position)
+                position = position + BLOCK_HEADER.size
+                if position + size > len(buffer):
+                    raise ValueError('Nfcapd reader: ' + self.path + ' is truncated.')
+                if block_id == DATA_BLOCK_TYPE_2 and num_records:
+                    blocks.append(self._decode_block(self._decompress(buffer[position:position + size])))
+                position = position + size
+                if chunk_flows is not None and sum([len(b['ts']) for b in blocks]) >= chunk_flows:
+                    yield join(blocks)
+                    blocks = []
+
+        if blocks or chunk_flows is None:
+            yield join(blocks)
+
+    def read(self, t_start=None, t_end=None):
+        """Reads all flow records of the file at once, see read_chunks.
+
+        :rtype: dict
+        """
+        return next(self.read_chunks(t_start, t_end, None))
+
+
+def is_nfcapd_file(path):
+    """Checks the magic number of a file; nfcapd files of all layout versions share it.
+
+    :param path: A path to a file
+    :type path: str
+    :rtype: bool
+    """
+    with open(path, 'rb') as f:
+        magic = f.read(2)
+    return len(magic) == 2 and struct.unpack('<H', magic)[0] == MAGIC
+
+
+def read_nfcapd_file_list(files, t_start=None, t_end=None):
+    """Reads the nfcapd files one after another and joins their columns.
+
+    Files that are not nfcapd files (by their magic number) are skipped; an nfcapd file that cannot be read (e.g. an
+    unsupported layout version or a truncated file) raises an error, so that its flows are not silently missing.
+
+    :param files: Paths to nfcapd files
+    :type files: list
+    :return: Column arrays, see NfcapdReader.read
+    :rtype: dict
+    :raises ValueError: If an nfcapd file cannot be read
+    """
+    parts = []
+    for f in files:
+        if not is_nfcapd_file(f):
+            continue
+        try:
+            parts.append(NfcapdReader(f).read(t_start, t_end))
+        except (struct.error, IndexError, OSError) as e:
+            raise ValueError('Nfcapd reader: ' + f + ' cannot be read (' + str(e) + ').')
+
+    return {k: np.concatenate([p[k] for p in parts]) if parts else np.empty(0, dtype=t)
+            for k, t in COLUMNS_DTYPES.items()}
+
+
+def read_nfcapd_files(path, t_start=None, t_end=None):
+    """Reads a single nfcapd file or all nfcapd files from a directory tree (like nfdump -r and -R).
+
+    :param path: A path to nfcapd file or a directory
+    :type path: str
+    :return: Column arrays, see NfcapdReader.read
+    :rtype: dict
+    """
+    if os.path.isfile(path):
+        return NfcapdReader(path).read(t_start, t_end)
+
+    files = []
+    for root, _, names in os.walk(path):
+        files += [os.path.join(root, n) for n in names]
+
+    return read_nfcapd_file_list(sorted(files), t_start, t_end)
+
+
+def main():
+    pass
+
+
+if __name__ == '__main__':
+    main()
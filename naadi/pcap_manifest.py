@@ -0,0 +1,127 @@
+import hashlib
+import json
+import os
+
+import configuration as cnf
+
+
+class PcapManifest:
+    """Persistent record of pcap files converted into an output directory.
+
+    For every converted file the manifest keeps its size, modification time, content hash and the output files made
+    from it. A file is recorded only when its conversion has finished, so a conversion that is interrupted is resumed
+    with the files that were not recorded yet; files that are already recorded are not converted again, even if they
+    have been moved or renamed since.
+    """
+
+    def __init__(self, output_dir, index_dir=cnf.INDEX.DIR):
+        self.output_dir = output_dir
+        self.manifest_path = os.path.join(index_dir, hashlib.sha1(
+            os.path.abspath(output_dir).encode('utf-8')).hexdigest() + '.manifest.json')
+
+        self.files = {}
+        self._digests = {}
+
+        if os.path.isfile(self.manifest_path):
+            with open(self.manifest_path, 'r') as f:
+                self.files = json.load(f)
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.manifest_path), exist_ok=True)
+        with open(self.manifest_path + '.tmp', 'w') as f:
+            json.dump(self.files, f)
+        os.replace(self.manifest_path + '.tmp', self.manifest_path)
+        return None
+
+    def _get_digest(self, path):
+        key = os.path.abspath(path)
+        if key not in self._digests:
+            digest = hashlib.blake2b(digest_size=16)
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(cnf.FLOW_METER.MANIFEST_BLOCK_BYTES), b''):
+                    digest.update(block)
+            self._digests[key] = digest.hexdigest()
+        return self._digests[key]
+
+    def is_done(self, path):
+        """Checks if a pcap file has been converted already.
+
+        The content of the file is hashed only if the file is not recorded under its path with the same size and
+        modification time and some other recorded file has the same size.
+
+        :param path: A path to a pcap file
+        :type path: str
+        :rtype: bool
+        """
+        key = os.path.abspath(path)
+        stat = os.stat(path)
+        entry = self.files.get(key)
+        if entry is not None and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+            return True
+
+        candidates = [e for e in self.files.values() if e['size'] == stat.st_size]
+        if not candidates:
+            return False
+
+        digest = self._get_digest(path)
+        for e in candidates:
+            if e['hash'] == digest:
+                self.files[key] = dict(e, mtime=stat.st_mtime)
+                self._save()
+                return True
+        return False
+
+    def is_changed(self, path):
+        """Checks if a pcap file recorded under its path has changed since it was converted, i.e. it is recorded but
+        not done (see is_done).
+
+        :param path: A path to a pcap file
+        :type path: str
+        :rtype: bool
+        """
+        return os.path.abspath(path) in self.files and not self.is_done(path)
+
+    def get_pending(self, paths):
+        """Selects pcap files that have not been converted yet.
+
+        :param paths: Paths to pcap files
+        :type paths: list
+        :rtype: list
+        """
+        return [p for p in paths if not self.is_done(p)]
+
+    def mark_done(self, path, outputs):
+        """Records a converted pcap file with its output files.
+
+        :param path: A path to a pcap file
+        :type path: str
+        :param outputs: Paths to the output files made from the pcap file
+        :type outputs: list
+        :rtype: None
+        """
+        stat = os.stat(path)
+        self.files[os.path.abspath(path)] = {'size': stat.st_size,
+                                             'mtime': stat.st_mtime,
+                                             'hash': self._get_digest(path),
+                                             'outputs': sorted(outputs)}
+        self._save()
+        return None
+
+    def rename_output(self, old, new):
+        """Updates the records after an output file has been renamed; if the new name replaced an output file of
+        another pcap file, that file is no longer recorded as its output.
+
+        :rtype: None
+        """
+        for e in self.files.values():
+            e['outputs'] = sorted([new if o == old else o for o in e['outputs'] if o != new])
+        self._save()
+        return None
+
+
+def main():
+    pass
+
+
+if __name__ == '__main__':
+    main()
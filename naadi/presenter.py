@@ -1,9 +1,14 @@
+import math
+import operator
+from collections import OrderedDict
+from uuid import uuid4
+
 import pandas as pd
 import numpy as np
 import plotly.graph_objs as go
-import plotly.figure_factory as ff
 
 from naadi import system
+from naadi.figure_cache import FigureCache
 import configuration as cnf
 
 
@@ -22,6 +27,16 @@ class Presenter:
         self.data = {'x_train': None, 'y_train': None, 'x_test': None, 'y_test': None, 'features_names': []}
         self.data_reduced = {'x_train': None, 'y_train': None, 'x_test': None, 'y_test': None, 'features_names': []}
         self.charts = {}
+        self.tables = OrderedDict()
+        self.table_views = {}
+
+        self.version = 0
+        self.figure_cache = FigureCache()
+        self.scatter_input = None
+        self.figure_ids = {}
+        self.zoom_inputs = {}
+        self.bins = {}
+        self.histograms = {}
 
     ####################################################################################################################
     # STATIC METHODS
@@ -35,6 +50,99 @@ class Presenter:
             num_of_records = cnf.GUI.MAX_ROWS
         return min([data['df'].shape[0], num_of_records])
 
+    @staticmethod
+    def filter_table(df, filtering):
+        """Selects rows of a table matching a filter of DataTable, e.g. '"sa" eq 10.0.0.1 && "pkt" > num(10)'.
+
+        Supported operators are eq, ne, >, >=, <, <= and contains; an expression that cannot be parsed is ignored.
+
+        :param df: A table
+        :type df: pd.DataFrame
+        :param filtering: Filtering settings of DataTable
+        :type filtering: str
+        :return: A mask of the matching rows
+        :rtype: np.ndarray
+        """
+        operators = [(' eq ', operator.eq), (' ne ', operator.ne), (' >= ', operator.ge), (' <= ', operator.le),
+                     (' > ', operator.gt), (' < ', operator.lt), (' contains ', None)]
+        mask = np.ones(len(df), dtype=bool)
+        for expression in (filtering or '').split(' && '):
+            for symbol, function in operators:
+                if symbol not in expression:
+                    continue
+                name, value = [e.strip() for e in expression.split(symbol, 1)]
+                name = name.strip('"{}')
+                if value.startswith('num(') and value.endswith(')'):
+                    value = value[4:-1]
+                value = value.strip('"\'')
+                if name not in df.columns:
+                    break
+
+                column = df[name]
+                if function is None:
+                    mask &= np.asarray(column.astype(str).str.contains(value, regex=False))
+                elif pd.api.types.is_numeric_dtype(column):
+                    try:
+                        mask &= np.asarray(function(column, float(value)))
+                    except ValueError:
+                        mask &= False
+                else:
+                    mask &= np.asarray(function(column.astype(str), value))
+                break
+        return mask
+
+    @staticmethod
+    def downsample_scatter(x, y, labels, max_points, x_range=None, y_range=None, outliers=cnf.GUI.SCATTER_OUTLIERS):
+        """Selects at most max_points points of a scatter, keeping the class balance and the outliers.
+
+        Points are grouped by label in one pass. The points are shared evenly among the labels (a label with fewer
+        points than its share gives the rest to the others); within a label, points outside the outliers quantiles of
+        either coordinate take up to half of its share (the farthest from the median first) and the rest is sampled
+        from the other points.
+
+        :param x: X coordinates
+        :type x: np.ndarray
+        :param y: Y coordinates
+        :type y: np.ndarray
+        :param labels: Labels of the points
+        :type labels: np.ndarray
+        :param max_points: A maximal number of points selected
+        :type max_points: int
+        :param x_range: A visible range of x coordinates (only visible points are selected)
+        :type x_range: list
+        :param y_range: A visible range of y coordinates
+        :type y_range: list
+        :return: Positions of the selected points by label
+        :rtype: dict
+        """
+        visible = np.ones(len(x), dtype=bool)
+        if x_range is not None:
+            visible &= (x >= x_range[0]) & (x <= x_range[1])
+        if y_range is not None:
+            visible &= (y >= y_range[0]) & (y <= y_range[1])
+        positions = np.flatnonzero(visible)
+        groups = pd.Series(positions).groupby(np.asarray(labels)[positions], sort=True).indices
+
+        rng = np.random.default_rng(0)
+        selected = {}
+        remaining = max_points
+        for i, (label, group) in enumerate(sorted(groups.items(), key=lambda g: len(g[1]))):
+            group = positions[group]
+            take = min(len(group), remaining // (len(groups) - i))
+            remaining = remaining - take
+            if take < len(group):
+                gx, gy = x[group], y[group]
+                extreme = ((gx < np.quantile(gx, outliers)) | (gx > np.quantile(gx, 1 - outliers)) |
+                           (gy < np.quantile(gy, outliers)) | (gy > np.quantile(gy, 1 - outliers)))
+                score = np.maximum(np.abs(gx - np.median(gx)) / (np.ptp(gx) or 1),
+                                   np.abs(gy - np.median(gy)) / (np.ptp(gy) or 1))
+                k = min(take // 2, int(extreme.sum()))
+                kept = np.argpartition(-score, k)[:k] if k else np.empty(0, dtype=int)
+                others = np.setdiff1d(np.arange(len(group)), kept, assume_unique=True)
+                group = group[np.concatenate([kept, rng.choice(others, take - k, replace=False)])]
+            selected[label] = np.sort(group)
+        return selected
+
     @staticmethod
     def set_xaxis(xaxis):
         return go.layout.XAxis({'title': xaxis,
@@ -61,13 +169,85 @@ class Presenter:
                                 'linewidth': cnf.GUI.AXIS_WIDTH,
                                 'showgrid': True})
 
+    ####################################################################################################################
+    # DATA AND FIGURES MANAGER
+    ####################################################################################################################
+
+    def set_data(self, name, data):
+        """Sets one of data sets (data_raw, data or data_reduced); cached figures of the previous data are dropped
+        and histograms of all columns of the new data are computed (see get_histogram).
+
+        :param name: A name of the data set attribute
+        :type name: str
+        :param data: A dictionary with train and test features and labels and features names
+        :type data: dict
+        :rtype: None
+        """
+        setattr(self, name, data)
+        self.version = self.version + 1
+        self.figure_cache.clear()
+        self.figure_ids = {}
+        self.zoom_inputs = {}
+        self.bins = {}
+
+        self.histograms = {k: v for k, v in self.histograms.items() if k[0] != name}
+        for dataset in ('x_train', 'y_train', 'x_test', 'y_test'):
+            df = data.get(dataset)
+            if df is not None:
+                for column in [df.name] if isinstance(df, pd.core.series.Series) else df.columns:
+                    self.get_histogram((name, dataset), column)
+        return None
+
+    def get_figure(self, chart_name, dataset=None, features=None, rows_num=cnf.GUI.MAX_ROWS):
+        """Gets a chart as a Figure, from the figure cache if it has been built for the same data already.
+
+        Figures are keyed by the chart name, the data version, the data set, the features and the row limit. Tables
+        are not cached, as they are served page by page (see get_table_page).
+
+        Tables and scatters have a figure id, which the GUI keeps with the figure and passes back to get_table_page
+        and zoom_scatter, so that each of several figures shown at once (or in several browser tabs) is served from
+        its own state.
+
+        :param chart_name: A general chart type (see GUI.CHARTS_GENERAL) or a name of a chart defined by Analyzer
+        :type chart_name: str
+        :param dataset: A name of the data set a general chart is built from, e.g. 'x_train'
+        :type dataset: str
+        :param features: Features a general chart is built from
+        :type features: list
+        :param rows_num: A maximal number of rows a general chart is built from
+        :type rows_num: int
+        :return: The figure id (or None if the figure is neither a table nor a scatter) and a Figure or a dictionary
+            with a table (see build_table)
+        :rtype: tuple
+        """
+        if chart_name == 'TABLE':
+            table = self.build_chart_general(chart_name, self.data[dataset], features, rows_num)
+            return table['table_id'], table
+
+        key = (chart_name, self.version, dataset, tuple(features or ()), rows_num)
+        figure = self.figure_cache.get(key)
+        if figure is None:
+            self.scatter_input = None
+            if chart_name in cnf.GUI.CHARTS_GENERAL:
+                figure = go.Figure(self.build_chart_general(chart_name, self.data[dataset], features, rows_num,
+                                                            ('data', dataset)))
+            else:
+                figure = go.Figure(self.build_chart_specific(chart_name))
+            self.figure_cache.put(key, figure)
+            if len(figure.data) and all([t.type in ('scatter', 'scattergl') for t in figure.data]):
+                self.figure_ids[key] = uuid4().hex
+                self.zoom_inputs[self.figure_ids[key]] = self.scatter_input
+
+        return self.figure_ids.get(key), figure
+
     ####################################################################################################################
     # GENERAL CHARTS MANAGER
     ####################################################################################################################
 
-    def build_chart_general(self, type_of_chart, dataset, features):
+    def build_chart_general(self, type_of_chart, dataset, features, rows_num=cnf.GUI.MAX_ROWS, source=None):
         if type_of_chart == 'TABLE':
-            data = {'df': dataset[features]}
+            data = {'df': dataset[features],
+                    'rows_num': rows_num}
             return self.build_table(**data)
 
         elif type_of_chart == 'HISTOGRAM':
@@ -75,10 +255,13 @@ class Presenter:
                 features = dataset.name
                 dataset = dataset.to_frame()
 
+            features = [features] if isinstance(features, str) else list(features)
             data = {'df': dataset[features],
-                    'title': type_of_chart + ': ' + features,
-                    'xaxis': features,
+                    'title': type_of_chart + ': ' + ', '.join(features),
+                    'xaxis': ', '.join(features),
                     'yaxis': 'number'}
+            if source is not None:
+                data['source'] = source
             return self.build_histogram(**data)
 
         elif type_of_chart == 'SCATTER':
@@ -87,7 +270,8 @@ class Presenter:
                     'labels': self.data_raw['y_train'],
                     'title': type_of_chart + ': ' + ', '.join(features),
                     'xaxis': features[0],
-                    'yaxis': features[1]}
+                    'yaxis': features[1],
+                    'rows_num': rows_num}
             return self.build_scatter(**data)
 
         else:
@@ -98,56 +282,226 @@ class Presenter:
     ####################################################################################################################
 
     def build_table(self, **data):
+        """Builds a table shown page by page; the table is kept here under a new table id and pages are served by
+        get_table_page. Only the GUI.MAX_TABLES tables built last are kept.
+
+        :return: A dictionary with the table id, columns, the first page, the number of rows and the number of pages
+            of the table
+        :rtype: dict
+        """
         df = data['df']
         n_rows = self.set_size(**data)
+        page_size = data.get('page_size', cnf.GUI.TABLE_PAGE_SIZE)
 
         if isinstance(df, pd.core.series.Series):
             df = df.to_frame()
 
-        return {'columns': [{'name': c.replace('_', ' '), 'id': c} for c in df.columns],
-                'data': df[:n_rows].to_dict('rows')}
+        table_id = uuid4().hex
+        self.tables[table_id] = df[:n_rows]
+        self.table_views[table_id] = (None, None)
+        while len(self.tables) > cnf.GUI.MAX_TABLES:
+            self.table_views.pop(self.tables.popitem(last=False)[0], None)
+
+        return {'table_id': table_id,
+                'columns': [{'name': c.replace('_', ' '), 'id': c} for c in df.columns],
+                'data': self.get_table_page(table_id, 0, page_size),
+                'rows_num': n_rows,
+                'page_count': max(1, math.ceil(n_rows / page_size))}
+
+    def get_table_page(self, table_id, page, page_size, sorting=None, filtering=None):
+        """Gets a page of a table, filtered and sorted.
+
+        Rows are selected through an index of the filtered and sorted table, which is kept until the filtering or
+        sorting changes, so turning pages only takes the rows of the page.
+
+        :param table_id: The id of the table (see build_table)
+        :type table_id: str
+        :param page: A number of the page (from 0)
+        :type page: int
+        :param page_size: A number of rows on a page
+        :type page_size: int
+        :param sorting: Sorting settings of DataTable, e.g. [{'column_id': 'pkt', 'direction': 'desc'}]
+        :type sorting: list
+        :param filtering: Filtering settings of DataTable (see filter_table)
+        :type filtering: str
+        :return: Rows of the page or no rows if the table is not kept any more
+        :rtype: list
+        """
+        table = self.tables.get(table_id)
+        if table is None:
+            return []
+
+        sorting = [s for s in sorting or [] if s['column_id'] in table.columns]
+        key = (tuple([(s['column_id'], s['direction']) for s in sorting]), filtering or '')
+        if self.table_views[table_id][0] != key:
+            index = np.flatnonzero(self.filter_table(table, filtering))
+            if sorting and len(index):
+                view = table.iloc[index].reset_index(drop=True)
+                order = view.sort_values(by=[s['column_id'] for s in sorting],
+                                         ascending=[s['direction'] == 'asc' for s in sorting],
+                                         kind='stable').index.to_numpy()
+                index = index[order]
+            self.table_views[table_id] = (key, index)
+
+        index = self.table_views[table_id][1]
+        return table.iloc[index[page * page_size:(page + 1) * page_size]].to_dict('records')
+
+    def get_histogram(self, source, column, bins=cnf.GUI.HISTOGRAM_BINS):
+        """Gets a histogram of a column of a data set; histograms are computed once per data (see set_data).
+
+        :param source: A name of the data (data_raw, data or data_reduced) and of the data set, e.g. ('data', 'x_train')
+        :type source: tuple
+        :param column: A name of the column
+        :type column: str
+        :return: A histogram (see compute_histogram)
+        :rtype: tuple
+        """
+        key = tuple(source) + (column, bins)
+        if key not in self.histograms:
+            df = getattr(self, source[0])[source[1]]
+            values = df if isinstance(df, pd.core.series.Series) else df[column]
+            self.histograms[key] = self.compute_histogram(values, bins)
+        return self.histograms[key]
+
+    @staticmethod
+    def compute_histogram(values, bins=cnf.GUI.HISTOGRAM_BINS, max_categories=cnf.GUI.HISTOGRAM_MAX_CATEGORIES,
+                          skew=cnf.GUI.HISTOGRAM_SKEW):
+        """Counts values of a column without sorting it.
+
+        1. Non-numeric values are counted per value.
+        2. Integer values with a range of at most max_categories are counted per value with bincount.
+        3. Other values are counted in bins of a fixed width; if more than skew of the values fall into a single bin,
+           bins with edges at quantiles of the values are used instead.
+
+        :param values: Values of the column
+        :type values: pd.Series
+        :return: Values or centers of bins, counts and widths of bins (None if values are counted per value)
+        :rtype: tuple
+        """
+        values = np.asarray(values)
+        if values.dtype.kind == 'b':
+            values = values.astype(np.int64)
+        if values.dtype.kind not in 'iuf':
+            counts = pd.Series(values).value_counts()
+            try:
+                counts = counts.sort_index()
+            except TypeError:
+                pass
+            return np.asarray(counts.index), counts.to_numpy(), None
+
+        if values.dtype.kind == 'f':
+            values = values[np.isfinite(values)]
+        if not len(values):
+            return np.empty(0), np.empty(0, dtype=np.int64), None
+
+        low, high = values.min(), values.max()
+        if high - low < max_categories and (values.dtype.kind in 'iu' or np.all(values == np.rint(values))):
+            counts = np.bincount((values - low).astype(np.int64))
+            x = low + np.arange(len(counts), dtype=values.dtype)
+            return x[counts > 0], counts[counts > 0], None
+
+        counts, edges = np.histogram(values, bins=bins, range=(low, high))
+        if counts.max() > skew * len(values):
+            quantiles = np.unique(np.quantile(values, np.linspace(0, 1, bins + 1)))
+            if len(quantiles) > 2:
+                counts, edges = np.histogram(values, bins=quantiles)
+        return (edges[:-1] + edges[1:]) / 2, counts, np.diff(edges)
 
     def build_histogram(self, **data):
+        """Builds a bar chart of a histogram of every column (see compute_histogram); histograms of data sets given as
+        source are taken from the presenter (see get_histogram).
+
+        :return: A dictionary with traces and layout as data input for Dash Figure.
+        :rtype: dict
+        """
         df = data['df']
         if isinstance(df, pd.core.series.Series):
             df = df.to_frame()
 
-        plot_input = dict()
-        plot_input['x'], plot_input['y'] = np.unique(np.array(df), return_counts=True)
-        plot_input['text'] = plot_input['y']
+        traces = []
+        for column in df.columns:
+            if 'source' in data:
+                x, y, width = self.get_histogram(data['source'], column)
+            else:
+                x, y, width = self.compute_histogram(df[column])
+
+            plot_input = dict()
+            plot_input['x'], plot_input['y'] = x, y
+            plot_input['text'] = plot_input['y']
+            plot_input['name'] = str(column)
+            if width is not None:
+                plot_input['width'] = width
+            traces.append(go.Bar(dict(cnf.GUI.BAR_STYLE, **plot_input)))
 
         layout = dict()
         layout['title'] = data['title']
         layout['xaxis'] = self.set_xaxis(data['xaxis'])
         layout['yaxis'] = self.set_yaxis(data['yaxis'])
 
-        return {'data': [go.Bar(dict(cnf.GUI.BAR_STYLE, **plot_input))],
+        return {'data': traces,
                 'layout': go.Layout(dict(cnf.GUI.GRAPH_LAYOUT, **layout))}
 
     def build_scatter(self, **data):
+        """Builds a scatter with a trace per label from a sample of at most GUI.SCATTER_MAX_POINTS points (see
+        downsample_scatter); WebGL traces are used above GUI.SCATTERGL_THRESHOLD points.
+
+        With x_range and y_range only the points within the ranges are sampled, so zooming in shows more detail (see
+        zoom_scatter).
+
+        :return: A dictionary with traces and layout as data input for Dash Figure.
+        :rtype: dict
+        """
         df = data['df']
         n_records = self.set_size(**data)
+        self.scatter_input = {k: v for k, v in data.items() if k not in ('x_range', 'y_range')}
+
+        labels = data['labels']
+        if isinstance(labels, pd.core.series.Series):
+            labels = labels.reindex(df.index)
+        x = np.asarray(df[data['columns'][0]])
+        y = np.asarray(df[data['columns'][1]])
+        selected = self.downsample_scatter(x, y, np.asarray(labels), min(n_records, cnf.GUI.SCATTER_MAX_POINTS),
+                                           data.get('x_range'), data.get('y_range'))
+        scatter = go.Scattergl if sum([len(p) for p in selected.values()]) > cnf.GUI.SCATTERGL_THRESHOLD else \
+            go.Scatter
 
         traces = []
-        for i, l in enumerate(set(data['labels'])):
+        for i, (l, positions) in enumerate(selected.items()):
             plot_input = dict()
-            plot_input['x'] = df[data['columns'][0]][data['labels'] == l][:n_records]
-            plot_input['y'] = df[data['columns'][1]][data['labels'] == l][:n_records]
-            plot_input['name'] = l
+            plot_input['x'] = x[positions]
+            plot_input['y'] = y[positions]
+            plot_input['name'] = str(l)
             plot_input['marker'] = {'size': 10,
-                                    'color': system.hex2rgb(self.colors_list[i], 1),
+                                    'color': system.hex2rgb(self.colors_list[i % len(self.colors_list)], 1),
                                     'line': {'width': 1, 'color': 'black'}}
-            traces.append(go.Scatter(dict(cnf.GUI.SCATTER_STYLE, **plot_input)))
+            traces.append(scatter(dict(cnf.GUI.SCATTER_STYLE, **plot_input)))
 
         layout = dict()
         layout['title'] = data['title']
         layout['legend'] = {'orientation': 'h', 'font': {'color': cnf.GUI.COLORMAP['font-main']}}
         layout['xaxis'] = self.set_xaxis(data['columns'][0])
         layout['yaxis'] = self.set_yaxis(df.columns[1])
+        if data.get('x_range') is not None:
+            layout['xaxis']['range'] = data['x_range']
+        if data.get('y_range') is not None:
+            layout['yaxis']['range'] = data['y_range']
 
         return {'data': traces,
                 'layout': go.Layout(dict(cnf.GUI.GRAPH_LAYOUT, **layout))}
 
+    def zoom_scatter(self, figure_id, x_range=None, y_range=None):
+        """Rebuilds a scatter with a new sample of the points within the visible ranges.
+
+        :param figure_id: The id of the scatter (see get_figure)
+        :type figure_id: str
+        :return: A Figure or None if there is no scatter with the id (e.g. the data has changed since)
+        :rtype: go.Figure
+        """
+        zoom_input = self.zoom_inputs.get(figure_id)
+        if zoom_input is None:
+            return None
+        return go.Figure(self.build_scatter(**dict(zoom_input, x_range=x_range, y_range=y_range)))
+
     ####################################################################################################################
     # SPECIFIC CHARTS MANAGER
     ####################################################################################################################
@@ -159,25 +513,69 @@ class Presenter:
     # SPECIFIC CHARTS
     ####################################################################################################################
 
+    @staticmethod
+    def predict_grid(classifier, xx, yy, labels, batch=cnf.GUI.PREDICT_BATCH):
+        """Predicts labels of grid points in batches and maps them to evenly spaced values from 0 to 1.
+
+        :param classifier: A fitted classifier
+        :param xx: X coordinates of the points
+        :type xx: np.ndarray
+        :param yy: Y coordinates of the points
+        :type yy: np.ndarray
+        :param labels: Sorted unique labels
+        :type labels: np.ndarray
+        :return: Values of the points (NaN for labels that are not in labels)
+        :rtype: np.ndarray
+        """
+        points = np.c_[xx.ravel(), yy.ravel()]
+        if not len(points):
+            return np.empty(xx.shape)
+        z = np.concatenate([classifier.predict(points[i:i + batch]) for i in range(0, len(points), batch)])
+        codes = pd.Index(labels).get_indexer(z)
+        values = np.linspace(0, 1, len(labels))[codes]
+        values[codes < 0] = np.nan
+        return values.reshape(xx.shape)
+
     def build_decision_regions(self, **data):
+        """Builds a contour of classifier decision regions.
+
+        The grid has at most GUI.DECISION_REGIONS_PIXELS points per axis, whatever the spread of the data is. Labels
+        are predicted on a coarse grid first (DECISION_REGIONS_REFINE times fewer points per axis) and only the cells
+        of the coarse grid on class boundaries are predicted at the full resolution; the others take the label of the
+        nearest coarse point.
+
+        :return: A dictionary with the contour as data input for Dash Figure
+        :rtype: dict
+        """
         df = data['df_regions']
+        pixels = data.get('pixels', cnf.GUI.DECISION_REGIONS_PIXELS)
+        refine = data.get('refine', cnf.GUI.DECISION_REGIONS_REFINE)
 
         x_min, y_min = 1.2 * list(df.min())[0] - 10, 1.2 * list(df.min())[1] - 10
         x_max, y_max = 1.2 * list(df.max())[0] + 10, 1.2 * list(df.max())[1] + 10
-        x = np.arange(x_min, x_max, 0.1)
-        y = np.arange(y_min, y_max, 0.1)
-        xx, yy = np.meshgrid(x, y)
-        z = data['classifier'].predict(np.c_[xx.ravel(), yy.ravel()])
-        unique_labels = list(set(data['labels']))
-        mapper = dict(zip(unique_labels, list(np.linspace(0, 1, len(unique_labels)))))
-        z = np.array([mapper[el] for el in z])
-        z = z.reshape(xx.shape)
+        labels = np.unique(np.asarray(data['labels']))
+
+        n = max(pixels // refine, 1) + 1
+        z_coarse = self.predict_grid(data['classifier'], *np.meshgrid(np.linspace(x_min, x_max, n),
+                                                                      np.linspace(y_min, y_max, n)), labels)
+        boundary = ((z_coarse[:-1, :-1] != z_coarse[1:, :-1]) | (z_coarse[:-1, :-1] != z_coarse[:-1, 1:]) |
+                    (z_coarse[:-1, :-1] != z_coarse[1:, 1:]))
+
+        size = (n - 1) * refine + 1
+        x = np.linspace(x_min, x_max, size)
+        y = np.linspace(y_min, y_max, size)
+        nearest = np.rint(np.arange(size) / refine).astype(int)
+        cell = np.minimum(np.arange(size) // refine, n - 2)
+        z = z_coarse[np.ix_(nearest, nearest)]
+        mask = boundary[np.ix_(cell, cell)]
+        rows, columns = np.nonzero(mask)
+        z[mask] = self.predict_grid(data['classifier'], x[columns], y[rows], labels)
 
         plot_input = dict()
         plot_input['x'] = x
         plot_input['y'] = y
         plot_input['z'] = z
-        step_size = 1 / (len(unique_labels) - 1)
+        step_size = 1 / max(len(labels) - 1, 1)
         plot_input['contours'] = {'start': 0 - 0.5 * step_size, 'size': step_size, 'end': 1 + 0.5 * step_size}
 
         layout = dict()
@@ -206,16 +604,76 @@ class Presenter:
     def build_feature_label_correlation(self, **data):
         return self.build_scatter(**data)
 
+    def bin_columns(self, df, columns, bins, n_records=None):
+        """Counts values of one column or pairs of values of two columns in a grid of bins.
+
+        Counts are cached per data frame and columns until the data changes (see set_data), so charts of the same
+        columns are not binned again.
+
+        :param df: A data frame
+        :type df: pd.DataFrame
+        :param columns: One or two columns
+        :type columns: tuple
+        :param bins: A number of bins per column
+        :type bins: int
+        :param n_records: A number of the first rows binned (all rows if None)
+        :type n_records: int
+        :return: Counts and centers of the bins of every column
+        :rtype: tuple
+        """
+        key = (id(df), len(df), tuple(columns), bins, n_records)
+        entry = self.bins.get(key)
+        if entry is not None and entry[0] is df:
+            return entry[1]
+
+        values = [np.asarray(df[c], dtype=float)[:n_records] for c in columns]
+        finite = np.all([np.isfinite(v) for v in values], axis=0)
+        values = [v[finite] for v in values]
+        ranges = []
+        for v in values:
+            low, high = (v.min(), v.max()) if len(v) else (0, 1)
+            ranges.append((low, high) if low < high else (low - 0.5, high + 0.5))
+        counts, edges = np.histogramdd(np.column_stack(values), bins=bins, range=ranges)
+        result = (counts, [(e[:-1] + e[1:]) / 2 for e in edges])
+        self.bins[key] = (df, result)
+        return result
+
     def build_2d_density(self, **data):
+        """Builds a 2D density as a heatmap of point counts in GUI.DENSITY_BINS x GUI.DENSITY_BINS bins with marginal
+        histograms, so the size of the chart does not depend on the number of points.
+
+        :return: A dictionary with traces and layout as data input for Dash Figure.
+        :rtype: dict
+        """
         df = data['df']
         n_records = self.set_size(**data)
-
         columns = data['columns']
-        return ff.create_2d_density(df[:n_records][columns[0]], df[:n_records][columns[1]])
+        bins = data.get('bins', cnf.GUI.DENSITY_BINS)
 
-    @staticmethod
-    def build_splom(**data):
-        """Builds a Scatter Plot Matrix.
+        counts, (x, y) = self.bin_columns(df, (columns[0], columns[1]), bins, n_records)
+        color = system.hex2rgb(cnf.GUI.COLORMAP['font-secondary'], 0.8)
+        traces = [go.Heatmap(dict(cnf.GUI.DENSITY_STYLE, x=x, y=y, z=np.where(counts > 0, counts, np.nan).T)),
+                  go.Bar(x=x, y=counts.sum(axis=1), xaxis='x', yaxis='y2', marker={'color': color},
+                         showlegend=False),
+                  go.Bar(x=counts.sum(axis=0), y=y, xaxis='x2', yaxis='y', orientation='h', marker={'color': color},
+                         showlegend=False)]
+
+        layout = dict()
+        layout['title'] = data.get('title', '2D DENSITY: ' + ', '.join(columns[:2]))
+        layout['bargap'] = 0
+        layout['xaxis'] = self.set_xaxis(columns[0])
+        layout['xaxis']['domain'] = [0, 0.85]
+        layout['yaxis'] = self.set_yaxis(columns[1])
+        layout['yaxis']['domain'] = [0, 0.85]
+        layout['xaxis2'] = {'domain': [0.85, 1], 'showgrid': False, 'showticklabels': False}
+        layout['yaxis2'] = {'domain': [0.85, 1], 'showgrid': False, 'showticklabels': False}
+
+        return {'data': traces,
+                'layout': go.Layout(dict(cnf.GUI.GRAPH_LAYOUT, **layout))}
+
+    def build_splom(self, **data):
+        """Builds a Scatter Plot Matrix of binned points: a heatmap of counts of every pair of columns and a histogram
+        of every column on the diagonal, GUI.SPLOM_BINS bins per column.
 
         :param data: A dictionary with DataFrame and columns names that are supposed to be plotted.
         :type data: dict
@@ -224,8 +682,38 @@ class Presenter:
         """
 
         df = data['df']
-        return {'data': [go.Splom(dimensions=[{'label': c, 'values': df[c]} for c in data['columns']])]}
+        n_records = self.set_size(**data)
+        columns = list(data['columns'])
+        bins = data.get('bins', cnf.GUI.SPLOM_BINS)
+        k = len(columns)
+        gap = 0.01
 
+        traces = []
+        layout = dict()
+        for row, c_y in enumerate(columns):
+            for col, c_x in enumerate(columns):
+                n = row * k + col + 1
+                axes = {'xaxis': 'x' + (str(n) if n > 1 else ''), 'yaxis': 'y' + (str(n) if n > 1 else '')}
+                if row == col:
+                    counts, (x,) = self.bin_columns(df, (c_x,), bins, n_records)
+                    traces.append(go.Bar(dict(axes, x=x, y=counts, showlegend=False,
+                                              marker={'color': cnf.GUI.COLORMAP['font-secondary']})))
+                else:
+                    counts, (x, y) = self.bin_columns(df, (c_x, c_y), bins, n_records)
+                    traces.append(go.Heatmap(dict(cnf.GUI.DENSITY_STYLE, x=x, y=y,
+                                                  z=np.where(counts > 0, counts, np.nan).T, **axes)))
+
+                layout['xaxis' + (str(n) if n > 1 else '')] = {
+                    'domain': [col / k + gap, (col + 1) / k - gap], 'anchor': axes['yaxis'],
+                    'title': c_x if row == k - 1 else '', 'showticklabels': row == k - 1}
+                layout['yaxis' + (str(n) if n > 1 else '')] = {
+                    'domain': [1 - (row + 1) / k + gap, 1 - row / k - gap], 'anchor': axes['xaxis'],
+                    'title': c_y if col == 0 else '', 'showticklabels': col == 0}
+
+        layout['title'] = data.get('title', 'SPLOM')
+        layout['bargap'] = 0
+        return {'data': traces,
+                'layout': go.Layout(dict(cnf.GUI.GRAPH_LAYOUT, **layout))}
 
 def main():
     return Presenter()
@@ -0,0 +1,122 @@
+import subprocess
+import threading
+
+import configuration as cnf
+
+
+class ProcessSupervisor:
+    """Owns child processes started by the application (nfcapd, softflowd) and keeps a snapshot of their state.
+
+    Every process is watched by a thread waiting on its handle, so the snapshot (number of running processes per
+    name) is updated when a process starts or exits and reading it costs nothing; processes are never looked up with
+    pgrep.
+
+    The processes are started by jobs in worker processes (see JobManager), so the supervisor of a module object in
+    the GUI process owns no process: its snapshot is the one the job has reported last, copied back with the job
+    progress, and it is reset when the job fails or is cancelled, not by exit events of the processes.
+    """
+
+    def __init__(self):
+        self.processes = {}
+        self.status = {}
+        self.lock = threading.Lock()
+
+    def __getstate__(self):
+        """Keeps only the snapshot, so the owner can be handed over to a worker process (see JobManager)."""
+        return {'status': dict(self.status)}
+
+    def __setstate__(self, state):
+        self.__init__()
+        self.status.update(state['status'])
+
+    def _update(self, name):
+        self.status[name] = len([n for n, _ in self.processes.values() if n == name])
+        return None
+
+    def _remove(self, name, process):
+        with self.lock:
+            if self.processes.pop(process.pid, None) is not None:
+                self._update(name)
+        return None
+
+    def _watch(self, name, process):
+        process.wait()
+        self._remove(name, process)
+        return None
+
+    def start(self, name, command, stdout=subprocess.DEVNULL):
+        """Starts a process and watches it until it exits.
+
+        :param name: A name the process is counted under, e.g. 'nfcapd'
+        :type name: str
+        :param command: The command with its arguments
+        :type command: list
+        :rtype: subprocess.Popen
+        """
+        process = subprocess.Popen(command, stdout=stdout)
+        with self.lock:
+            self.processes[process.pid] = (name, process)
+            self._update(name)
+        threading.Thread(target=self._watch, args=(name, process), daemon=True).start()
+        return process
+
+    def run(self, name, command, timeout=None):
+        """Runs a process and waits for it (see system.execute_system_command_and_wait).
+
+        :return: The standard output of the process
+        :rtype: bytes
+        """
+        process = self.start(name, command, subprocess.PIPE)
+        try:
+            return process.communicate(timeout=timeout)[0]
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.communicate()
+            raise
+        finally:
+            self._remove(name, process)
+
+    def stop(self, name, timeout=cnf.SYSTEM.STOP_TIMEOUT):
+        """Terminates all processes of a name and waits for them to exit; kills the ones that do not exit in time.
+
+        :return: Number of processes stopped
+        :rtype: int
+        """
+        with self.lock:
+            processes = [p for n, p in self.processes.values() if n == name]
+        for p in processes:
+            p.terminate()
+        for p in processes:
+            try:
+                p.wait(timeout)
+            except subprocess.TimeoutExpired:
+                p.kill()
+                p.wait()
+            self._remove(name, p)
+        return len(processes)
+
+    def stop_all(self):
+        """Stops all processes.
+
+        :rtype: None
+        """
+        with self.lock:
+            names = set([n for n, _ in self.processes.values()])
+        for name in names:
+            self.stop(name)
+        return None
+
+    def count(self, name):
+        """Gets the number of running processes of a name from the snapshot.
+
+        :rtype: int
+        """
+        return self.status.get(name, 0)
+
+
+def main():
+    return ProcessSupervisor()
+
+
+if __name__ == '__main__':
+    main()
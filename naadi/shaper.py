@@ -1,4 +1,3 @@
-import re
 import pandas as pd
 import numpy as np
 
@@ -31,20 +30,13 @@ class Shaper:
                                                       self.anomaly.aggregators, self.anomaly.unit,
                                                       self.anomaly.filters, self.anomaly.features,
                                                       self.anomaly.format):
-            data_stream = self.da.get_data_stream(var, agg, unit, **fil)
             column_data = []
             index = []
-            while True:
-                try:
-                    i, data = next(data_stream)
-                    data_partial = [int(x) for x in re.findall('\d+', data)]
-
-                    index.append(i)
-                    column_data.append(next(self.fe.extract_features(fea, data_partial)))
-                except StopIteration:
-                    self.anomaly.data[col] = pd.Series(column_data)
-                    self.anomaly.data[col] = self.anomaly.data[col].map(frm.format)
-                    break
+            for i, batch in self.da.get_data_batches(var, agg, unit, **fil):
+                index.append(i)
+                column_data.append(self.fe.extract_aggregated_features(fea, batch[var[0]].dropna().values)[0])
+            self.anomaly.data[col] = pd.Series(column_data)
+            self.anomaly.data[col] = self.anomaly.data[col].map(frm.format)
 
             if col == self.anomaly.columns[-1]:
                 self.anomaly.data.set_index(pd.DatetimeIndex(index), inplace=True)
@@ -0,0 +1,95 @@
+import json
+import threading
+
+
+SECTION_PREFIX = 'status-'
+
+
+class StatusBoard:
+    """Single status snapshot of all GUI modules.
+
+    Every module registers the sections it shows (e.g. the collector info message or the number of nfcapd instances)
+    with a function that returns the current value of the section. The GUI polls the board once per refresh and gets
+    only the versions of the sections; the version of a section grows whenever its value changes. The versions are
+    sent to the client only if some section has changed since the versions the client already has, together with the
+    list of the changed sections, and only the stores of those sections fetch their values (see get_section_id), so
+    that only their widgets are updated.
+
+    Values of the sections should not change on their own (e.g. the time a job has been running for), otherwise
+    every refresh updates the client; such values are refreshed by the widget showing them.
+    """
+
+    def __init__(self):
+        self.providers = {}
+        self.values = {}
+        self.versions = {}
+        self.lock = threading.Lock()
+
+    def register(self, section, provider):
+        """Registers a section of the snapshot.
+
+        :param section: A unique name of the section
+        :type section: str
+        :param provider: A function without arguments returning a JSON serializable value of the section
+        :type provider: function
+        :rtype: None
+        """
+        self.providers[section] = provider
+        return None
+
+    @staticmethod
+    def get_section_id(section):
+        """Gets the id of the hidden component storing the value of a section on the client.
+
+        :rtype: str
+        """
+        return SECTION_PREFIX + section
+
+    def refresh(self):
+        """Updates values of all sections (as they are after a JSON round trip, so they compare with stored values).
+
+        :return: Versions of all sections
+        :rtype: dict
+        """
+        sections = json.loads(json.dumps({s: p() for s, p in self.providers.items()}))
+        with self.lock:
+            for section, value in sections.items():
+                if section not in self.versions or self.values[section] != value:
+                    self.values[section] = value
+                    self.versions[section] = self.versions.get(section, 0) + 1
+            return dict(self.versions)
+
+    def get_payload(self, previous=None):
+        """Makes a new payload if any section has changed since the previous payload.
+
+        :param previous: The payload the client has, or None if it has none yet
+        :type previous: str
+        :return: The payload with the versions and the changed sections as a JSON string or None if nothing has
+            changed
+        :rtype: str
+        """
+        previous = json.loads(previous)['versions'] if previous else {}
+        versions = self.refresh()
+        changed = sorted([s for s, v in versions.items() if previous.get(s) != v])
+        if not changed:
+            return None
+        return json.dumps({'versions': versions, 'changed': changed})
+
+    def get_section(self, payload, section):
+        """Gets a section if it has changed in a payload.
+
+        :return: Whether the section has changed in the payload and its current value
+        :rtype: tuple
+        """
+        if not payload or section not in json.loads(payload)['changed']:
+            return False, None
+        with self.lock:
+            return True, self.values.get(section)
+
+
+def main():
+    return StatusBoard()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,3 @@
-import glob
 import os
 import subprocess
 import time
@@ -25,8 +24,32 @@ def count_process_instances(process_name):
     return subprocess.Popen(['pgrep', '-c', process_name], stdout=subprocess.PIPE).communicate()[0]
 
 
-def execute_system_command_and_wait(command):
-    return subprocess.Popen(command, stdout=subprocess.PIPE).communicate()[0]
+def execute_system_command_and_wait(command, timeout=None):
+    process = subprocess.Popen(command, stdout=subprocess.PIPE)
+    try:
+        return process.communicate(timeout=timeout)[0]
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.communicate()
+        raise
+
+
+def execute_system_command_and_read_lines(command, num_lines):
+    process = subprocess.Popen(command, stdout=subprocess.PIPE)
+    try:
+        lines = []
+        for line in process.stdout:
+            lines.append(line)
+            if len(lines) >= num_lines:
+                yield b''.join(lines)
+                lines = []
+        if lines:
+            yield b''.join(lines)
+    finally:
+        process.stdout.close()
+        if process.poll() is None:
+            process.kill()
+        process.wait()
 
 
 def execute_system_command_and_continue(command):
@@ -34,9 +57,20 @@ def execute_system_command_and_continue(command):
     return None
 
 
-def get_latest_file(directory):
-    list_of_files = glob.glob(directory + '*')
-    return max(list_of_files, key=os.path.getctime)
+def is_udp_port_bound(port, tables=('/proc/net/udp', '/proc/net/udp6')):
+    """Checks whether a socket is bound to the UDP port; returns None where it cannot be checked (other than Linux)."""
+    bound = None
+    for table in tables:
+        if os.path.isfile(table):
+            with open(table, 'r') as f:
+                ports = [int(line.split()[1].rsplit(':', 1)[1], 16) for line in f.read().splitlines()[1:]]
+            bound = bool(bound) or port in ports
+    return bound
+
+
+def get_directory_files(directory, skip_prefixes=()):
+    return set([os.path.join(directory, f) for f in os.listdir(directory)
+                if os.path.isfile(os.path.join(directory, f)) and not f.startswith(skip_prefixes)])
 
 
 def get_directory_content(directory):
@@ -1,9 +1,15 @@
+import json
+
 import dash
 import dash_core_components as dcc
 import dash_html_components as html
+from dash.dependencies import Input, Output, State
+from dash.exceptions import PreventUpdate
 
 import configuration as cnf
 
+from naadi.job_manager import JobManager, RUNNING
+from naadi.status_board import StatusBoard
 from naadi.web_gui_modules.header import GUIHeader
 from naadi.web_gui_modules.configurator import GUIConfigurator
 from naadi.web_gui_modules.collector import GUICollector
@@ -12,6 +18,53 @@ from naadi.web_gui_modules.data_presenter import GUIDataPresenter
 
 
 APP = dash.Dash(__name__)
+APP.config['suppress_callback_exceptions'] = True
+JOB_MANAGER = JobManager()
+STATUS_BOARD = StatusBoard()
+JOB_TIMERS = []
+
+
+def get_status(section_value):
+    """Gets the value of a status section in a callback taking the store of the section as its input (see
+    StatusBoard.get_section_id); the callback does not update its output until the section has a value."""
+    if not section_value:
+        raise PreventUpdate()
+    return json.loads(section_value)
+
+
+def show_job_message(app, output_id, section, get_message):
+    """Shows the message of a job (with the time it has been running for) in a widget.
+
+    The status section tells only when the job or its progress changes; while the job runs, the elapsed time is
+    refreshed by an interval of the widget, which is disabled otherwise, so the shared status does not change every
+    second.
+
+    :param app: The Dash application
+    :type app: dash.Dash
+    :param output_id: An id of the widget
+    :type output_id: str
+    :param section: A status section whose value starts with the job status (see JobManager.get_status)
+    :type section: str
+    :param get_message: A function without arguments returning the message
+    :type get_message: function
+    :rtype: None
+    """
+    timer_id = 'timer-' + section
+    JOB_TIMERS.append(dcc.Interval(id=timer_id, interval=cnf.GUI.JOB_TIMER_MS, n_intervals=0, disabled=True))
+
+    @app.callback(Output(timer_id, 'disabled'),
+                  [Input(STATUS_BOARD.get_section_id(section), 'children')])
+    def manage_job_timer(section_value):
+        job_status = get_status(section_value)[0]
+        return job_status is None or job_status[1] != RUNNING
+
+    @app.callback(Output(output_id, 'children'),
+                  [Input(STATUS_BOARD.get_section_id(section), 'children'),
+                   Input(timer_id, 'n_intervals')])
+    def update_job_message(*_):
+        return get_message()
+
+    return None
 
 
 class WebGUI:
@@ -28,8 +81,22 @@ class WebGUI:
                         html.Div(id='hd2', style={'display': 'none'}),
                         html.Div(id='hd3', style={'display': 'none'}),
                         html.Div(id='hd4', style={'display': 'none'}),
+                        html.Div(id='hd5', style={'display': 'none'}),
+                        html.Div(id='hd6', style={'display': 'none'}),
+                        html.Div(id='hd7', style={'display': 'none'}),
+                        html.Div(id='hd8', style={'display': 'none'}),
+                        html.Div(id='hd9', style={'display': 'none'}),
+                        html.Div(id='hd10', style={'display': 'none'}),
+                        html.Div(id='hd11', style={'display': 'none'}),
+                        html.Div(id='hd12', style={'display': 'none'}),
+                        html.Div(id='hd13', style={'display': 'none'}),
+                        html.Div(id='status', style={'display': 'none'}),
                         dcc.Interval(id='dt', interval=cnf.GUI.REFRESH_MS, n_intervals=0)]
 
+        self.run_callbacks()
+        self.helpers += [html.Div(id=STATUS_BOARD.get_section_id(s), style={'display': 'none'})
+                         for s in STATUS_BOARD.providers] + JOB_TIMERS
+
         self.app.layout = html.Div(self.helpers + [self.gui_header.layout,
                                                    self.gui_configurator.layout,
                                                    self.gui_collector.layout,
@@ -37,9 +104,41 @@ class WebGUI:
                                                    html.Div([self.gui_presenter.layout])],
                                    className=cnf.GUI.CLASS_GUI)
 
-        self.run_callbacks()
         self.app.run_server(debug=debug)
 
+    def update_status(self):
+        """Polls the status board every dt; the versions of the sections are sent to the client only if any section
+        has changed, then only the stores of the changed sections fetch their values and widgets showing them are
+        updated (see get_status). It is called after all sections have been registered.
+
+        :return: None
+        """
+
+        @self.app.callback(Output('status', 'children'),
+                           [Input('dt', 'n_intervals')],
+                           [State('status', 'children')])
+        def update_status_payload(_, previous):
+            payload = STATUS_BOARD.get_payload(previous)
+            if payload is None:
+                raise PreventUpdate()
+            return payload
+
+        for section in STATUS_BOARD.providers:
+            self.update_section(section)
+
+        return None
+
+    def update_section(self, section):
+        @self.app.callback(Output(STATUS_BOARD.get_section_id(section), 'children'),
+                           [Input('status', 'children')])
+        def update_section_value(payload):
+            changed, value = STATUS_BOARD.get_section(payload, section)
+            if not changed:
+                raise PreventUpdate()
+            return json.dumps(value)
+
+        return None
+
     def run_callbacks(self):
         self.gui_configurator.reveal_further_modules()
         self.gui_configurator.select_dataset()
@@ -47,16 +146,23 @@ class WebGUI:
         self.gui_configurator.update_messages()
 
         self.gui_collector.update_pcap_button()
+        self.gui_collector.update_nfdump_button()
         self.gui_collector.manage_nfcapd_and_softflowd_processes()
         self.gui_collector.extract_data_from_pcap()
+        self.gui_collector.manage_flow_collector()
         self.gui_collector.update_messages()
 
         self.gui_data_acquisitor.select_features()
         self.gui_data_acquisitor.manage_time_window()
         self.gui_data_acquisitor.execute_query()
+        self.gui_data_acquisitor.detect_anomaly()
 
         self.gui_presenter.update_lists()
         self.gui_presenter.display()
+        self.gui_presenter.page_table()
+        self.gui_presenter.zoom_graph()
+
+        self.update_status()
 
 
 def main(collector, data_acquisitor, analyzer, presenter, debug=True):
@@ -33,12 +33,17 @@ class GUICollector:
         self.dropdown_pcap_packed = html.Div(self.dropdown_pcap,
                                              className=cnf.GUI.CLASS_DROPDOWN)
         self.button_pcap = html.Button(id=uuid4().hex, className=cnf.GUI.CLASS_BUTTON)
+        self.button_flow_store = html.Button(id=uuid4().hex, className=cnf.GUI.CLASS_BUTTON)
         self.time_elapsed = html.Div(id=uuid4().hex, className=cnf.GUI.CLASS_SMALL_TEXT)
+        self.button_cancel = html.Button(id=uuid4().hex, children='Cancel', className=cnf.GUI.CLASS_BUTTON)
+        self.job_name = 'NetFlow extraction'
         self.section_netflow_extractor = html.Div(
             [self.t1,
-             html.Div([self.dropdown_pcap_packed, self.button_pcap],
+             html.Div([self.dropdown_pcap_packed, self.button_pcap, self.button_flow_store],
+                      style=dict(cnf.GUI.STYLE_GRID, **{'grid-template-columns': '40% 30% 30%'})),
+             html.Div([self.time_elapsed, self.button_cancel],
                       style=dict(cnf.GUI.STYLE_GRID, **{'grid-template-columns': '40% 60%'})),
-             self.time_elapsed, self.pause])
+             self.pause])
 
         # Processes manager
         self.t2 = html.Div(id=uuid4().hex, className=cnf.GUI.CLASS_TEXT)
@@ -57,15 +62,34 @@ class GUICollector:
 
         self.t4 = html.Div('... or select nfdump binary straight away.', className=cnf.GUI.CLASS_TEXT)
         self.dropdown_nfdump = dcc.Dropdown(id=uuid4().hex,
-                                            options=[{'label': nfdump, 'value': nfdump} for nfdump in
-                                                     system.get_directory_content(
-                                                         cnf.GENERAL.PATH_NFDUMP_FILES)],
+                                            options=[{'label': nfdump, 'value': cnf.GENERAL.PATH_NFDUMP_FILES + nfdump}
+                                                     for nfdump in system.get_directory_content(
+                                                         cnf.GENERAL.PATH_NFDUMP_FILES)] +
+                                                    [{'label': 'Flow store', 'value': cnf.GENERAL.PATH_FLOW_FILES},
+                                                     {'label': 'Flow collector', 'value': cnf.FLOW_COLLECTOR.DIR}],
                                             placeholder='No file was chosen...')
         self.dropdown_nfdump_packed = html.Div(self.dropdown_nfdump,
                                                className=cnf.GUI.CLASS_DROPDOWN)
         self.button_nfdump = html.Button(id=uuid4().hex, className=cnf.GUI.CLASS_BUTTON)
+        self.section_source = html.Div(
+            [self.t4,
+             html.Div([self.dropdown_nfdump_packed, self.button_nfdump],
+                      style=dict(cnf.GUI.STYLE_GRID, **{'grid-template-columns': '40% 60%'})),
+             self.pause])
+
+        # Built-in flow collector
+        self.t5 = html.Div(id=uuid4().hex, className=cnf.GUI.CLASS_TEXT)
+        self.button_start_flow_collector = html.Button(id=uuid4().hex, children='Start flow collector',
+                                                       className=cnf.GUI.CLASS_BUTTON)
+        self.button_stop_flow_collector = html.Button(id=uuid4().hex, children='Stop flow collector',
+                                                      className=cnf.GUI.CLASS_BUTTON)
+        self.section_flow_collector = html.Div(
+            [html.Div([self.t5, html.Div([self.button_start_flow_collector, self.button_stop_flow_collector])],
+                      style=dict(cnf.GUI.STYLE_GRID, **{'grid-template-columns': '40% 60%'})),
+             self.pause])
 
-        self.layout = html.Div([self.section_header, self.section_netflow_extractor, self.section_processes],
+        self.layout = html.Div([self.section_header, self.section_netflow_extractor, self.section_source,
+                                self.section_flow_collector, self.section_processes],
                                id='collector',
                                className=cnf.GUI.CLASS_MODULE,
                                style={'hidden': True})
@@ -94,6 +118,19 @@ class GUICollector:
         def make_pcap_button_enabled(filename):
             return False if filename else True
 
+        @self.app.callback(Output(self.button_flow_store.id, 'children'),
+                           [Input(self.dropdown_pcap.id, 'value')])
+        def change_flow_store_button_label(filename):
+            if filename:
+                return 'Build flow store from ' + filename
+            else:
+                return 'No .pcap file was selected.'
+
+        @self.app.callback(Output(self.button_flow_store.id, 'disabled'),
+                           [Input(self.dropdown_pcap.id, 'value')])
+        def make_flow_store_button_enabled(filename):
+            return False if filename else True
+
         return None
 
     def update_nfdump_button(self):
@@ -102,16 +139,18 @@ class GUICollector:
         1. Change the button's label according to the selection.
         2. Make the button enabled according to the selection.
 
+        Either nfdump binaries or the flow store built from .pcap files can be selected (see Data Acquisitor).
+
         :return: None
         """
 
         @self.app.callback(Output(self.button_nfdump.id, 'children'),
                            [Input(self.dropdown_nfdump.id, 'value')])
-        def change_nfdump_button_label(filename):
-            if filename:
-                self.collector.path_nfdump_file = cnf.GENERAL.PATH_NFDUMP_FILES + str(filename)
-                self.data_acquisitor.nfdump_files = cnf.GENERAL.PATH_NFDUMP_FILES + str(filename)
-                return 'Extract features from ' + filename
+        def change_nfdump_button_label(path):
+            if path:
+                self.collector.path_nfdump_file = str(path)
+                self.data_acquisitor.nfdump_files = str(path)
+                return 'Extract features from ' + path
             else:
                 return 'No nfdump binary was selected.'
 
@@ -125,34 +164,51 @@ class GUICollector:
     def update_messages(self):
         """Prints any messages from NetFlow Collector module.
 
-        1. Update the info message container periodically
+        1. Update the info message container when the message changes (see web_gui.STATUS_BOARD)
 
         :return: None
         """
 
+        web_gui.STATUS_BOARD.register('collector_info', lambda: self.collector.info_message)
+
         @self.app.callback(Output(self.info.id, 'children'),
-                           [Input('dt', 'n_intervals')])
-        def update_collector_info(_):
-            return self.collector.info_message
+                           [Input(web_gui.STATUS_BOARD.get_section_id('collector_info'), 'children')])
+        def update_collector_info(collector_info):
+            return web_gui.get_status(collector_info)
 
         return None
 
     def extract_data_from_pcap(self):
         """Extracts data from the selected .pcap file.
 
-        1. Start processing the .pcap file on the button click.
+        1. Start processing the .pcap file as a background job on the button click: with nfcapd and softflowd or,
+           with the flow store button, with the in-process flow meter into the flow store.
         2. Clear selection after processing has started.
-        3. Print processing time (refreshed every dt). TODO: repair
+        3. Print the job state and processing time (when the state changes and every second while the job runs).
+        4. Cancel the job on the cancel button click.
 
         :return: None
         """
 
         @self.app.callback(Output('hd2', 'children'),
                            [Input(self.button_pcap.id, 'n_clicks')])
-        def extract_netflow_data(_):
-            if os.path.isfile(self.collector.path_pcap_files) or os.path.isdir(self.collector.path_pcap_files):
-                self.collector._time_elapsed = system.time.monotonic()
-                self.collector.convert_pcap_to_nfdump()
+        def extract_netflow_data(n_clicks):
+            if n_clicks and (os.path.isfile(self.collector.path_pcap_files) or
+                             os.path.isdir(self.collector.path_pcap_files)):
+                web_gui.JOB_MANAGER.submit(self.job_name, self.collector, 'convert_pcap_to_nfdump',
+                                           progress=('info_message', 'warning_message', 'error_message',
+                                                     'pcaps_processed', 'pcaps_num', 'supervisor'))
+            return None
+
+        @self.app.callback(Output('hd11', 'children'),
+                           [Input(self.button_flow_store.id, 'n_clicks')])
+        def build_flow_store(n_clicks):
+            if n_clicks and (os.path.isfile(self.collector.path_pcap_files) or
+                             os.path.isdir(self.collector.path_pcap_files)):
+                web_gui.JOB_MANAGER.submit(self.job_name, self.collector, 'convert_pcap_to_flow_store',
+                                           progress=('info_message', 'warning_message', 'error_message',
+                                                     'pcaps_processed', 'pcaps_num', 'shards_processed',
+                                                     'shards_num'))
             return None
 
         @self.app.callback(Output(self.dropdown_pcap.id, 'disabled'),
@@ -161,64 +217,139 @@ class GUICollector:
         def manage_button_state(_, button_disabled):
             return button_disabled
 
-        @self.app.callback(Output(self.time_elapsed.id, 'children'),
-                           [Input('dt', 'n_intervals')])
-        def update_time_elapsed(_):
-            if self.collector.time_elapsed:
-                te = system.measure_time_elapsed(self.collector.time_elapsed)
-            else:
-                te = [0, 0]
-            return 'Time elapsed: ' + str(te[0]) + ' minutes and ' + str(te[1]) + ' seconds'
+        web_gui.STATUS_BOARD.register('collector_job', lambda: [web_gui.JOB_MANAGER.get_status(self.job_name)])
+        web_gui.show_job_message(self.app, self.time_elapsed.id, 'collector_job',
+                                 lambda: web_gui.JOB_MANAGER.get_message(self.job_name,
+                                                                         'Time elapsed: 0 minutes and 0 seconds'))
+
+        @self.app.callback(Output('hd5', 'children'),
+                           [Input(self.button_cancel.id, 'n_clicks')])
+        def cancel_netflow_extraction(n_clicks):
+            job = web_gui.JOB_MANAGER.get_latest(self.job_name)
+            if n_clicks and job is not None:
+                web_gui.JOB_MANAGER.cancel(job.id)
+            return None
 
         return None
 
     def manage_nfcapd_and_softflowd_processes(self):
         """Managing nfcapd processes.
 
-        1. Print number of active nfcapd processes (refreshed every dt).
+        1. Print number of active nfcapd processes (when it changes).
         2. Make the 'kill nfcapd button' enabled if there are any processes running.
         3. Kill all nfcapd processes on click.
-        4. Print number of active softflowd processes (refreshed every dt).
+        4. Print number of active softflowd processes (when it changes).
         5. Make the 'kill softflowd button' enabled if there are any processes running.
         6. Kill all softflowd processes on click.
 
+        The processes are started by the conversion job in its worker process, so numbers of processes are taken from
+        the snapshot of the process supervisor the job reports with its progress (they are reset when the job fails or
+        is cancelled, see JobManager), not from exit events of the processes. Killing cancels the conversion job,
+        which kills its processes with it; if it is not running (e.g. the processes were started outside the
+        application), all processes of the name are killed with pkill.
+
         :return: None
         """
 
+        web_gui.STATUS_BOARD.register('nfcapd', lambda: self.collector.supervisor.count('nfcapd'))
+
         @self.app.callback(Output(self.t2.id, 'children'),
-                           [Input('dt', 'n_intervals')])
-        def count_nfcapd_instances(_):
-            instances = system.count_process_instances('nfcapd').decode('utf-8')
-            return 'Active nfcapd instances: ' + instances
+                           [Input(web_gui.STATUS_BOARD.get_section_id('nfcapd'), 'children')])
+        def count_nfcapd_instances(nfcapd):
+            return 'Active nfcapd instances: ' + str(web_gui.get_status(nfcapd))
 
         @self.app.callback(Output(self.button_kill_nfcapd.id, 'disabled'),
                            [Input(self.t2.id, 'children')])
         def manage_nfcapd_button_state(instances_string):
-            instances = int(instances_string.split(': ')[1][0])
+            if not instances_string:
+                return True
+            instances = int(instances_string.split(': ')[1])
             return False if instances else True
 
         @self.app.callback(Output('hd_nfcapd', 'children'),
                            [Input(self.button_kill_nfcapd.id, 'n_clicks')])
-        def kill_nfcapd(_):
-            system.execute_system_command_and_wait(cnf.SYSTEM.KILL_NFCAPD_CMD)
+        def kill_nfcapd(n_clicks):
+            if n_clicks:
+                self.kill_processes(cnf.SYSTEM.KILL_NFCAPD_CMD)
             return None
 
+        web_gui.STATUS_BOARD.register('softflowd', lambda: self.collector.supervisor.count('softflowd'))
+
         @self.app.callback(Output(self.t3.id, 'children'),
-                           [Input('dt', 'n_intervals')])
-        def count_softflowd_instances(_):
-            instances = system.count_process_instances('softflowd').decode('utf-8')
-            return 'Active softflowd instances: ' + instances
+                           [Input(web_gui.STATUS_BOARD.get_section_id('softflowd'), 'children')])
+        def count_softflowd_instances(softflowd):
+            return 'Active softflowd instances: ' + str(web_gui.get_status(softflowd))
 
         @self.app.callback(Output(self.button_kill_softflowd.id, 'disabled'),
                            [Input(self.t3.id, 'children')])
         def manage_softflowd_button_state(instances_string):
-            instances = int(instances_string.split(': ')[1][0])
+            if not instances_string:
+                return True
+            instances = int(instances_string.split(': ')[1])
             return False if instances else True
 
         @self.app.callback(Output('hd_softflowd', 'children'),
                            [Input(self.button_kill_softflowd.id, 'n_clicks')])
-        def kill_softflowd(_):
-            system.execute_system_command_and_wait(cnf.SYSTEM.KILL_SOFTFLOWD_CMD)
+        def kill_softflowd(n_clicks):
+            if n_clicks:
+                self.kill_processes(cnf.SYSTEM.KILL_SOFTFLOWD_CMD)
             return None
 
         return None
+
+    def kill_processes(self, kill_command):
+        """Cancels the running conversion to nfdump binaries (with nfcapd and softflowd it has started) or kills the
+        processes with the command if there is no such conversion.
+
+        :param kill_command: A command killing the processes, e.g. SYSTEM.KILL_NFCAPD_CMD
+        :type kill_command: list
+        :rtype: None
+        """
+        job = web_gui.JOB_MANAGER.get_latest(self.job_name)
+        if job is not None and job.is_active() and job.method == 'convert_pcap_to_nfdump':
+            web_gui.JOB_MANAGER.cancel(job.id)
+        else:
+            system.execute_system_command_and_wait(kill_command)
+        return None
+
+    def manage_flow_collector(self):
+        """Managing the built-in flow collector (in place of nfcapd).
+
+        1. Start the flow collector in the application on the start button click.
+        2. Stop it (and write out its current file) on the stop button click.
+        3. Print its counters (when they change).
+
+        Flows it collects are read by selecting the flow collector as nfdump source.
+
+        :return: None
+        """
+
+        @self.app.callback(Output('hd12', 'children'),
+                           [Input(self.button_start_flow_collector.id, 'n_clicks')])
+        def start_flow_collector(n_clicks):
+            if n_clicks:
+                self.collector.start_flow_collector()
+            return None
+
+        @self.app.callback(Output('hd13', 'children'),
+                           [Input(self.button_stop_flow_collector.id, 'n_clicks')])
+        def stop_flow_collector(n_clicks):
+            if n_clicks:
+                self.collector.stop_flow_collector()
+            return None
+
+        def get_flow_collector_status():
+            flow_collector = self.collector.flow_collector
+            if flow_collector is None or not flow_collector.is_running():
+                return 'Flow collector is not running.'
+            return flow_collector.info_message + ' ' + \
+                ', '.join([k.capitalize() + ': ' + str(v) for k, v in flow_collector.get_stats().items()]) + '.'
+
+        web_gui.STATUS_BOARD.register('flow_collector', get_flow_collector_status)
+
+        @self.app.callback(Output(self.t5.id, 'children'),
+                           [Input(web_gui.STATUS_BOARD.get_section_id('flow_collector'), 'children')])
+        def update_flow_collector_status(flow_collector):
+            return web_gui.get_status(flow_collector)
+
+        return None
@@ -18,6 +18,8 @@ class GUIConfigurator:
 
         self.t1 = html.Div('Here you can select a dataset and run predefined analysis', className=cnf.GUI.CLASS_TEXT)
         self.button_run_analysis = html.Button(id=uuid4().hex, children='Run analysis!', className=cnf.GUI.CLASS_BUTTON)
+        self.button_cancel = html.Button(id=uuid4().hex, children='Cancel', className=cnf.GUI.CLASS_BUTTON)
+        self.job_name = 'Analysis'
         self.dropdown_dataset = dcc.Dropdown(id=uuid4().hex,
                                              options=[{'label': v, 'value': k}
                                                       for k, v in cnf.GENERAL.DATASETS.items()],
@@ -25,7 +27,8 @@ class GUIConfigurator:
         self.dropdown_dataset_packed = html.Div(self.dropdown_dataset,
                                                 className=cnf.GUI.CLASS_DROPDOWN)
         self.section_dataset = html.Div([self.dropdown_dataset_packed,
-                                         self.button_run_analysis],
+                                         self.button_run_analysis,
+                                         self.button_cancel],
                                         className=cnf.GUI.CLASS_GRID_20)
 
         self.layout = html.Div([self.title,
@@ -78,16 +81,25 @@ class GUIConfigurator:
     def run_analysis(self):
         """Starts analysis.
 
-        1. Run analysis in Analyzer module. No effect on GUI.
+        1. Run analysis in Analyzer module as a background job. No effect on GUI.
+        2. Cancel the job on the cancel button click.
 
         :return: None
         """
 
         @self.app.callback(Output('hd4', 'children'),
                            [Input(self.button_run_analysis.id, 'n_clicks')])
-        def analyze(_):
-            if self.analyzer.dataset_name:
-                self.analyzer.run_analysis()
+        def analyze(n_clicks):
+            if n_clicks and self.analyzer.dataset_name:
+                web_gui.JOB_MANAGER.submit(self.job_name, self.analyzer, 'run_analysis', progress=('info',))
+            return None
+
+        @self.app.callback(Output('hd8', 'children'),
+                           [Input(self.button_cancel.id, 'n_clicks')])
+        def cancel_analysis(n_clicks):
+            job = web_gui.JOB_MANAGER.get_latest(self.job_name)
+            if n_clicks and job is not None:
+                web_gui.JOB_MANAGER.cancel(job.id)
             return None
 
         return None
@@ -95,14 +107,14 @@ class GUIConfigurator:
     def update_messages(self):
         """Prints any messages from Analyzer module.
 
-        1. Update the info message container periodically.
+        1. Update the info message container when it changes (with the state of the analysis job, if there is one).
 
         :return: None
         """
 
-        @self.app.callback(Output(self.info.id, 'children'),
-                           [Input('dt', 'n_intervals')])
-        def update_info(_):
-            return str(self.analyzer.info)
+        web_gui.STATUS_BOARD.register('analyzer_info', lambda: [web_gui.JOB_MANAGER.get_status(self.job_name),
+                                                                str(self.analyzer.info)])
+        web_gui.show_job_message(self.app, self.info.id, 'analyzer_info', lambda: web_gui.JOB_MANAGER.get_message(
+            self.job_name, str(self.analyzer.info)))
 
         return None
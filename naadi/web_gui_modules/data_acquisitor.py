@@ -113,10 +113,12 @@ class GUIDataAcquisitor:
                                        value='')
         self.button_build_query = html.Button(id=uuid4().hex, children='Generate query', className=cnf.GUI.CLASS_BUTTON)
         self.button_get_data = html.Button(id=uuid4().hex, children='Get data', className=cnf.GUI.CLASS_BUTTON)
+        self.button_cancel = html.Button(id=uuid4().hex, children='Cancel', className=cnf.GUI.CLASS_BUTTON)
+        self.job_name = 'Data acquisition'
         self.da_timer = html.Div(id=uuid4().hex, children='', className=cnf.GUI.CLASS_TEXT)
-        self.section_query = html.Div([self.button_build_query, self.button_get_data],
+        self.section_query = html.Div([self.button_build_query, self.button_get_data, self.button_cancel],
                                       style={'display': 'grid',
-                                             'grid-template-columns': '50% 50%',
+                                             'grid-template-columns': '33% 33% 33%',
                                              'align-items': 'top',
                                              'justify-items': 'center'})
 
@@ -163,7 +165,13 @@ class GUIDataAcquisitor:
                                              placeholder='No anomaly type was chosen...')
         self.dropdown_anomaly_packed = html.Div(self.dropdown_anomaly,
                                                 className=cnf.GUI.CLASS_DROPDOWN)
-        self.section_anomaly = html.Div([self.dropdown_anomaly_packed, self.button_get_data],
+        self.button_detect = html.Button(id=uuid4().hex, children='Follow and detect',
+                                         className=cnf.GUI.CLASS_BUTTON)
+        self.button_stop_detection = html.Button(id=uuid4().hex, children='Stop detection',
+                                                 className=cnf.GUI.CLASS_BUTTON)
+        self.detection_job_name = 'Anomaly detection'
+        self.detection_info = html.Div(id=uuid4().hex, children='', className=cnf.GUI.CLASS_SMALL_TEXT)
+        self.section_anomaly = html.Div([self.dropdown_anomaly_packed, self.button_detect, self.button_stop_detection],
                                         className=cnf.GUI.CLASS_GRID_20)
 
         self.layout = html.Div([self.title,
@@ -176,6 +184,9 @@ class GUIDataAcquisitor:
                                 self.da_timer,
                                 self.pause,
                                 self.section_time_window,
+                                self.pause,
+                                self.section_anomaly,
+                                self.detection_info,
                                 self.pause],
                                id='data-acquisitor',
                                className=cnf.GUI.CLASS_MODULE,
@@ -235,12 +246,69 @@ class GUIDataAcquisitor:
             self.data_acquisitor.csv_filename = filename
             return 'Execute query and save data to ' + self.data_acquisitor.csv_path + filename + '.csv'
 
-        @self.app.callback(Output(self.da_timer.id, 'children'),
+        @self.app.callback(Output('hd6', 'children'),
                            [Input(self.button_get_data.id, 'n_clicks')])
-        def get_data(_):
-            if self.data_acquisitor.csv_filename:
-                self.data_acquisitor.get_all()
-                return str(self.data_acquisitor.time_slices_processed) + ' from ' + \
-                       str(self.data_acquisitor.num_of_time_slices) + ' time chunks processed.'
+        def get_data(n_clicks):
+            if n_clicks and self.data_acquisitor.csv_filename:
+                web_gui.JOB_MANAGER.submit(self.job_name, self.data_acquisitor, 'get_all',
+                                           progress=('info_message', 'warning_message', 'error_message',
+                                                     'time_slices_processed', 'num_of_time_slices'))
+            return None
+
+        def get_data_progress():
+            job = web_gui.JOB_MANAGER.get_latest(self.job_name)
+            if job is None:
+                return ''
+            return job.get_message() + ' ' + str(self.data_acquisitor.time_slices_processed) + ' from ' + \
+                str(self.data_acquisitor.num_of_time_slices) + ' time chunks processed.'
+
+        web_gui.STATUS_BOARD.register('data_acquisitor_job', lambda: [
+            web_gui.JOB_MANAGER.get_status(self.job_name), self.data_acquisitor.time_slices_processed,
+            self.data_acquisitor.num_of_time_slices])
+        web_gui.show_job_message(self.app, self.da_timer.id, 'data_acquisitor_job', get_data_progress)
+
+        @self.app.callback(Output('hd7', 'children'),
+                           [Input(self.button_cancel.id, 'n_clicks')])
+        def cancel_data_acquisition(n_clicks):
+            job = web_gui.JOB_MANAGER.get_latest(self.job_name)
+            if n_clicks and job is not None:
+                web_gui.JOB_MANAGER.cancel(job.id)
+            return None
+
+    def detect_anomaly(self):
+        """Following nfcapd files and computing features of the selected anomaly as a job, until it is stopped."""
+        @self.app.callback(Output('hd9', 'children'),
+                           [Input(self.button_detect.id, 'n_clicks')],
+                           [State(self.dropdown_anomaly.id, 'value')])
+        def start_detection(n_clicks, anomaly_name):
+            if n_clicks and anomaly_name:
+                web_gui.JOB_MANAGER.submit(self.detection_job_name, self.data_acquisitor, 'detect', anomaly_name,
+                                           progress=('info_message', 'error_message', 'detections'))
+            return None
+
+        @self.app.callback(Output('hd10', 'children'),
+                           [Input(self.button_stop_detection.id, 'n_clicks')])
+        def stop_detection(n_clicks):
+            job = web_gui.JOB_MANAGER.get_latest(self.detection_job_name)
+            if n_clicks and job is not None:
+                web_gui.JOB_MANAGER.cancel(job.id)
+            return None
+
+        def get_latest_detection():
+            detections = self.data_acquisitor.detections
+            if detections.empty:
+                return ''
+            return ' Latest time slice: ' + str(detections.index[-1]) + ', ' + \
+                ', '.join([c + ' ' + '{:,.2f}'.format(v) for c, v in detections.iloc[-1].items()]) + '.'
 
-            return ''
+        def get_detection_progress():
+            job = web_gui.JOB_MANAGER.get_latest(self.detection_job_name)
+            if job is None:
+                return ''
+            return job.get_message() + get_latest_detection()
+
+        web_gui.STATUS_BOARD.register('detector_job', lambda: [
+            web_gui.JOB_MANAGER.get_status(self.detection_job_name), get_latest_detection()])
+        web_gui.show_job_message(self.app, self.detection_info.id, 'detector_job', get_detection_progress)
+
+        return None
@@ -5,9 +5,7 @@ from dash.exceptions import PreventUpdate
 import dash_core_components as dcc
 import dash_html_components as html
 import dash_table
-from dash.dependencies import Input, Output, State, Event
-
-import plotly.graph_objs as go
+from dash.dependencies import Input, Output, State
 
 import configuration as cnf
 from naadi import web_gui
@@ -55,6 +53,9 @@ class GUIDataPresenter:
         self.button_draw = html.Button(id=uuid4().hex, children='Generate chart', className=cnf.GUI.CLASS_BUTTON)
 
         self.graphs_container = html.Div(id=uuid4().hex)
+        self.table_id = uuid4().hex
+        self.graph_id = uuid4().hex
+        self.figure_id = uuid4().hex
 
         self.layout = html.Div([self.title,
                                 self.info,
@@ -68,18 +69,74 @@ class GUIDataPresenter:
                                className='naadi-module')
 
     def update_lists(self):
+        web_gui.STATUS_BOARD.register('charts', lambda: [ch['name'] for ch in self.presenter.charts.values()])
+        web_gui.STATUS_BOARD.register('features', lambda: list(self.presenter.data_raw['features_names']))
+
         @self.app.callback(Output(self.chart_selector.id, 'options'),
-                           events=[Event('dt', 'interval')])
-        def update_graphs_list():
+                           [Input(web_gui.STATUS_BOARD.get_section_id('charts'), 'children')])
+        def update_graphs_list(charts):
             return [{'label': ch, 'value': ch} for ch in cnf.GUI.CHARTS_GENERAL] + \
-                   [{'label': ch['name'], 'value': ch['name']} for ch in self.presenter.charts.values()]
+                   [{'label': name, 'value': name} for name in web_gui.get_status(charts)]
 
         @self.app.callback(Output(self.features_selector.id, 'options'),
-                           events=[Event('dt', 'interval')])
-        def update_features_list():
-            return [{'label': name, 'value': name} for name in self.presenter.data_raw['features_names']] + \
+                           [Input(web_gui.STATUS_BOARD.get_section_id('features'), 'children')])
+        def update_features_list(features):
+            return [{'label': name, 'value': name} for name in web_gui.get_status(features)] + \
                    [{'label': 'LABELS', 'value': 'LABELS'}, {'label': 'ALL', 'value': 'ALL'}]
 
+    def page_table(self):
+        """Serves the table page by page.
+
+        1. Send only the rows of the current page, after filtering and sorting the table on the server (the table is
+           looked up by the figure id kept with it).
+
+        :return: None
+        """
+
+        @self.app.callback(Output(self.table_id, 'data'),
+                           [Input(self.table_id, 'pagination_settings'),
+                            Input(self.table_id, 'sorting_settings'),
+                            Input(self.table_id, 'filtering_settings')],
+                           [State(self.figure_id, 'children')])
+        def update_table_page(pagination_settings, sorting_settings, filtering_settings, figure_id):
+            return self.presenter.get_table_page(figure_id,
+                                                 pagination_settings['current_page'],
+                                                 pagination_settings['page_size'],
+                                                 sorting_settings,
+                                                 filtering_settings)
+
+        return None
+
+    def zoom_graph(self):
+        """Loads more detail of a scatter on zoom.
+
+        1. Rebuild the scatter from the points within the zoomed ranges (or all points when the zoom is reset); the
+           scatter is looked up by the figure id kept with it.
+
+        :return: None
+        """
+
+        @self.app.callback(Output(self.graph_id, 'figure'),
+                           [Input(self.graph_id, 'relayoutData')],
+                           [State(self.figure_id, 'children')])
+        def zoom_scatter(relayout_data, figure_id):
+            relayout_data = relayout_data or {}
+            ranges = {}
+            for axis in ('xaxis', 'yaxis'):
+                if axis + '.range[0]' in relayout_data:
+                    ranges[axis] = [relayout_data[axis + '.range[0]'], relayout_data[axis + '.range[1]']]
+                elif relayout_data.get(axis + '.autorange'):
+                    ranges[axis] = None
+            if not ranges:
+                raise PreventUpdate()
+
+            figure = self.presenter.zoom_scatter(figure_id, ranges.get('xaxis'), ranges.get('yaxis'))
+            if figure is None:
+                raise PreventUpdate()
+            return figure
+
+        return None
+
     def display(self):
         """Presents gathered data in table and on plots.
 
@@ -98,15 +155,24 @@ class GUIDataPresenter:
             if 'ALL' in features:
                 features = self.presenter.data['features_names']
             if self.presenter.data[dataset] is not None:
-                if chart_name in cnf.GUI.CHARTS_GENERAL:
-                    chart = self.presenter.build_chart_general(chart_name, self.presenter.data[dataset], features)
-                else:
-                    chart = self.presenter.build_chart_specific(chart_name)
+                figure_id, chart = self.presenter.get_figure(chart_name, dataset, features)
+                figure_store = html.Div(figure_id, id=self.figure_id, style={'display': 'none'})
 
                 if chart_name == 'TABLE':
-                    return html.Div([dash_table.DataTable(id=uuid4().hex,
+                    return html.Div([figure_store,
+                                     dash_table.DataTable(id=self.table_id,
                                                           columns=chart['columns'],
                                                           data=chart['data'],
+                                                          pagination_mode='be',
+                                                          pagination_settings={
+                                                              'current_page': 0,
+                                                              'page_size': cnf.GUI.TABLE_PAGE_SIZE,
+                                                              'page_count': chart['page_count']},
+                                                          sorting='be',
+                                                          sorting_type='multi',
+                                                          sorting_settings=[],
+                                                          filtering='be',
+                                                          filtering_settings='',
                                                           n_fixed_rows=1,
                                                           style_header={'fontWeight': 'bold',
                                                                         'fontSize': '10px',
@@ -124,7 +190,7 @@ class GUIDataPresenter:
                                     className=cnf.GUI.CLASS_DATATABLE)
 
                 else:
-                    return dcc.Graph(id=uuid4().hex, figure=go.Figure(chart))
+                    return html.Div([figure_store, dcc.Graph(id=self.graph_id, figure=chart)])
 
             else:
                 return None
@@ -0,0 +1,126 @@
+import numpy as np
+
+from naadi import flow_records
+
+
+AGGREGATORS_FIELDS = {'PROTOCOL': ['proto'],
+                      'SOURCE ADDRESS': ['src_addr_hi', 'src_addr_lo', 'ipv6'],
+                      'DESTINATION ADDRESS': ['dst_addr_hi', 'dst_addr_lo', 'ipv6'],
+                      'SOURCE PORT': ['src_port'],
+                      'DESTINATION PORT': ['dst_port']}
+VOLUMES = ['PACKETS', 'BYTES', 'FLOWS']
+
+
+class SlidingWindowAggregator:
+    """Aggregates volumes (packets, bytes, flows) of flow records per aggregator key over overlapping time windows.
+
+    Windows start every dt seconds and last window seconds. A flow belongs to a window if it both starts and ends
+    within it (the way nfdump -t selects flows), hence every flow belongs to a contiguous run of windows. Its volumes
+    are added to the running totals of its key when the first window of the run is produced and subtracted after the
+    last one, so producing a window costs only the flows that enter and leave it, not the whole window.
+    """
+
+    def __init__(self, aggregators, start, window, dt):
+        """
+        :param aggregators: NetFlow records aggregators in human readable format
+        :type aggregators: list
+        :param start: A start of the first window as a UNIX timestamp
+        :type start: int
+        :param window: A length of a window in seconds
+        :type window: int
+        :param dt: A shift between consecutive windows in seconds
+        :type dt: int
+        """
+        self.aggregators = aggregators
+        self.start = start
+        self.window = window
+        self.dt = dt
+
+        self.key_records = None
+
+    @staticmethod
+    def is_supported(variables, aggregators, unit):
+        """Checks if an aggregated query can be computed from flow records: all aggregators must be record fields and
+        all variables must be either aggregators or volumes.
+
+        :rtype: bool
+        """
+        return bool(aggregators) and bool(variables) and all([a in AGGREGATORS_FIELDS for a in aggregators]) and \
+            all([v in aggregators or v in VOLUMES for v in variables]) and (not unit or unit in VOLUMES)
+
+    def _get_key_ids(self, flows):
+        """Numbers distinct aggregator keys of the flows; keeps the first flow of every key as its representative.
+
+        :param flows: Flow records
+        :type flows: np.ndarray
+        :return: A key number of every flow
+        :rtype: np.ndarray
+        """
+        fields = []
+        for a in self.aggregators:
+            fields += [f for f in AGGREGATORS_FIELDS[a] if f not in fields]
+        keys = np.stack([flows[f].astype(np.uint64) for f in fields], axis=1)
+        _, first, ids = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+        self.key_records = flows[first]
+        return ids.ravel()
+
+    def _get_windows_runs(self, flows):
+        """Computes the first and the last window of every flow; a flow that fits into no window gets an empty run.
+
+        :return: Numbers of the first and the last window
+        :rtype: tuple
+        """
+        ts = flows['ts'] // 1000 - self.start
+        te = flows['te'] // 1000 - self.start
+        first = np.maximum(-((self.window - te) // self.dt), 0)
+        last = np.where(ts >= 0, ts // self.dt, -1)
+        return first, last
+
+    def aggregate(self, flows, num_windows):
+        """Produces aggregated volumes of consecutive windows.
+
+        :param flows: Flow records
+        :type flows: np.ndarray
+        :param num_windows: Number of windows to be produced
+        :type num_windows: int
+        :return: A window number, key numbers present in the window (indices of key_records) and their packets,
+            bytes and flows totals
+        :rtype: tuple
+        """
+        if not len(flows):
+            self.key_records = np.empty(0, dtype=flow_records.FLOW_DTYPE)
+            for i in range(num_windows):
+                yield i, np.empty(0, dtype=np.int64), np.empty((0, 3), dtype=np.int64)
+            return
+
+        ids = self._get_key_ids(flows)
+        volumes = np.stack([flows['packets'].astype(np.int64), flows['bytes'].astype(np.int64),
+                            np.ones(len(flows), dtype=np.int64)], axis=1)
+        first, last = self._get_windows_runs(flows)
+        selected = np.flatnonzero(first <= last)
+
+        entering = selected[np.argsort(first[selected], kind='stable')]
+        entering_windows = first[entering]
+        leaving = selected[np.argsort(last[selected], kind='stable')]
+        leaving_windows = last[leaving]
+
+        totals = np.zeros((len(self.key_records), 3), dtype=np.int64)
+        for i in range(num_windows):
+            e = entering[np.searchsorted(entering_windows, i, side='left'):
+                         np.searchsorted(entering_windows, i, side='right')]
+            np.add.at(totals, ids[e], volumes[e])
+
+            present = np.flatnonzero(totals[:, 2])
+            yield i, present, totals[present]
+
+            l = leaving[np.searchsorted(leaving_windows, i, side='left'):
+                        np.searchsorted(leaving_windows, i, side='right')]
+            np.subtract.at(totals, ids[l], volumes[l])
+
+
+def main():
+    pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+import struct
+
+import numpy as np
+
+from naadi import flow_records
+from naadi import nfcapd_reader
+
+
+EXTENSION_MAP_RECORD_TYPE = 2
+EXTENSION_MAP = struct.pack('<HHHHHH', EXTENSION_MAP_RECORD_TYPE, 12, 0, 0, 0, 0)
+
+
+def make_records(n, start=1500000000000, ipv6_every=0, seed=0):
+    """Makes random flow records sorted by their start, lasting up to one minute.
+
+    :param n: Number of records
+    :type n: int
+    :param start: The earliest flow start in milliseconds
+    :type start: int
+    :param ipv6_every: Every n-th record is an IPv6 one; no IPv6 records if 0
+    :type ipv6_every: int
+    :rtype: np.ndarray
+    """
+    rng = np.random.default_rng(seed)
+    records = np.zeros(n, dtype=flow_records.FLOW_DTYPE)
+    records['ts'] = np.sort(start + rng.integers(0, 3600000, n))
+    records['te'] = records['ts'] + rng.integers(0, 60000, n)
+    records['proto'] = rng.choice([1, 6, 17], n)
+    records['src_addr_lo'] = 0x0A000000 + rng.integers(1, 256, n)
+    records['dst_addr_lo'] = 0xC0A80000 + rng.integers(1, 256, n)
+    records['src_port'] = rng.integers(1024, 65536, n)
+    records['dst_port'] = rng.choice([22, 53, 80, 443], n)
+    records['packets'] = rng.integers(1, 1000, n)
+    records['bytes'] = records['packets'] * rng.integers(40, 1500, n)
+    records['flags'] = np.where(records['proto'] == 6, rng.integers(0, 64, n), 0)
+    records['tos'] = rng.choice([0, 8], n)
+    if ipv6_every:
+        ipv6 = np.arange(n) % ipv6_every == 0
+        records['ipv6'] = ipv6
+        records['src_addr_hi'][ipv6] = 0x20010DB800000000
+        records['dst_addr_hi'][ipv6] = 0x20010DB800000001
+    return records
+
+
+def _encode_record(r):
+    ipv6 = bool(r['ipv6'])
+    wide = int(r['packets']) > 0xFFFFFFFF or int(r['bytes']) > 0xFFFFFFFF
+    flags = (nfcapd_reader.FLAG_IPV6_ADDR if ipv6 else 0) | \
+        (nfcapd_reader.FLAG_PKG_64 | nfcapd_reader.FLAG_BYTES_64 if wide else 0)
+    if ipv6:
+        addresses = struct.pack('<QQQQ', int(r['src_addr_hi']), int(r['src_addr_lo']), int(r['dst_addr_hi']),
+                                int(r['dst_addr_lo']))
+    else:
+        addresses = struct.pack('<II', int(r['src_addr_lo']), int(r['dst_addr_lo']))
+    counters = struct.pack('<QQ' if wide else '<II', int(r['packets']), int(r['bytes']))
+    size = nfcapd_reader.COMMON_RECORD_DATA_OFFSET + len(addresses) + len(counters)
+    return struct.pack('<HHHHHHIIBBBBHHHH', nfcapd_reader.COMMON_RECORD_TYPE, size, flags, 0,
+                       int(r['ts']) % 1000, int(r['te']) % 1000, int(r['ts']) // 1000, int(r['te']) // 1000, 0,
+                       int(r['flags']), int(r['proto']), int(r['tos']), int(r['src_port']), int(r['dst_port']),
+                       0, 0) + addresses + counters
+
+
+def write_nfcapd(path, records, records_per_block=100, version=nfcapd_reader.LAYOUT_VERSION_1):
+    """Writes flow records to an uncompressed nfcapd file (nfdump 1.6 layout), the way nfcapd stores them: every data
+    block starts with the extension map and holds common records without extensions.
+
+    :param path: A path to the file
+    :type path: str
+    :param records: Flow records
+    :type records: np.ndarray
+    :param version: The layout version written to the file header
+    :type version: int
+    :rtype: None
+    """
+    blocks = []
+    for i in range(0, len(records), records_per_block):
+        data = EXTENSION_MAP + b''.join([_encode_record(r) for r in records[i:i + records_per_block]])
+        blocks.append(nfcapd_reader.BLOCK_HEADER.pack(len(records[i:i + records_per_block]) + 1, len(data),
+                                                      nfcapd_reader.DATA_BLOCK_TYPE_2, 0) + data)
+
+    first, last = (int(records['ts'].min()), int(records['te'].max())) if len(records) else (0, 0)
+    stat = nfcapd_reader.STAT_RECORD.pack(len(records), int(records['bytes'].sum()), int(records['packets'].sum()),
+                                          *([0] * 12), first // 1000, last // 1000, first % 1000, last % 1000, 0)
+    with open(path, 'wb') as f:
+        f.write(nfcapd_reader.FILE_HEADER.pack(nfcapd_reader.MAGIC, version, 0, len(blocks), b'test'))
+        f.write(stat)
+        for b in blocks:
+            f.write(b)
+    return None
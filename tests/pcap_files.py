@@ -0,0 +1,68 @@
+import struct
+
+import numpy as np
+
+from naadi import flow_meter
+
+
+PACKET_DTYPE = np.dtype([('seconds', '<u4'), ('microseconds', '<u4'), ('captured', '<u4'), ('length', '<u4'),
+                         ('dst_mac', 'V6'), ('src_mac', 'V6'), ('ethertype', '>u2'),
+                         ('version_ihl', 'u1'), ('tos', 'u1'), ('total_length', '>u2'), ('id', '>u2'),
+                         ('fragment', '>u2'), ('ttl', 'u1'), ('proto', 'u1'), ('checksum', '>u2'),
+                         ('src_addr', '>u4'), ('dst_addr', '>u4'),
+                         ('src_port', '>u2'), ('dst_port', '>u2'), ('seq', '>u4'), ('ack', '>u4'),
+                         ('offset', 'u1'), ('flags', 'u1'), ('window', '>u2'), ('tcp_checksum', '>u2'),
+                         ('urgent', '>u2')])
+PACKET_SIZE = PACKET_DTYPE.itemsize - 16
+
+
+def make_packets(n, start=1500000000, duration=3600, keys=20000, seed=0):
+    """Makes random IPv4 TCP and UDP packets ordered by time; a few flow keys are frequent, most are rare, so there are
+    both long flows and flows split by the idle timeout.
+
+    :param n: Number of packets
+    :type n: int
+    :param start: Time of the first packet as a UNIX timestamp
+    :type start: int
+    :param duration: Time span of the packets in seconds
+    :type duration: int
+    :param keys: Number of flow keys
+    :type keys: int
+    :rtype: np.ndarray
+    """
+    rng = np.random.default_rng(seed)
+    times = np.sort(rng.integers(0, duration * 1000000, n))
+    key = (rng.pareto(1.0, n) * 10).astype(np.int64) % keys
+
+    packets = np.zeros(n, dtype=PACKET_DTYPE)
+    packets['seconds'] = start + times // 1000000
+    packets['microseconds'] = times % 1000000
+    packets['captured'] = PACKET_SIZE
+    packets['length'] = PACKET_SIZE
+    packets['ethertype'] = 0x0800
+    packets['version_ihl'] = 0x45
+    packets['total_length'] = rng.integers(40, 1500, n)
+    packets['ttl'] = 64
+    packets['proto'] = np.where(key % 3, 6, 17)
+    packets['src_addr'] = 0x0A000000 + key // 256
+    packets['dst_addr'] = 0xC0A80000 + key % 256
+    packets['src_port'] = 1024 + key % 7
+    packets['dst_port'] = np.array([22, 53, 80, 443])[key % 4]
+    packets['offset'] = 0x50
+    packets['flags'] = np.where(packets['proto'] == 6, rng.choice([0x02, 0x10, 0x18, 0x11], n), 0)
+    return packets
+
+
+def write_pcap(path, packets):
+    """Writes packets to a classic pcap file (microsecond timestamps, Ethernet link type).
+
+    :param path: A path to the file
+    :type path: str
+    :param packets: Packets made by make_packets
+    :type packets: np.ndarray
+    :rtype: None
+    """
+    with open(path, 'wb') as f:
+        f.write(struct.pack('<IHHiIII', flow_meter.MAGIC_USEC, 2, 4, 0, 0, 65535, flow_meter.LINKTYPE_ETHERNET))
+        f.write(packets.tobytes())
+    return None
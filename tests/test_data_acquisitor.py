@@ -0,0 +1,30 @@
+import csv
+import os
+
+from naadi.data_acquisitor import DataAcquisitor
+from tests import nfcapd_files
+
+START = 1500000000000
+
+
+def test_get_all_appends_flows_of_first_slices_to_csv(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('flows')
+    nfcapd_files.write_nfcapd(os.path.join('flows', 'nfcapd.201707140000'), nfcapd_files.make_records(300, START))
+    data_acquisitor = DataAcquisitor()
+    data_acquisitor.native_reader = True
+    data_acquisitor.flow_cache = None
+    data_acquisitor.time_window = 600
+    data_acquisitor.dt = 600
+    data_acquisitor.nfdump_files = 'flows'
+    data_acquisitor.csv_path = str(tmp_path) + '/'
+    data_acquisitor.csv_filename = 'custom'
+
+    assert data_acquisitor.get_all() is None
+
+    with open('custom.csv', 'r') as f:
+        rows = list(csv.reader(f))
+    expected = data_acquisitor.get_flow_records()
+    assert len(rows) == len(expected) > 0
+    assert sorted([int(r[-2]) for r in rows]) == sorted(expected['packets'].tolist())
+    assert all([' -> ' in r[0] for r in rows])
@@ -0,0 +1,96 @@
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from naadi import flow_records
+from naadi.data_acquisitor import DataAcquisitor
+from naadi.flow_cache import FlowCache
+from tests import nfcapd_files
+
+START = 1500000000000
+
+
+def _in_range(records, t_start, t_end):
+    first_seen = records['ts'] // 1000
+    selected = records[(first_seen >= t_start) & (first_seen <= t_end)]
+    return selected[np.argsort(selected['ts'], kind='stable')]
+
+
+def _slices(t_start, t_end, length):
+    return [(datetime.fromtimestamp(t), datetime.fromtimestamp(t + length)) for t in range(t_start, t_end, length)]
+
+
+@pytest.fixture
+def chunks():
+    return {'a': nfcapd_files.make_records(300, START, seed=1),
+            'b': nfcapd_files.make_records(300, START + 1800000, seed=2)}
+
+
+def test_read_slices_returns_flows_of_every_range(tmp_path, chunks):
+    cache = FlowCache(str(tmp_path), bucket=600)
+    cache.update('source', {}, {c: [1] for c in chunks}, lambda c: np.array_split(chunks[c], 4))
+    records = np.concatenate(list(chunks.values()))
+
+    slices = _slices(START // 1000, START // 1000 + 6000, 900)
+    read = list(cache.read_slices('source', {}, slices, list(flow_records.FLOW_DTYPE.names)))
+
+    assert len(read) == len(slices)
+    for start, end, flows in read:
+        expected = _in_range(records, int(start.timestamp()), int(end.timestamp()))
+        assert np.array_equal(np.sort(flows, order=['ts', 'te', 'src_port']),
+                              np.sort(expected, order=['ts', 'te', 'src_port']))
+
+
+def test_update_loads_only_missing_and_changed_chunks(tmp_path, chunks):
+    cache = FlowCache(str(tmp_path), bucket=600)
+    loaded = []
+
+    def loader(c):
+        loaded.append(c)
+        return [chunks[c]]
+
+    cache.update('source', {}, {'a': [1]}, loader)
+    cache.update('source', {}, {'a': [1], 'b': [1]}, loader)
+    chunks['a'] = chunks['a'][:10]
+    cache.update('source', {}, {'a': [2], 'b': [1]}, loader)
+    assert loaded == ['a', 'b', 'a']
+
+    cache.update('source', {}, {'b': [1]}, loader, known={'b'})
+    assert sorted(cache.index[cache._get_key('source', {})]['chunks']) == ['b']
+    t_start, t_end = START // 1000, START // 1000 + 8000
+    flows = cache.load('source', {}, datetime.fromtimestamp(t_start), datetime.fromtimestamp(t_end), ['packets'],
+                       {'b': [1]}, loader)
+    assert len(flows) == len(chunks['b'])
+    assert np.array_equal(flows['packets'], _in_range(chunks['b'], t_start, t_end)['packets'])
+
+
+def test_cached_data_batches_match_nfdump_selection(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('flows')
+    records = []
+    for i in range(3):
+        part = nfcapd_files.make_records(200, START + i * 3600000, seed=i)
+        records.append(part)
+        nfcapd_files.write_nfcapd(os.path.join('flows', 'nfcapd.20170714' + str(i)), part)
+    records = np.concatenate(records)
+
+    data_acquisitor = DataAcquisitor()
+    data_acquisitor.native_reader = True
+    data_acquisitor.time_window = 600
+    data_acquisitor.dt = 300
+    data_acquisitor.flow_cache = FlowCache('cache/flows', bucket=900)
+    data_acquisitor.nfdump_files = 'flows'
+
+    batches = list(data_acquisitor.get_data_batches(flow_records.RECORD_VARIABLES, None, None, as_records=True))
+
+    assert len(batches) == data_acquisitor.num_of_time_slices
+    assert sum([len(f) for _, f in batches]) > 0
+    assert [len(e['chunks']) for e in data_acquisitor.flow_cache.index.values()] == [3]
+    for start, flows in batches:
+        t_start = int(start.timestamp())
+        t_end = int((start + timedelta(seconds=600)).timestamp())
+        expected = records[(records['ts'] // 1000 >= t_start) & (records['te'] // 1000 <= t_end)]
+        assert np.array_equal(np.sort(flows, order=['ts', 'te', 'src_port']),
+                              np.sort(expected, order=['ts', 'te', 'src_port']))
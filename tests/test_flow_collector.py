@@ -0,0 +1,89 @@
+import os
+import socket
+import struct
+import time
+
+import numpy as np
+import pytest
+
+from naadi import flow_collector
+from naadi import flow_store
+from naadi.flow_collector import FlowCollector
+from naadi.flow_meter import read_flows
+from tests import nfcapd_files
+
+EXPORTER = ('127.0.0.1', 2055)
+
+
+def _sorted(records):
+    return np.sort(records, order=['ts', 'te', 'src_addr_lo', 'dst_addr_lo', 'src_port'])
+
+
+def _get_free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _read_output(directory):
+    return [read_flows(f) for f in flow_store.get_flow_files(directory)]
+
+
+@pytest.mark.parametrize('version, ipv6_every', [(flow_collector.IPFIX, 5), (flow_collector.NETFLOW_V5, 0)])
+def test_exported_flows_are_written_to_parquet(tmp_path, version, ipv6_every):
+    records = nfcapd_files.make_records(500, ipv6_every=ipv6_every)
+    port = _get_free_port()
+    collector = FlowCollector('127.0.0.1', port, str(tmp_path))
+    assert collector.start()
+
+    flow_collector.export_flows(records, '127.0.0.1', port, version, rate=1000)
+    deadline = time.monotonic() + 10
+    while collector.flows_received < len(records) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    collector.stop()
+
+    assert collector.sets_dropped == 0 and collector.packets_dropped == 0
+    assert collector.flows_written == len(records)
+    assert np.array_equal(_sorted(np.concatenate(_read_output(str(tmp_path)))), _sorted(records))
+
+
+def test_flush_rotates_file_before_writing_flows_of_next_interval(tmp_path):
+    records = nfcapd_files.make_records(20)
+    collector = FlowCollector(output_dir=str(tmp_path), time_interval=600)
+    now = 1500000000
+
+    for p in flow_collector.encode_ipfix(records[:10]):
+        collector.receive(p, EXPORTER)
+    collector.flush(now)
+    for p in flow_collector.encode_ipfix(records[10:]):
+        collector.receive(p, EXPORTER)
+    collector.flush(now + 600)
+    collector.close()
+
+    assert [len(f) for f in _read_output(str(tmp_path))] == [10, 10]
+
+
+def _ipfix_packet(*sets):
+    payload = b''.join([struct.pack('>HH', set_id, 4 + len(body)) + body for set_id, body in sets])
+    return flow_collector.IPFIX_HEADER.pack(flow_collector.IPFIX, flow_collector.IPFIX_HEADER.size + len(payload), 0,
+                                            0, 0) + payload
+
+
+def _v9_packet(*sets):
+    payload = b''.join([struct.pack('>HH', set_id, 4 + len(body)) + body for set_id, body in sets])
+    return flow_collector.V9_HEADER.pack(flow_collector.NETFLOW_V9, len(sets), 0, 0, 0, 0) + payload
+
+
+def test_options_data_sets_are_not_dropped(tmp_path):
+    collector = FlowCollector(output_dir=str(tmp_path))
+    collector.receive(_ipfix_packet((flow_collector.IPFIX_OPTIONS_TEMPLATE_SET,
+                                     struct.pack('>HHHHHHH', 300, 2, 1, 149, 4, 41, 8)),
+                                    (300, bytes(12)), (400, bytes(12))), EXPORTER)
+    collector.receive(_v9_packet((flow_collector.V9_OPTIONS_TEMPLATE_SET,
+                                  struct.pack('>HHHHHHH', 260, 4, 4, 1, 4, 40, 4) + bytes(2)),
+                                 (260, bytes(8))), EXPORTER)
+
+    assert collector.option_sets_received == 2
+    assert collector.sets_dropped == 1
+    assert collector.packets_dropped == 0
+    assert not os.listdir(str(tmp_path))
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import configuration as cnf
+from naadi import flow_records
+from naadi.data_acquisitor import DataAcquisitor
+from tests import nfcapd_files
+
+
+def test_parse_protocols_round_trips_all_protocols():
+    names = [cnf.NFDUMP.PROTOCOLS_DICT.get(p, str(p)) for p in range(256)]
+
+    parsed = flow_records.parse_protocols(pd.Series(names))
+
+    duplicates = {94: 4, 38: 35}
+    assert parsed.tolist() == [duplicates.get(p, p) for p in range(256)]
+
+
+def test_parse_protocols_raises_on_unknown_name():
+    with pytest.raises(ValueError, match='FOO'):
+        flow_records.parse_protocols(pd.Series(['TCP', 'foo']))
+
+
+def test_parse_addresses():
+    hi, lo, ipv6 = flow_records.parse_addresses(pd.Series(['10.0.0.1', '2001:db8:0:0:0:0:0:1']))
+
+    assert lo.tolist() == [0x0A000001, 1]
+    assert hi.tolist() == [0, 0x20010DB800000000]
+    assert ipv6.tolist() == [False, True]
+
+
+def test_parse_addresses_raises_on_shortened_address():
+    with pytest.raises(ValueError, match='2001:db8..1'):
+        flow_records.parse_addresses(pd.Series(['10.0.0.1', '2001:db8..1']))
+
+
+def test_from_batch_round_trips_records():
+    records = nfcapd_files.make_records(100, ipv6_every=3)
+    records['ts'] = records['ts'] // 1000 * 1000
+    records['te'] = records['te'] // 1000 * 1000
+    variables = cnf.NFDUMP.FLOW_TIME_COLUMNS + flow_records.RECORD_VARIABLES
+
+    batch = DataAcquisitor()._columns_to_batch(records, variables)
+
+    assert np.array_equal(flow_records.from_batch(batch), records)
+
+
+def test_raw_flows_query_prints_full_addresses(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'flows').mkdir()
+    path = str(tmp_path / 'flows' / 'nfcapd.201707140000')
+    nfcapd_files.write_nfcapd(path, nfcapd_files.make_records(10))
+    data_acquisitor = DataAcquisitor()
+    data_acquisitor.nfdump_files = str(tmp_path / 'flows')
+    data_acquisitor.discover_time_window().join()
+
+    query = data_acquisitor._build_raw_flows_query(['SOURCE ADDRESS'])
+
+    assert '-6' in query and '-N' in query
+    assert '-6' in data_acquisitor._build_files_flows_query(path, ['SOURCE ADDRESS'])
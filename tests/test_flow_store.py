@@ -0,0 +1,118 @@
+import os
+from datetime import timedelta
+
+import numpy as np
+import pytest
+
+from naadi import flow_records
+from naadi import flow_store
+from naadi.collector import NetFlowCollector
+from naadi.data_acquisitor import DataAcquisitor
+from naadi.flow_meter import FlowMeter
+from tests import pcap_files
+
+
+def _sorted(flows):
+    return np.sort(flows, order=['ts', 'src_addr_lo', 'dst_addr_lo', 'src_port', 'dst_port', 'proto'])
+
+
+def _convert_sharded(tmp_path, monkeypatch, packets):
+    monkeypatch.chdir(tmp_path)
+    pcap_files.write_pcap('capture.pcap', packets)
+    collector = NetFlowCollector()
+    collector.path_pcap_files = 'capture.pcap'
+    collector.convert_pcap_to_flow_store('store', max_workers=4)
+    return collector
+
+
+def test_sharded_conversion_matches_sequential(tmp_path, monkeypatch):
+    packets = pcap_files.make_packets(250000)
+    collector = _convert_sharded(tmp_path, monkeypatch, packets)
+
+    sequential = np.concatenate(list(FlowMeter().meter('capture.pcap')))
+    sharded = flow_store.FlowStore('store').read()
+
+    assert collector.shards_num > 1
+    assert len(sequential) < len(packets)
+    assert np.array_equal(_sorted(sharded), _sorted(sequential))
+
+
+def test_data_batches_of_flow_store(tmp_path, monkeypatch):
+    _convert_sharded(tmp_path, monkeypatch, pcap_files.make_packets(20000, duration=1800))
+    flows = flow_store.FlowStore('store').read()
+
+    data_acquisitor = DataAcquisitor()
+    data_acquisitor.time_window = 600
+    data_acquisitor.dt = 300
+    data_acquisitor.nfdump_files = 'store'
+    batches = list(data_acquisitor.get_data_batches(flow_records.RECORD_VARIABLES, None, None, as_records=True))
+
+    assert int(data_acquisitor.full_time_window_start.timestamp()) == int(flows['ts'].min()) // 1000
+    assert len(batches) == data_acquisitor.num_of_time_slices
+    for start, batch in batches:
+        t_start = int(start.timestamp())
+        t_end = int((start + timedelta(seconds=600)).timestamp())
+        expected = flows[(flows['ts'] // 1000 >= t_start) & (flows['te'] // 1000 <= t_end)]
+        assert np.array_equal(_sorted(batch), _sorted(expected))
+
+
+def test_aggregated_data_batches_of_parquet_file(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    pcap_files.write_pcap('capture.pcap', pcap_files.make_packets(20000, duration=1800))
+    FlowMeter().convert(['capture.pcap'], 'flows.parquet')
+
+    data_acquisitor = DataAcquisitor()
+    data_acquisitor.time_window = 600
+    data_acquisitor.dt = 600
+    data_acquisitor.nfdump_files = 'flows.parquet'
+    variables = ['DESTINATION PORT', 'PACKETS', 'BYTES', 'FLOWS']
+    batches = list(data_acquisitor.get_data_batches(variables, ['DESTINATION PORT'], 'PACKETS'))
+
+    flows = np.concatenate(list(FlowMeter().meter('capture.pcap')))
+    assert len(batches) == data_acquisitor.num_of_time_slices
+    for start, batch in batches:
+        t_start = int(start.timestamp())
+        selected = flows[(flows['ts'] // 1000 >= t_start) & (flows['te'] // 1000 <= t_start + 600)]
+        assert batch['PACKETS'].sum() == selected['packets'].sum()
+        assert batch['FLOWS'].sum() == len(selected)
+
+
+def test_follow_rejects_flow_store(tmp_path, monkeypatch):
+    _convert_sharded(tmp_path, monkeypatch, pcap_files.make_packets(1000, duration=60))
+    data_acquisitor = DataAcquisitor()
+    data_acquisitor._nfdump_files = 'store'
+
+    with pytest.raises(AttributeError, match='nfcapd'):
+        next(data_acquisitor.follow(flow_records.RECORD_VARIABLES, None, None))
+
+
+
+def test_remove_parts_keeps_parts_of_other_sources(tmp_path):
+    store = flow_store.FlowStore(str(tmp_path))
+    flows = np.zeros(3, dtype=flow_records.FLOW_DTYPE)
+    flows['ts'] = [1500000000000, 1500003600000, 1500007200000]
+    for name in ['a.pcap.0', 'a.pcap.1024', 'a.pcap.stitched.2', 'a.pcap.1.0', 'a.pcap.1.stitched.0', 'b.pcap.0']:
+        store.write_parts(flows, name)
+
+    assert store.remove_parts('a.pcap') == 3 * 3
+    store.merge()
+    assert sum([b['flows'] for b in store.buckets.values()]) == 3 * 3
+
+
+
+@pytest.mark.parametrize('directory', [False, True])
+def test_changed_pcap_is_not_merged_again(tmp_path, monkeypatch, directory):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('pcaps')
+    pcap_files.write_pcap(os.path.join('pcaps', 'capture.pcap'), pcap_files.make_packets(2000, duration=600))
+    collector = NetFlowCollector()
+    collector.path_pcap_files = 'pcaps' if directory else os.path.join('pcaps', 'capture.pcap')
+    collector.convert_pcap_to_flow_store('store', max_workers=2)
+    flows_num = len(flow_store.FlowStore('store').read())
+
+    pcap_files.write_pcap(os.path.join('pcaps', 'capture.pcap'), pcap_files.make_packets(3000, duration=600, seed=1))
+    collector.convert_pcap_to_flow_store('store', max_workers=2)
+
+    assert 'capture.pcap changed' in collector.warning_message
+    assert flows_num > 0
+    assert len(flow_store.FlowStore('store').read()) == flows_num
@@ -0,0 +1,134 @@
+import os
+import threading
+from datetime import timedelta
+
+import numpy as np
+from scipy import stats
+
+import configuration as cnf
+from naadi.data_acquisitor import DataAcquisitor
+from tests import nfcapd_files
+
+START = 1500000000000
+WINDOW = 600
+
+
+class Anomaly:
+    def __init__(self):
+        self.unit = ('PACKETS', 'FLOWS')
+        self.aggregators = (['DESTINATION ADDRESS', 'DESTINATION PORT'], ['SOURCE ADDRESS'])
+        self.filters = ({}, {})
+        self.columns = ('DA_DP_PKT', 'SA_FLW')
+        self.features = (['ENTROPY'], ['ENTROPY'])
+
+
+def _write_file(directory, i):
+    """Writes an hour of flows the way nfcapd rotates a file; the last flow ends a minute after the hour."""
+    records = nfcapd_files.make_records(200, START + i * 3600000, seed=i)
+    records['te'][-1] = START + (i + 1) * 3600000 + 59000
+    nfcapd_files.write_nfcapd(os.path.join(directory, 'nfcapd.current'), records)
+    os.replace(os.path.join(directory, 'nfcapd.current'), os.path.join(directory, 'nfcapd.20170714' + str(i)))
+    return records
+
+
+def _is_last_slice(start, num_files):
+    return int(start.timestamp()) + 2 * WINDOW >= START // 1000 + num_files * 3600
+
+
+def _in_slice(records, start):
+    t_start = int(start.timestamp())
+    t_end = int((start + timedelta(seconds=WINDOW)).timestamp())
+    return records[(records['ts'] // 1000 >= t_start) & (records['te'] // 1000 <= t_end)]
+
+
+def _data_acquisitor(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(cnf.NFDUMP, 'FOLLOW_POLL_INTERVAL', 0.01)
+    os.makedirs('flows')
+    data_acquisitor = DataAcquisitor()
+    data_acquisitor.native_reader = True
+    data_acquisitor.time_window = WINDOW
+    data_acquisitor.dt = WINDOW
+    data_acquisitor._nfdump_files = 'flows'
+    return data_acquisitor
+
+
+def test_follow_emits_windows_of_rotated_files(tmp_path, monkeypatch):
+    data_acquisitor = _data_acquisitor(tmp_path, monkeypatch)
+    records = [_write_file('flows', 0), _write_file('flows', 1)]
+    stop = threading.Event()
+
+    starts = []
+    for start, features in data_acquisitor.follow_features(stop, from_beginning=True):
+        starts.append(start)
+        assert len(features) == len(_in_slice(np.concatenate(records), start))
+        if _is_last_slice(start, 3):
+            stop.set()
+        elif len(records) == 2 and _is_last_slice(start, 2):
+            records.append(_write_file('flows', 2))
+
+    assert [int(s.timestamp()) - int(starts[0].timestamp()) for s in starts] == \
+        list(range(0, len(starts) * WINDOW, WINDOW))
+    assert int(starts[0].timestamp()) == START // 1000
+    assert int(starts[-1].timestamp()) == START // 1000 + 3 * 3600 - 2 * WINDOW
+
+
+def test_follow_skips_files_present_at_start(tmp_path, monkeypatch):
+    data_acquisitor = _data_acquisitor(tmp_path, monkeypatch)
+    _write_file('flows', 0)
+    stop = threading.Event()
+    writer = threading.Timer(0.2, _write_file, ('flows', 1))
+    timeout = threading.Timer(30, stop.set)
+    writer.start()
+    timeout.start()
+
+    starts = []
+    for start, _ in data_acquisitor.follow_features(stop):
+        starts.append(start)
+        stop.set()
+    writer.join()
+    timeout.cancel()
+
+    assert int(starts[0].timestamp()) == START // 1000 + 3600
+
+
+def test_follow_features_of_anomaly(tmp_path, monkeypatch):
+    data_acquisitor = _data_acquisitor(tmp_path, monkeypatch)
+    records = _write_file('flows', 0)
+    stop = threading.Event()
+
+    rows = []
+    for start, features in data_acquisitor.follow_features(stop, from_beginning=True, anomaly=Anomaly()):
+        rows.append((start, features))
+        if len(rows) == 3:
+            stop.set()
+
+    for start, features in rows:
+        selected = _in_slice(records, start)
+        _, ids = np.unique(np.stack([selected['dst_addr_lo'], selected['dst_port']], axis=1), axis=0,
+                           return_inverse=True)
+        packets = np.bincount(ids.ravel(), weights=selected['packets'])
+        flows = np.unique(selected['src_addr_lo'], return_counts=True)[1]
+        assert list(features.columns) == ['DA_DP_PKT ENTROPY', 'SA_FLW ENTROPY']
+        assert np.isclose(features['DA_DP_PKT ENTROPY'].iloc[0], stats.entropy(packets))
+        assert np.isclose(features['SA_FLW ENTROPY'].iloc[0], stats.entropy(flows))
+
+
+def test_detect_keeps_latest_slices(tmp_path, monkeypatch):
+    data_acquisitor = _data_acquisitor(tmp_path, monkeypatch)
+    _write_file('flows', 0)
+    stop = threading.Event()
+    follow = data_acquisitor.follow
+
+    def follow_until_stopped(*args, **kwargs):
+        for i, batch in enumerate(follow(*args, **kwargs)):
+            if i == 4:
+                stop.set()
+            yield batch
+
+    monkeypatch.setattr(data_acquisitor, 'follow', follow_until_stopped)
+    monkeypatch.setattr('naadi.anomalies_library.DDoS', Anomaly)
+    data_acquisitor.detect('DDoS', stop, from_beginning=True, max_slices=3)
+
+    assert len(data_acquisitor.detections) == 3
+    assert list(data_acquisitor.detections.columns) == ['DA_DP_PKT ENTROPY', 'SA_FLW ENTROPY']
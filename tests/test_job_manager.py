@@ -0,0 +1,86 @@
+import signal
+import threading
+import time
+
+import configuration as cnf
+from naadi import job_manager
+from naadi.job_manager import JobManager
+from naadi.process_supervisor import ProcessSupervisor
+
+
+class Sleeper:
+    def __init__(self):
+        self.info_message = ''
+        self.error_message = ''
+
+    def sleep(self, seconds):
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        self.info_message = 'Sleeping.'
+        time.sleep(seconds)
+        return None
+
+    def fail(self, seconds):
+        self.info_message = 'Half done.'
+        time.sleep(seconds)
+        raise ValueError('Broken input.')
+
+
+def test_cancel_reaps_worker_outside_lock(monkeypatch):
+    monkeypatch.setattr(cnf.JOBS, 'JOIN_TIMEOUT', 1)
+    manager = JobManager(interval=0.05)
+    sleeper = Sleeper()
+    job_id = manager.submit('sleep', sleeper, 'sleep', 60, progress=('info_message',))
+    job = manager.get(job_id)
+    deadline = time.monotonic() + 30
+    while sleeper.info_message != 'Sleeping.' and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    cancel = threading.Thread(target=manager.cancel, args=(job_id,))
+    cancel.start()
+    time.sleep(0.2)
+    assert cancel.is_alive()
+    assert manager.lock.acquire(timeout=0.5)
+    manager.lock.release()
+    cancel.join(30)
+
+    assert job.status == job_manager.CANCELLED
+    assert not job.process.is_alive()
+
+
+def test_failed_job_resets_reported_progress():
+    manager = JobManager(interval=0.05)
+    sleeper = Sleeper()
+    job = manager.get(manager.submit('fail', sleeper, 'fail', 1, progress=('info_message',)))
+    deadline = time.monotonic() + 30
+    while sleeper.info_message != 'Half done.' and time.monotonic() < deadline:
+        time.sleep(0.05)
+    while job.is_active() and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    assert job.status == job_manager.FAILED
+    assert sleeper.info_message == ''
+    assert sleeper.error_message.startswith('fail has failed') and 'Broken input.' in sleeper.error_message
+
+
+class Starter:
+    def __init__(self):
+        self.supervisor = ProcessSupervisor()
+
+    def start(self, seconds):
+        self.supervisor.start('sleep', ['sleep', str(seconds)])
+        time.sleep(seconds)
+        return None
+
+
+def test_cancelled_job_resets_supervisor_snapshot():
+    manager = JobManager(interval=0.05)
+    starter = Starter()
+    job_id = manager.submit('start', starter, 'start', 60, progress=('supervisor',))
+    deadline = time.monotonic() + 30
+    while starter.supervisor.count('sleep') != 1 and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert starter.supervisor.count('sleep') == 1
+
+    manager.cancel(job_id)
+
+    assert starter.supervisor.count('sleep') == 0
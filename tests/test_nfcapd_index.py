@@ -0,0 +1,68 @@
+import os
+from datetime import datetime
+
+from naadi import nfcapd_index
+from naadi import nfcapd_reader
+from naadi.data_acquisitor import DataAcquisitor
+from naadi.nfcapd_index import NfcapdIndex
+from tests import nfcapd_files
+
+START = 1500000000000
+
+
+def _write_files(directory):
+    os.makedirs(directory)
+    for i in range(3):
+        nfcapd_files.write_nfcapd(os.path.join(directory, 'nfcapd.20170714' + str(i)),
+                                  nfcapd_files.make_records(50, START + i * 3600000, seed=i))
+
+
+def test_update_catalogs_nfcapd_files(tmp_path):
+    directory = str(tmp_path / 'flows')
+    _write_files(directory)
+    index = NfcapdIndex(directory, str(tmp_path / 'index'))
+
+    assert index.update()
+    assert index.complete
+    assert len(index.get_files(START // 1000 + 1800, START // 1000 + 1800)) == 1
+    assert len(index.get_files(0, 2 ** 32)) == 3
+    assert not index.update()
+    assert NfcapdIndex(directory, str(tmp_path / 'index')).files == index.files
+
+
+def test_update_records_skipped_files(tmp_path, monkeypatch):
+    directory = str(tmp_path / 'flows')
+    _write_files(directory)
+    (tmp_path / 'flows' / 'README').write_text('not a capture')
+    nfcapd_files.write_nfcapd(os.path.join(directory, 'nfcapd.201707150'), nfcapd_files.make_records(5), version=2)
+    index = NfcapdIndex(directory, str(tmp_path / 'index'))
+    index.update()
+
+    opened = []
+    is_nfcapd_file = nfcapd_reader.is_nfcapd_file
+    monkeypatch.setattr(nfcapd_reader, 'is_nfcapd_file', lambda p: opened.append(p) or is_nfcapd_file(p))
+
+    assert not index.update()
+    assert opened == []
+    assert not index.complete
+    assert index.files[os.path.join(directory, 'README')]['skipped'] == nfcapd_index.SKIPPED_OTHER
+    assert index.files[os.path.join(directory, 'nfcapd.201707150')]['skipped'] == nfcapd_index.SKIPPED_UNREADABLE
+    assert len(index.get_files(0, 2 ** 32)) == 3
+
+
+def test_catalog_is_updated_once_per_query(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _write_files('flows')
+    data_acquisitor = DataAcquisitor()
+    data_acquisitor.nfdump_files = 'flows'
+    data_acquisitor.discover_time_window().join()
+
+    updates = []
+    update = NfcapdIndex.update
+    monkeypatch.setattr(NfcapdIndex, 'update', lambda self: updates.append(self) or update(self))
+    data_acquisitor._get_nfdump_index(update=True)
+    for i in range(3):
+        t = datetime.fromtimestamp(START // 1000 + i * 3600 + 1800).strftime('%Y/%m/%d.%H:%M:%S')
+        assert data_acquisitor._assemble_source(t + '-' + t)[0] == '-r'
+
+    assert len(updates) == 1
@@ -0,0 +1,94 @@
+import shutil
+import subprocess
+
+import numpy as np
+import pytest
+
+from naadi import flow_records
+from naadi import nfcapd_reader
+from tests import nfcapd_files
+
+
+def _sorted(records):
+    return np.sort(records, order=['ts', 'te', 'src_addr_lo', 'dst_addr_lo', 'src_port'])
+
+
+def test_read_matches_written_records(tmp_path):
+    records = nfcapd_files.make_records(250, ipv6_every=7)
+    records['packets'][3] = 1 << 40
+    path = str(tmp_path / 'nfcapd.201801010000')
+    nfcapd_files.write_nfcapd(path, records)
+
+    read = flow_records.from_columns(nfcapd_reader.NfcapdReader(path).read())
+
+    assert np.array_equal(_sorted(read), _sorted(records))
+
+
+def test_read_stat(tmp_path):
+    records = nfcapd_files.make_records(10)
+    path = str(tmp_path / 'nfcapd.201801010000')
+    nfcapd_files.write_nfcapd(path, records)
+
+    stat = nfcapd_reader.NfcapdReader(path).read_stat()
+
+    assert stat['flows'] == 10
+    assert stat['first_seen'] == records['ts'].min()
+    assert stat['last_seen'] == records['te'].max()
+
+
+def test_read_time_window_selects_flows_within_it(tmp_path):
+    records = nfcapd_files.make_records(200)
+    path = str(tmp_path / 'nfcapd.201801010000')
+    nfcapd_files.write_nfcapd(path, records)
+    t_start, t_end = int(records['ts'][50]) // 1000, int(records['ts'][150]) // 1000
+
+    read = flow_records.from_columns(nfcapd_reader.NfcapdReader(path).read(t_start, t_end))
+
+    expected = records[(records['ts'] // 1000 >= t_start) & (records['te'] // 1000 <= t_end)]
+    assert np.array_equal(_sorted(read), _sorted(expected))
+
+
+def test_read_file_list_skips_other_files(tmp_path):
+    records = nfcapd_files.make_records(20)
+    path = str(tmp_path / 'nfcapd.201801010000')
+    nfcapd_files.write_nfcapd(path, records)
+    (tmp_path / 'README').write_text('not a capture')
+
+    columns = nfcapd_reader.read_nfcapd_files(str(tmp_path))
+
+    assert len(columns['ts']) == 20
+
+
+def test_read_file_list_raises_on_unreadable_file(tmp_path):
+    path = str(tmp_path / 'nfcapd.201801010000')
+    nfcapd_files.write_nfcapd(path, nfcapd_files.make_records(20), version=2)
+
+    with pytest.raises(ValueError, match='nfcapd.201801010000'):
+        nfcapd_reader.read_nfcapd_file_list([path])
+
+
+def test_read_file_list_raises_on_truncated_file(tmp_path):
+    path = tmp_path / 'nfcapd.201801010000'
+    nfcapd_files.write_nfcapd(str(path), nfcapd_files.make_records(20))
+    path.write_bytes(path.read_bytes()[:300])
+
+    with pytest.raises(ValueError, match='nfcapd.201801010000'):
+        nfcapd_reader.read_nfcapd_file_list([str(path)])
+
+
+@pytest.mark.skipif(shutil.which('nfdump') is None, reason='nfdump is not installed')
+def test_read_matches_nfdump(tmp_path):
+    records = nfcapd_files.make_records(100, ipv6_every=5)
+    path = str(tmp_path / 'nfcapd.201801010000')
+    nfcapd_files.write_nfcapd(path, records[records['proto'] != 1])
+
+    output = subprocess.run(['nfdump', '-r', path, '-q', '-N', '-o', 'fmt:%pr,%sp,%dp,%pkt,%byt'],
+                            check=True, stdout=subprocess.PIPE).stdout.decode('utf-8')
+    expected = sorted([tuple([c.strip() for c in l.split(',')]) for l in output.splitlines() if l.strip()])
+    columns = nfcapd_reader.NfcapdReader(path).read()
+    protocols = {6: 'TCP', 17: 'UDP'}
+    read = sorted([(protocols[p], str(sp), str(dp), str(pk), str(b))
+                   for p, sp, dp, pk, b in zip(columns['proto'], columns['src_port'], columns['dst_port'],
+                                               columns['packets'], columns['bytes'])])
+
+    assert read == expected
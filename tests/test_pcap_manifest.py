@@ -0,0 +1,46 @@
+from naadi.pcap_manifest import PcapManifest
+
+
+def _manifest(tmp_path, monkeypatch):
+    manifest = PcapManifest(str(tmp_path / 'out'), str(tmp_path / 'index'))
+    hashed = []
+    digest = manifest._get_digest
+    monkeypatch.setattr(manifest, '_get_digest', lambda p: hashed.append(p) or digest(p))
+    return manifest, hashed
+
+
+def test_is_done_hashes_only_files_of_recorded_size(tmp_path, monkeypatch):
+    manifest, hashed = _manifest(tmp_path, monkeypatch)
+    (tmp_path / 'a.pcap').write_bytes(b'a' * 100)
+    (tmp_path / 'b.pcap').write_bytes(b'b' * 200)
+    manifest.mark_done(str(tmp_path / 'a.pcap'), [])
+    hashed.clear()
+
+    assert manifest.get_pending([str(tmp_path / 'a.pcap'), str(tmp_path / 'b.pcap')]) == [str(tmp_path / 'b.pcap')]
+    assert hashed == []
+
+
+def test_is_done_finds_moved_file_by_hash(tmp_path, monkeypatch):
+    manifest, hashed = _manifest(tmp_path, monkeypatch)
+    (tmp_path / 'a.pcap').write_bytes(b'a' * 100)
+    manifest.mark_done(str(tmp_path / 'a.pcap'), ['out/nfcapd.1'])
+    (tmp_path / 'a.pcap').rename(tmp_path / 'c.pcap')
+    (tmp_path / 'd.pcap').write_bytes(b'd' * 100)
+    hashed.clear()
+
+    assert manifest.is_done(str(tmp_path / 'c.pcap'))
+    assert not manifest.is_done(str(tmp_path / 'd.pcap'))
+    assert hashed == [str(tmp_path / 'c.pcap'), str(tmp_path / 'd.pcap')]
+
+
+def test_rename_output_over_output_of_other_file(tmp_path, monkeypatch):
+    manifest, _ = _manifest(tmp_path, monkeypatch)
+    (tmp_path / 'a.pcap').write_bytes(b'a' * 100)
+    (tmp_path / 'b.pcap').write_bytes(b'b' * 200)
+    manifest.mark_done(str(tmp_path / 'a.pcap'), ['out/nfcapd.1', 'out/sample'])
+    manifest.mark_done(str(tmp_path / 'b.pcap'), ['out/nfcapd.2'])
+
+    manifest.rename_output('out/nfcapd.2', 'out/sample')
+
+    assert manifest.files[str(tmp_path / 'a.pcap')]['outputs'] == ['out/nfcapd.1']
+    assert manifest.files[str(tmp_path / 'b.pcap')]['outputs'] == ['out/sample']
@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+
+from naadi.presenter import Presenter
+
+
+def _set_data(presenter, n=120):
+    rng = np.random.default_rng(0)
+    x = pd.DataFrame({'pkt': rng.integers(0, 100, n), 'byt': rng.integers(0, 10000, n)})
+    y = pd.Series(rng.integers(0, 2, n), name='label')
+    presenter.set_data('data', {'x_train': x, 'y_train': y, 'x_test': None, 'y_test': None,
+                                'features_names': list(x.columns)})
+    presenter.set_data('data_raw', dict(presenter.data))
+    return x
+
+
+def test_tables_are_paged_by_their_own_id():
+    presenter = Presenter()
+    x = _set_data(presenter)
+
+    first_id, first = presenter.get_figure('TABLE', 'x_train', ['pkt'])
+    second_id, second = presenter.get_figure('TABLE', 'x_train', ['byt'], rows_num=60)
+
+    assert first_id != second_id
+    assert first['page_count'] == 3 and second['page_count'] == 2
+    assert list(presenter.get_table_page(first_id, 1, 50)[0]) == ['pkt']
+    assert presenter.get_table_page(first_id, 2, 50) == x[['pkt']][100:].to_dict('records')
+    assert presenter.get_table_page(second_id, 1, 50, [{'column_id': 'byt', 'direction': 'asc'}]) == \
+        x[['byt']][:60].sort_values('byt', kind='stable')[50:].to_dict('records')
+    assert presenter.get_table_page('unknown', 0, 50) == []
+
@@ -0,0 +1,30 @@
+import json
+
+from naadi.status_board import StatusBoard
+
+
+def test_payload_lists_only_changed_sections():
+    values = {'a': 1, 'b': 'x'}
+    board = StatusBoard()
+    board.register('a', lambda: values['a'])
+    board.register('b', lambda: values['b'])
+
+    payload = board.get_payload()
+    assert json.loads(payload)['changed'] == ['a', 'b']
+    assert board.get_payload(payload) is None
+
+    values['b'] = 'y'
+    changed = board.get_payload(payload)
+    assert json.loads(changed)['changed'] == ['b']
+    assert board.get_section(changed, 'a') == (False, None)
+    assert board.get_section(changed, 'b') == (True, 'y')
+    assert board.get_payload(changed) is None
+
+
+def test_client_without_payload_gets_all_sections():
+    board = StatusBoard()
+    board.register('a', lambda: [1, 2])
+    board.get_payload()
+
+    assert json.loads(board.get_payload())['changed'] == ['a']
+    assert board.get_section(board.get_payload(), 'a') == (True, [1, 2])